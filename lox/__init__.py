@@ -6,6 +6,7 @@ Carrega os nomes principais do módulo lox.
 
 from .ast import Expr, Stmt, Value
 from .ctx import Ctx
+from .engines import get_engine
 from .errors import SemanticError
 from .node import Node
 from .parser import lex, parse, parse_cst, parse_expr
@@ -28,6 +29,7 @@ def eval(
     src: str | Node,
     env: Ctx | dict[str, Value] | None = None,
     skip_validation: bool = False,
+    engine: str = "tree",
 ) -> Value:
     """
     Avalia o código fonte e retorna o valur resultante.
@@ -41,6 +43,9 @@ def eval(
             variáveis para seus valores ou uma instância de `Ctx`.
         skip_validation:
             Se `True`, ignora a validação do código fonte antes da avaliação.
+        engine:
+            Mecanismo de execução (ver `lox.engines.ENGINES`). O padrão,
+            "tree", avalia a árvore sintática diretamente.
     """
     if env is None:
         env = Ctx.from_dict({})
@@ -55,8 +60,9 @@ def eval(
     if not skip_validation:
         ast.validate_tree()
 
+    run = get_engine(engine)
     try:
-        return ast.eval(env)
+        return run(ast, env)
     except Exception as e:
         print(f"Programa terminou com um erro: {e}")
         print("Variáveis:", env)
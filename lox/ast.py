@@ -1,9 +1,29 @@
+import sys
 from abc import ABC
 from dataclasses import dataclass, field
-from typing import Callable, Optional
+from math import ceil, floor, isfinite
+from typing import Callable, Iterable, Iterator, Optional
 
-from .ctx import Ctx
+from .ctx import UNDEFINED, Ctx, Frame
 from .node import Node
+from .runtime import (
+    COMPARISONS,
+    InlineCache,
+    ReturnValue,
+    TailCall,
+    add,
+    coerce_integer,
+    flatten,
+    is_integer_var,
+    le,
+    lt,
+    run_body,
+    set_attribute,
+    specialize,
+    to_integer,
+    trampoline,
+    truthy,
+)
 
 #
 # TIPOS BÁSICOS
@@ -13,7 +33,19 @@ from .node import Node
 Value = bool | str | float | None
 
 
-@dataclass
+def aux_field(default=None, *, factory=None):
+    """
+    Campo preenchido pelas etapas de análise e otimização.
+
+    Não é argumento do construtor e não faz parte da árvore (ver
+    `lox.node.node_fields`), da representação ou das comparações entre nós.
+    """
+    if factory is not None:
+        return field(default_factory=factory, init=False, repr=False, compare=False)
+    return field(default=default, init=False, repr=False, compare=False)
+
+
+@dataclass(slots=True)
 class Type(Node):
     """
     Representa uma declaração de tipo.
@@ -31,6 +63,8 @@ class Expr(Node, ABC):
     funções, etc.
     """
 
+    __slots__ = ()
+
 
 class Stmt(Node, ABC):
     """
@@ -40,8 +74,10 @@ class Stmt(Node, ABC):
     execução do código ou declaram elementos como classes, funções, etc.
     """
 
+    __slots__ = ()
 
-@dataclass
+
+@dataclass(slots=True)
 class Program(Node):
     """
     Representa um programa.
@@ -51,37 +87,110 @@ class Program(Node):
 
     stmts: list[Stmt]
 
+    # Etapas de análise já aplicadas ao programa (ver `lox.passes`).
+    passes: set[str] = aux_field(factory=set)
+
     def eval(self, ctx: Ctx):
         for stmt in self.stmts:
-            stmt.eval(ctx)
+            if type(result := stmt.eval(ctx)) is ReturnValue:
+                trampoline(result.value)
+                return
 
 
 #
 # EXPRESSÕES
 #
 
-@dataclass
-
+@dataclass(slots=True)
 class BinOp(Expr):
+    """
+    Uma operação infixa com dois operandos.
+
+    Ex.: x + y, x == y
+
+    Ao remover o açúcar sintático, o nó é convertido em `IntBinOp` ou em
+    `FloatBinOp`, de acordo com a regra dos inteiros. Árvores que não passam
+    por essa etapa decidem a regra a cada avaliação.
+    """
+
     left: Expr
     right: Expr
     op: Callable[[Value, Value], Value]
 
+    # Variante de `op` escolhida na primeira avaliação (ver `SpecializedBinOp`).
+    impl: Optional[Callable[[Value, Value], Value]] = aux_field()
+
     def eval(self, ctx: Ctx):
-        left_value = self.left.eval(ctx)
-        right_value = self.right.eval(ctx)
-        
-        if (isinstance(self.left, Var) and is_integer_var(self.left.name) and
-            isinstance(self.right, Var) and is_integer_var(self.right.name)):
-            left_value = to_integer(left_value)
-            right_value = to_integer(right_value)
-            result = self.op(left_value, right_value)
-            return int(result)
-        
-        return self.op(left_value, right_value)
-
-
-@dataclass
+        if self.is_integer():
+            return IntBinOp.eval(self, ctx)
+        return FloatBinOp.eval(self, ctx)
+
+    def is_integer(self) -> bool:
+        """
+        Verifica se a operação segue a regra dos inteiros, isto é, se os dois
+        operandos são variáveis inteiras.
+        """
+        return is_integer_operand(self.left) and is_integer_operand(self.right)
+
+    def desugar_self(self):
+        self.__class__ = IntBinOp if self.is_integer() else FloatBinOp
+
+
+class IntBinOp(BinOp):
+    """
+    Operação entre duas variáveis inteiras: os operandos e o resultado são
+    convertidos para inteiros. Comparações mantêm o resultado booleano (ver
+    `runtime.COMPARISONS`).
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        left = to_integer(self.left.eval(ctx))
+        right = to_integer(self.right.eval(ctx))
+        if self.op in COMPARISONS:
+            return self.op(left, right)
+        return int(self.op(left, right))
+
+    def is_integer(self) -> bool:
+        return True
+
+
+class FloatBinOp(BinOp):
+    """
+    Operação comum, sem conversões para inteiro.
+
+    A primeira avaliação escolhe a variante da operação adequada aos tipos
+    dos operandos e converte o nó em `SpecializedBinOp`.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        left, right = self.left.eval(ctx), self.right.eval(ctx)
+        self.impl = specialize(self.op, left, right)
+        self.__class__ = SpecializedBinOp
+        return self.impl(left, right)
+
+    def is_integer(self) -> bool:
+        return False
+
+
+class SpecializedBinOp(FloatBinOp):
+    """
+    Operação comum que usa a variante escolhida na primeira avaliação.
+
+    As variantes verificam os tipos dos operandos e recorrem à operação
+    genérica quando eles mudam, de modo que o resultado é sempre o mesmo.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        return self.impl(self.left.eval(ctx), self.right.eval(ctx))
+
+
+@dataclass(slots=True)
 class Var(Expr):
     """
     Uma variável no código
@@ -91,14 +200,29 @@ class Var(Expr):
 
     name: str
 
+    # Anotações do resolvedor: escopo e posição onde a variável foi declarada.
+    # Permanecem None para variáveis globais e embutidas.
+    depth: Optional[int] = aux_field()
+    slot: Optional[int] = aux_field()
+
     def eval(self, ctx: Ctx):
+        if self.slot is not None:
+            if self.depth == 0:
+                value = ctx.values[self.slot]  # type: ignore[attr-defined]
+            else:
+                value = ctx.get_slot(self.depth, self.slot)
+            if value is not UNDEFINED:
+                return value
         try:
             return ctx[self.name]
         except KeyError:
             raise NameError(f"variável {self.name} não existe!")
 
+    def resolve_self(self, cursor):
+        self.depth, self.slot = cursor.resolve(self.name)
 
-@dataclass
+
+@dataclass(slots=True)
 class Literal(Expr):
     """
     Representa valores literais no código, ex.: strings, booleanos,
@@ -112,8 +236,18 @@ class Literal(Expr):
     def eval(self, ctx: Ctx):
         return self.value
 
+    def __setstate__(self, state):
+        # O parser interna as strings literais (ver `op.eq`), mas o pickle
+        # usado pelo cache em disco (ver `lox.cache.load_tree`) não preserva
+        # essa identidade.
+        _, slots = state
+        for name, value in slots.items():
+            object.__setattr__(self, name, value)
+        if type(self.value) is str:
+            self.value = sys.intern(self.value)
+
 
-@dataclass
+@dataclass(slots=True)
 class And(Expr):
     """
     Uma operação infixa com dois operandos.
@@ -122,7 +256,7 @@ class And(Expr):
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class Or(Expr):
     """
     Uma operação infixa com dois operandos.
@@ -130,7 +264,7 @@ class Or(Expr):
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expr):
     """
     Uma operação prefixa com um operando.
@@ -139,7 +273,7 @@ class UnaryOp(Expr):
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expr):
     """
     Uma chamada de função.
@@ -150,18 +284,33 @@ class Call(Expr):
     name: str
     params: list[Expr]
 
+    depth: Optional[int] = aux_field()
+    slot: Optional[int] = aux_field()
+
     def eval(self, ctx: Ctx):
-        func = ctx[self.name]
+        func = self.callee(ctx)
         params = []
         for param in self.params:
-            params.append(param.eval(ctx))
-
+            params.append(flatten(param.eval(ctx)))
+        return func(*params)
+
+    def callee(self, ctx: Ctx):
+        """
+        Obtém a função chamada, verificando se é de fato uma função.
+        """
+        if self.slot is None:
+            func = ctx[self.name]
+        elif (func := ctx.get_slot(self.depth, self.slot)) is UNDEFINED:
+            func = ctx[self.name]
         if callable(func):
-            return func(*params)
+            return func
         raise TypeError(f"{self.name} não é uma função!")
 
+    def resolve_self(self, cursor):
+        self.depth, self.slot = cursor.resolve(self.name)
 
-@dataclass
+
+@dataclass(slots=True)
 class This(Expr):
     """
     Acesso ao `this`.
@@ -170,7 +319,7 @@ class This(Expr):
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class Super(Expr):
     """
     Acesso a method ou atributo da superclasse.
@@ -179,7 +328,7 @@ class Super(Expr):
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class Assign(Expr):
     """
     Atribuição de variável.
@@ -189,21 +338,70 @@ class Assign(Expr):
     name: str
     value: Expr
 
+    depth: Optional[int] = aux_field()
+    slot: Optional[int] = aux_field()
+
     def eval(self, ctx: Ctx):
         value = self.value.eval(ctx)
-        if self.name and self.name[0].lower() in {'i', 'j', 'k', 'l', 'm', 'n'}:
-            if isinstance(value, str):
-                try:
-                    value = int(float(value))
-                except (ValueError, TypeError):
-                    value = 0
-            elif isinstance(value, (float, int)):
-                value = int(value)
+        if self.is_integer():
+            value = coerce_integer(value)
+        return self.assign(ctx, value)
+
+    def assign(self, ctx: Ctx, value: Value) -> Value:
+        """
+        Armazena o valor já convertido na variável.
+        """
+        if self.slot is not None:
+            try:
+                ctx.set_slot(self.depth, self.slot, value)
+                return value
+            except KeyError:
+                pass
         ctx[self.name] = value
         return value
 
+    def resolve_self(self, cursor):
+        self.depth, self.slot = cursor.resolve(self.name)
+
+    def is_integer(self) -> bool:
+        """
+        Verifica se o valor atribuído deve ser convertido para inteiro.
+        """
+        return bool(is_integer_var(self.name))
+
+    def desugar_self(self):
+        self.__class__ = IntAssign if self.is_integer() else FloatAssign
+
+
+class IntAssign(Assign):
+    """
+    Atribuição a uma variável inteira.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        return self.assign(ctx, coerce_integer(self.value.eval(ctx)))
+
+    def is_integer(self) -> bool:
+        return True
 
-@dataclass
+
+class FloatAssign(Assign):
+    """
+    Atribuição a uma variável comum.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        return self.assign(ctx, self.value.eval(ctx))
+
+    def is_integer(self) -> bool:
+        return False
+
+
+@dataclass(slots=True)
 class Getattr(Expr):
     """
     Acesso a atributo de um objeto.
@@ -211,8 +409,45 @@ class Getattr(Expr):
     Ex.: x.y
     """
 
+    obj: Expr
+    attr: str
+
+    cache: InlineCache = aux_field()
+
+    def __post_init__(self):
+        self.cache = InlineCache(self.attr)
+
+    def eval(self, ctx: Ctx):
+        return self.cache.get(self.obj.eval(ctx))
+
+
+@dataclass(slots=True)
+class Invoke(Expr):
+    """
+    Chamada de método.
+
+    Ex.: x.y(1, 2)
+
+    Diferente de avaliar `x.y` e chamar o resultado, o método é executado
+    diretamente sem criar um método vinculado à instância.
+    """
+
+    obj: Expr
+    attr: str
+    params: list[Expr]
+
+    cache: InlineCache = aux_field()
+
+    def __post_init__(self):
+        self.cache = InlineCache(self.attr)
+
+    def eval(self, ctx: Ctx):
+        obj = self.obj.eval(ctx)
+        args = tuple(param.eval(ctx) for param in self.params)
+        return self.cache.invoke(obj, args)
+
 
-@dataclass
+@dataclass(slots=True)
 class Setattr(Expr):
     """
     Atribuição de atributo de um objeto.
@@ -227,21 +462,58 @@ class Setattr(Expr):
         obj = self.obj.eval(ctx)
         value = self.value.eval(ctx)
         # Aplica conversão para inteiro se o nome do atributo começar com i, j, k, l, m ou n
-        if self.attr and self.attr[0].lower() in {'i', 'j', 'k', 'l', 'm', 'n'}:
-            if isinstance(value, str):
-                try:
-                    value = int(float(value))
-                except (ValueError, TypeError):
-                    value = 0
-            elif isinstance(value, (float, int)):
-                value = int(value)
-        setattr(obj, self.attr, value)
+        if self.is_integer():
+            value = coerce_integer(value)
+        set_attribute(obj, self.attr, value)
         return value
 
+    def is_integer(self) -> bool:
+        """
+        Verifica se o valor atribuído deve ser convertido para inteiro.
+        """
+        return bool(is_integer_var(self.attr))
+
+    def desugar_self(self):
+        self.__class__ = IntSetattr if self.is_integer() else FloatSetattr
+
+
+class IntSetattr(Setattr):
+    """
+    Atribuição a um atributo inteiro.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        obj = self.obj.eval(ctx)
+        value = coerce_integer(self.value.eval(ctx))
+        set_attribute(obj, self.attr, value)
+        return value
+
+    def is_integer(self) -> bool:
+        return True
+
+
+class FloatSetattr(Setattr):
+    """
+    Atribuição a um atributo comum.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        obj = self.obj.eval(ctx)
+        value = self.value.eval(ctx)
+        set_attribute(obj, self.attr, value)
+        return value
+
+    def is_integer(self) -> bool:
+        return False
+
 #
 # COMANDOS
 #
-@dataclass
+@dataclass(slots=True)
 class Print(Stmt):
     """
     Representa uma instrução de impressão.
@@ -256,44 +528,47 @@ class Print(Stmt):
         print(value)
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Stmt):
     """
     Representa uma instrução de retorno.
 
     Ex.: return x;
+
+    A avaliação não interrompe a execução diretamente: o comando produz um
+    `ReturnValue`, que é repassado até a função que está sendo executada.
     """
     expr: Optional[Expr] = None
 
+    def eval(self, ctx: Ctx):
+        if self.expr is None:
+            return ReturnValue(None)
+        return ReturnValue(self.expr.eval(ctx))
 
-@dataclass
-class VarDef(Stmt):
+    def desugar_self(self):
+        if isinstance(self.expr, Call):
+            self.__class__ = TailReturn
+
+
+class TailReturn(Return):
     """
-    Representa uma declaração de variável.
+    Retorno do resultado de uma chamada de função: `return f(x);`.
 
-    Ex.: var x = 42;
+    A chamada não é executada aqui. O comando devolve um `TailCall`, que a
+    função atual repassa a quem a chamou, liberando a pilha do Python antes
+    de a chamada ser feita.
     """
-    name: str
-    initializer: Optional[Expr] = None
-    type_hint: Optional[Type] = None
 
-    def eval(self, ctx: Ctx):
-        if self.initializer is not None:
-            value = self.initializer.eval(ctx)
-            # Aplica conversão para inteiro se o nome da variável começar com i, j, k, l, m ou n
-            if self.name and self.name[0].lower() in {'i', 'j', 'k', 'l', 'm', 'n'}:
-                if isinstance(value, str):
-                    try:
-                        value = int(float(value))
-                    except (ValueError, TypeError):
-                        value = 0
-                elif isinstance(value, (float, int)):
-                    value = int(value)
-            ctx[self.name] = value
+    __slots__ = ()
 
+    def eval(self, ctx: Ctx):
+        call = self.expr
+        func = call.callee(ctx)
+        args = tuple(flatten(param.eval(ctx)) for param in call.params)
+        return ReturnValue(TailCall(func, args))
 
 
-@dataclass
+@dataclass(slots=True)
 class If(Stmt):
     """
     Representa uma instrução condicional.
@@ -305,20 +580,142 @@ class If(Stmt):
     else_branch: Optional[Stmt] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class For(Stmt):
     """
     Representa um laço de repetição.
 
     Ex.: for (var i = 0; i < 10; i++) { ... }
+
+    Ao remover o açúcar sintático, laços de contagem são convertidos em
+    `CountedFor`.
     """
     initializer: Optional[Stmt]
     condition: Optional[Expr]
     increment: Optional[Expr]
     body: Stmt
 
+    # Posições da variável declarada no inicializador (ver `block_scope`).
+    frame_slots: Optional[dict[str, int]] = aux_field()
 
-@dataclass
+    def eval(self, ctx: Ctx):
+        env = block_scope(ctx, self.frame_slots)
+        if self.initializer is not None:
+            self.initializer.eval(env)
+        return self.loop(env)
+
+    def scope_slots(self) -> dict[str, int]:
+        """
+        Mapeia a variável declarada no inicializador para sua posição.
+        """
+        if self.initializer is None:
+            return {}
+        return slots_of(declared_names([self.initializer]))
+
+    def resolve_self(self, cursor):
+        self.frame_slots = scope_frame_slots(self, cursor)
+
+    def loop(self, env: Ctx):
+        """
+        Executa o laço a partir da primeira verificação da condição.
+        """
+        condition, body, increment = self.condition, self.body, self.increment
+        while condition is None or truthy(condition.eval(env)):
+            if type(result := body.eval(env)) is ReturnValue:
+                return result
+            if increment is not None:
+                increment.eval(env)
+        return None
+
+    def desugar_self(self):
+        if self.counter() is not None:
+            self.__class__ = CountedFor
+
+    def counter(self) -> Optional[str]:
+        """
+        Retorna o nome do contador se o laço tiver a forma
+
+            for (var i = <expr>; i < <limite>; i = i + 1) <corpo>
+
+        (ou `i <= <limite>`), em que `i` é uma variável inteira e o limite é
+        um literal ou uma variável. O corpo não pode modificar o contador
+        nem o limite, o que exclui atribuições a esses nomes e funções
+        declaradas no corpo. Se o limite for uma variável, o corpo também não
+        pode chamar funções, que poderiam modificá-la.
+        """
+        init, cond, incr = self.initializer, self.condition, self.increment
+        if not (isinstance(init, VarDef) and init.initializer is not None):
+            return None
+        name = init.name
+        if not is_integer_var(name):
+            return None
+
+        if not (
+            isinstance(cond, BinOp)
+            and cond.op in (lt, le)
+            and isinstance(cond.left, Var)
+            and cond.left.name == name
+            and isinstance(cond.right, (Literal, Var))
+        ):
+            return None
+
+        if not (
+            isinstance(incr, Assign)
+            and incr.name == name
+            and isinstance(step := incr.value, BinOp)
+            and step.op is add
+            and isinstance(step.left, Var)
+            and step.left.name == name
+            and isinstance(step.right, Literal)
+            and step.right.value == 1
+        ):
+            return None
+
+        fixed = {name}
+        if isinstance(cond.right, Var):
+            fixed.add(cond.right.name)
+        for node in self.body.descendants():
+            if isinstance(node, Function):
+                return None
+            if isinstance(node, (Assign, VarDef)) and node.name in fixed:
+                return None
+            if isinstance(node, Call) and len(fixed) > 1:
+                return None
+        return name
+
+
+class CountedFor(For):
+    """
+    Laço de contagem (ver `For.counter`) executado com um `range` do Python.
+
+    O contador é atualizado diretamente, sem avaliar a condição, o
+    incremento e a conversão para inteiro a cada iteração. Se o valor
+    inicial ou o limite não forem números, o laço é executado pelo caminho
+    genérico.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        env = block_scope(ctx, self.frame_slots)
+        self.initializer.eval(env)
+        start = self.condition.left.eval(env)
+        limit = self.condition.right.eval(env)
+        if type(start) is not int or type(limit) not in (int, float) or not isfinite(limit):
+            return self.loop(env)
+
+        stop = ceil(limit) if self.condition.op is lt else floor(limit) + 1
+        increment, body = self.increment, self.body
+        for i in range(start, stop):
+            increment.assign(env, i)
+            if type(result := body.eval(env)) is ReturnValue:
+                return result
+        # Valor final do contador, como no laço genérico.
+        increment.assign(env, max(start, stop))
+        return None
+
+
+@dataclass(slots=True)
 class While(Stmt):
     """
     Representa um laço de repetição.
@@ -328,8 +725,124 @@ class While(Stmt):
     condition: Expr
     body: Stmt
 
+    def eval(self, ctx: Ctx):
+        condition, body = self.condition, self.body
+        while truthy(condition.eval(ctx)):
+            if type(result := body.eval(ctx)) is ReturnValue:
+                return result
+        return None
+
+
+@dataclass(slots=True)
+class InvariantScope(Stmt):
+    """
+    Laço cujas expressões invariantes foram movidas para fora do corpo (ver
+    `lox.optimize`).
+
+    Cada execução do laço cria uma lista com os valores das expressões
+    invariantes, que são calculados na primeira vez que são usados. As
+    listas formam uma pilha, de modo que chamadas recursivas que executam o
+    mesmo laço não compartilham valores.
+    """
+
+    loop: Stmt
+    size: int = aux_field(0)
+    caches: list[list] = aux_field(factory=list)
+
+    def eval(self, ctx: Ctx):
+        self.caches.append([UNDEFINED] * self.size)
+        try:
+            return self.loop.eval(ctx)
+        finally:
+            self.caches.pop()
+
+    def allocate(self) -> int:
+        """
+        Reserva uma posição na lista de valores do laço.
+        """
+        self.size += 1
+        return self.size - 1
+
+
+@dataclass(slots=True)
+class Invariant(Expr):
+    """
+    Expressão que produz o mesmo valor em todas as iterações de um laço.
+
+    A expressão é avaliada apenas na primeira vez em que é usada em cada
+    execução do laço. Se o laço não usar a expressão, ela nunca é avaliada,
+    de modo que erros de execução ocorrem no mesmo ponto do programa
+    original.
+    """
+
+    expr: Expr
+    scope: Optional[InvariantScope] = aux_field()
+    index: int = aux_field(0)
+
+    def eval(self, ctx: Ctx):
+        cache = self.scope.caches[-1]  # type: ignore[union-attr]
+        value = cache[self.index]
+        if value is UNDEFINED:
+            value = cache[self.index] = self.expr.eval(ctx)
+        return value
+
 
-@dataclass
+@dataclass(slots=True)
+class InductionProduct(Expr):
+    """
+    Multiplicação do contador de um laço de contagem por um valor invariante.
+
+    Ex.: i * 3 em for (var i = 0; i < n; i = i + 1) { ... }
+
+    Quando o contador avança uma unidade, o novo valor é obtido somando o
+    fator ao valor anterior em vez de refazer a multiplicação. O resultado é
+    idêntico ao da multiplicação: a soma só é usada quando o fator é um
+    inteiro (ou um float com valor inteiro) e os valores são representados
+    exatamente.
+    """
+
+    expr: BinOp
+
+    # Maior inteiro a partir do qual floats deixam de ser exatos.
+    EXACT = 2.0**53
+
+    scope: Optional[InvariantScope] = aux_field()
+    index: int = aux_field(0)
+    counter_left: bool = aux_field(True)
+
+    def eval(self, ctx: Ctx):
+        expr = self.expr
+        counter = (expr.left if self.counter_left else expr.right).eval(ctx)
+        cache = self.scope.caches[-1]  # type: ignore[union-attr]
+        state = cache[self.index]
+        if state is not UNDEFINED and counter == state[0] + 1 and type(counter) is int:
+            value = state[1] + state[2]
+            if type(value) is int or -self.EXACT < value < self.EXACT:
+                cache[self.index] = (counter, value, state[2])
+                return value
+
+        value = expr.eval(ctx)
+        factor = (expr.right if self.counter_left else expr.left).eval(ctx)
+        if expr.is_integer():
+            factor = to_integer(factor)
+        if type(counter) is int and self.is_exact(factor, value):
+            cache[self.index] = (counter, value, factor)
+        else:
+            cache[self.index] = UNDEFINED
+        return value
+
+    def is_exact(self, factor: Value, value: Value) -> bool:
+        if type(factor) is int:
+            return type(value) in (int, float)
+        return (
+            type(factor) is float
+            and type(value) is float
+            and factor.is_integer()
+            and -self.EXACT < value < self.EXACT
+        )
+
+
+@dataclass(slots=True)
 class Block(Node):
     """
     Representa bloco de comandos.
@@ -338,31 +851,115 @@ class Block(Node):
     """
     stmts: list[Stmt]
 
+    # Posições das variáveis declaradas no bloco (ver `block_scope`).
+    frame_slots: Optional[dict[str, int]] = aux_field()
 
-@dataclass
+    def eval(self, ctx: Ctx):
+        env = block_scope(ctx, self.frame_slots)
+        for stmt in self.stmts:
+            if type(result := stmt.eval(env)) is ReturnValue:
+                return result
+        return None
+
+    def scope_slots(self) -> dict[str, int]:
+        """
+        Mapeia os nomes declarados diretamente no bloco para suas posições.
+        """
+        return slots_of(declared_names(self.stmts))
+
+    def resolve_self(self, cursor):
+        # O corpo de uma função é executado no `Frame` da própria função.
+        parent = cursor.parent_cursor
+        if parent is not None and isinstance(parent.node, Function):
+            self.frame_slots = None
+        else:
+            self.frame_slots = scope_frame_slots(self, cursor)
+
+
+@dataclass(slots=True)
 class Function(Stmt):
     name: str
     params: list[tuple[str, Optional[Type]]] = field(default_factory=list)
     return_type: Optional[Type] = None
     body: Optional[Block] = None
 
-    def eval(self, ctx: Ctx):
-        def lox_function(*args):
-            env = {}
-            for (param_name, _), arg in zip(self.params, args):
-                env[param_name] = arg
-            env = ctx.push(env)
-            try:
-                if self.body:
-                    for stmt in self.body.stmts:
-                        stmt.eval(env)
-            except Return as e:
-                return e.value
-            return None
-
-        ctx[self.name] = lox_function
+    # Anotações do resolvedor. O nome da função é declarado no escopo que a
+    # contém, enquanto `frame_slots` descreve o escopo da própria função.
+    depth: Optional[int] = aux_field()
+    slot: Optional[int] = aux_field()
+    frame_slots: Optional[dict[str, int]] = aux_field()
+    frame_padding: tuple = aux_field(())
+    _scope_slots: Optional[dict[str, int]] = aux_field()
 
-@dataclass
+    def eval(self, ctx: Ctx):
+        # Com tail_call=True, chamadas em posição de cauda são devolvidas como
+        # TailCall em vez de executadas (ver `runtime.trampoline`).
+        if self.frame_slots is None:
+            def lox_function(*args, tail_call=False):
+                env = {}
+                for (param_name, _), arg in zip(self.params, args):
+                    env[param_name] = arg
+                result = self.call(ctx.push(env))
+                if tail_call or type(result) is not TailCall:
+                    return result
+                return trampoline(result)
+        else:
+            def lox_function(*args, tail_call=False):
+                result = self.call(Frame(self.frame_slots, self.frame_values(args), ctx))
+                if tail_call or type(result) is not TailCall:
+                    return result
+                return trampoline(result)
+
+        if self.slot is None:
+            ctx.var_def(self.name, lox_function)
+        else:
+            define_slot(ctx, self.name, self.slot, lox_function)
+
+    def frame_values(self, args: tuple) -> list:
+        """
+        Cria a lista de valores do `Frame` de uma chamada.
+
+        Os argumentos ocupam as primeiras posições e as demais variáveis
+        começam indefinidas. Argumentos em excesso são ignorados e parâmetros
+        sem argumento permanecem indefinidos.
+        """
+        if len(args) == len(self.params):
+            return [*args, *self.frame_padding]
+        values = [*args[: len(self.params)]]
+        values += [UNDEFINED] * (len(self.frame_slots) - len(values))  # type: ignore[arg-type]
+        return values
+
+    def call(self, env: Ctx):
+        """
+        Executa o corpo da função no ambiente da chamada.
+        """
+        if self.body:
+            return run_body(self.body.stmts, env)
+        return None
+
+    def resolve_self(self, cursor):
+        self.depth, self.slot = cursor.resolve(self.name)
+        self.frame_slots = self.scope_slots()
+        self.frame_padding = (UNDEFINED,) * (len(self.frame_slots) - len(self.params))
+
+    def scope_slots(self) -> dict[str, int]:
+        """
+        Mapeia os nomes declarados no escopo da função para suas posições.
+
+        Os parâmetros ocupam as primeiras posições, seguidos pelas variáveis e
+        funções declaradas no corpo, na ordem em que aparecem. Blocos, laços
+        `for` e funções aninhadas possuem seus próprios escopos e não são
+        inspecionados.
+        """
+        if self._scope_slots is None:
+            slots = {name: i for i, (name, _) in enumerate(self.params)}
+            if self.body is not None:
+                for name in declared_names(self.body.stmts):
+                    slots.setdefault(name, len(slots))
+            self._scope_slots = slots
+        return self._scope_slots
+
+@dataclass(slots=True)
 class Class(Stmt):
     """
     Representa uma classe.
@@ -373,13 +970,150 @@ class Class(Stmt):
     superclass: Optional[Var] = None
     methods: list[Function] = field(default_factory=list)
 
-@dataclass
+@dataclass(slots=True)
 class VarDef(Stmt):
+    """
+    Representa uma declaração de variável.
+
+    Ex.: var x = 42;
+    """
+
     name: str
     initializer: Optional[Expr] = None
     type_hint: Optional[Type] = None
 
+    depth: Optional[int] = aux_field()
+    slot: Optional[int] = aux_field()
+
+    def eval(self, ctx: Ctx):
+        value = None
+        if self.initializer is not None:
+            value = self.initializer.eval(ctx)
+            # Aplica conversão para inteiro se o nome da variável começar com i, j, k, l, m ou n
+            if self.is_integer():
+                value = coerce_integer(value)
+        self.define(ctx, value)
+
+    def define(self, ctx: Ctx, value: Value) -> None:
+        """
+        Define a variável com o valor já convertido.
+        """
+        if self.slot is None:
+            ctx.var_def(self.name, value)
+        else:
+            define_slot(ctx, self.name, self.slot, value)
+
+    def resolve_self(self, cursor):
+        self.depth, self.slot = cursor.resolve(self.name)
+
+    def is_integer(self) -> bool:
+        """
+        Verifica se o valor inicial deve ser convertido para inteiro.
+        """
+        return bool(is_integer_var(self.name))
+
+    def desugar_self(self):
+        self.__class__ = IntVarDef if self.is_integer() else FloatVarDef
+
+
+class IntVarDef(VarDef):
+    """
+    Declaração de uma variável inteira.
+    """
+
+    __slots__ = ()
+
+    def eval(self, ctx: Ctx):
+        value = None
+        if self.initializer is not None:
+            value = coerce_integer(self.initializer.eval(ctx))
+        self.define(ctx, value)
+
+    def is_integer(self) -> bool:
+        return True
+
+
+class FloatVarDef(VarDef):
+    """
+    Declaração de uma variável comum.
+    """
+
+    __slots__ = ()
+
     def eval(self, ctx: Ctx):
+        value = None
         if self.initializer is not None:
             value = self.initializer.eval(ctx)
-            ctx[self.name] = value
\ No newline at end of file
+        self.define(ctx, value)
+
+    def is_integer(self) -> bool:
+        return False
+
+
+def define_slot(frame: Ctx, name: str, slot: int, value: Value) -> None:
+    """
+    Define uma variável resolvida na posição `slot` do `Frame` atual.
+    """
+    values = frame.values  # type: ignore[attr-defined]
+    if values[slot] is not UNDEFINED:
+        raise KeyError(f"Variable '{name}' already defined in the current scope.")
+    values[slot] = value
+
+
+def block_scope(ctx: Ctx, slots: Optional[dict[str, int]]) -> Ctx:
+    """
+    Escopo usado por blocos e laços `for`.
+
+    Dentro de funções resolvidas, blocos e laços que declaram variáveis
+    recebem um novo `Frame` com as posições `slots` anotadas pelo resolvedor,
+    de modo que cada execução do bloco (ex.: em cada iteração de um laço)
+    define novas variáveis. Os que não declaram variáveis usam o `Frame`
+    atual. Nos demais casos, um novo escopo é empilhado.
+    """
+    if slots is not None:
+        return Frame(slots, [UNDEFINED] * len(slots), ctx)
+    if type(ctx) is Frame:
+        return ctx
+    return ctx.push({})
+
+
+def scope_frame_slots(node: "Block | For", cursor) -> Optional[dict[str, int]]:
+    """
+    Posições do `Frame` criado pelo bloco ou laço durante a execução.
+
+    Retorna None se o nó não declara variáveis ou não está dentro de uma
+    função (ver `Cursor.enclosing_scope`).
+    """
+    if cursor.enclosing_scope() is None:
+        return None
+    return node.scope_slots() or None
+
+
+def is_integer_operand(node: Node) -> bool:
+    """
+    Verifica se o operando de uma operação binária segue a regra dos inteiros.
+    """
+    return isinstance(node, Var) and bool(is_integer_var(node.name))
+
+
+def declared_names(nodes: Iterable[Node]) -> Iterator[str]:
+    """
+    Itera sobre os nomes declarados no escopo formado pelos nós, sem entrar
+    em blocos, laços `for` e funções aninhadas, que possuem seus próprios
+    escopos.
+    """
+    pending = list(nodes)
+    pending.reverse()
+    while pending:
+        child = pending.pop()
+        if isinstance(child, (VarDef, Function)):
+            yield child.name
+        if not isinstance(child, (Block, For, Function)):
+            pending.extend(reversed(list(child.children())))
+
+
+def slots_of(names: Iterable[str]) -> dict[str, int]:
+    """
+    Atribui posições consecutivas aos nomes, ignorando repetições.
+    """
+    return {name: i for i, name in enumerate(dict.fromkeys(names))}
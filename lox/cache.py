@@ -0,0 +1,290 @@
+"""
+Cache em disco usado pelo compilador Lox.
+
+Construir as tabelas LALR da gramática é a etapa mais cara da inicialização
+do compilador. Este módulo usa o cache do próprio Lark (opção `cache`) para
+salvar as tabelas em disco, em arquivos indexados pelo hash do conteúdo da
+gramática e pela versão do Lark, de modo que execuções subsequentes
+simplesmente carreguem as tabelas prontas.
+
+Opcionalmente, as árvores sintáticas já validadas também podem ser
+armazenadas, indexadas pelo hash do código fonte, da gramática e da versão do
+compilador. O tamanho total deste cache é limitado pela variável de ambiente
+`LOX_CACHE_SIZE` (em bytes) e os arquivos usados há mais tempo são removidos
+primeiro.
+
+O mecanismo de execução "python" também armazena aqui os objetos de código
+compilados a partir de programas Lox (ver `load_code`). Esse cache não é
+afetado pela opção `--no-cache` da linha de comando, que se aplica apenas às
+árvores sintáticas.
+
+O diretório de cache pode ser controlado pela variável de ambiente
+`LOX_CACHE_DIR`. Caso o diretório não possa ser criado ou escrito, o cache é
+ignorado silenciosamente e as tabelas são reconstruídas normalmente.
+"""
+
+import ast
+import hashlib
+import marshal
+import os
+import pickle
+import tempfile
+import zlib
+from functools import cache
+from importlib import metadata
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Optional, TypeVar
+
+import lark
+from lark import Lark
+
+DIR = Path(__file__).parent
+CACHE_DIR_ENV = "LOX_CACHE_DIR"
+# Opções do Lark que não alteram as tabelas da gramática.
+UNCACHED_OPTIONS = {"transformer", "postlex", "lexer_callbacks", "edit_terminals"}
+T = TypeVar("T")
+
+
+def cache_dir() -> Path:
+    """
+    Retorna o diretório onde os arquivos de cache são armazenados.
+    """
+    if path := os.environ.get(CACHE_DIR_ENV):
+        return Path(path)
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "lox"
+
+
+def digest(*parts: str | bytes) -> str:
+    """
+    Calcula um hash hexadecimal a partir das partes fornecidas.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        hasher.update(part)
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def grammar_key(grammar: str, **options: Any) -> str:
+    """
+    Chave que identifica as tabelas de uma gramática.
+
+    Leva em conta o conteúdo da gramática, a versão do Lark e as opções
+    usadas para construir o parser.
+    """
+    opts = repr(sorted(options.items()))
+    return digest("grammar", lark.__version__, grammar, opts)
+
+
+def read_bytes(path: Path) -> Optional[bytes]:
+    """
+    Lê o conteúdo de um arquivo de cache ou retorna None se não existir.
+    """
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def write_bytes(path: Path, data: bytes) -> bool:
+    """
+    Escreve um arquivo de cache de forma atômica.
+
+    Retorna False se não foi possível escrever o arquivo.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+def make_parser(grammar_path: Path, **options: Any) -> Lark:
+    """
+    Cria um parser Lark, carregando as tabelas da gramática do cache em disco
+    ou construindo-as se necessário.
+
+    Opções que não alteram as tabelas, como `transformer`, não fazem parte
+    da chave, de modo que parsers com transformers diferentes compartilham o
+    mesmo arquivo.
+    """
+    grammar = grammar_path.read_text(encoding="utf-8")
+    key_options = {k: v for k, v in options.items() if k not in UNCACHED_OPTIONS}
+    # O Lark salva o transformer junto com as tabelas e o restaura ao carregar
+    # o arquivo, a menos que outro seja fornecido explicitamente.
+    options.setdefault("transformer", None)
+    path = cache_dir() / "grammar" / f"{grammar_key(grammar, **key_options)}.lark"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return Lark(grammar, cache=str(path), **options)
+    except OSError:
+        return Lark(grammar, **options)
+
+
+#
+# CACHE DE ÁRVORES SINTÁTICAS
+#
+
+AST_CACHE_SIZE_ENV = "LOX_CACHE_SIZE"
+AST_CACHE_SIZE = 64 * 1024 * 1024
+
+
+@cache
+def lox_version() -> str:
+    """
+    Identifica a versão do compilador Lox.
+
+    Combina a versão do pacote com o hash dos módulos que determinam o
+    formato da árvore sintática. Desse modo, modificações no código-fonte
+    do compilador invalidam o cache mesmo sem alterar o número de versão.
+    """
+    try:
+        version = metadata.version("lox")
+    except metadata.PackageNotFoundError:
+        version = "0+unknown"
+    paths = [DIR / "grammar.lark", *sorted(DIR.glob("*.py"))]
+    sources = [read_bytes(path) or b"" for path in paths]
+    return digest(version, *sources)
+
+
+@cache
+def grammar_digest() -> str:
+    """
+    Hash da gramática do Lox e da versão do Lark.
+    """
+    return grammar_key((DIR / "grammar.lark").read_text(encoding="utf-8"))
+
+
+def ast_key(src: str, start: str) -> str:
+    """
+    Chave que identifica a árvore sintática de um código fonte.
+    """
+    return digest("ast", lox_version(), grammar_digest(), start, src)
+
+
+def ast_cache_size() -> int:
+    """
+    Tamanho máximo do cache de árvores sintáticas em bytes.
+    """
+    try:
+        return int(os.environ[AST_CACHE_SIZE_ENV])
+    except (KeyError, ValueError):
+        return AST_CACHE_SIZE
+
+
+def load_tree(src: str, start: str, build: Callable[[], T]) -> T:
+    """
+    Carrega a árvore sintática do cache ou a constrói usando `build`.
+
+    A árvore armazenada já passou pela validação e pela remoção de açúcar
+    sintático, de modo que carregá-la dispensa todas as etapas de análise.
+    """
+    path = cache_dir() / "ast" / f"{ast_key(src, start)}.pickle.z"
+
+    if (data := read_bytes(path)) is not None:
+        try:
+            tree = pickle.loads(zlib.decompress(data))
+        except Exception:
+            pass
+        else:
+            touch(path)
+            return tree
+
+    tree = build()
+    try:
+        data = zlib.compress(pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        # Árvores com valores que não podem ser serializados (ex.: funções
+        # anônimas do Python) simplesmente não são armazenadas.
+        return tree
+    if write_bytes(path, data):
+        evict(path.parent, ast_cache_size())
+    return tree
+
+
+#
+# CACHE DE OBJETOS DE CÓDIGO
+#
+
+
+def code_key(module: ast.Module, filename: str) -> str:
+    """
+    Chave que identifica o objeto de código produzido por um módulo Python.
+
+    Leva em conta a versão do bytecode do CPython, que muda entre versões
+    incompatíveis do interpretador.
+    """
+    return digest("code", MAGIC_NUMBER, filename, ast.dump(module))
+
+
+def load_code(module: ast.Module, filename: str) -> CodeType:
+    """
+    Carrega do cache o objeto de código do módulo ou o compila.
+
+    Os objetos de código são serializados com `marshal`, o mesmo formato dos
+    arquivos .pyc, e compartilham o limite de tamanho do cache de árvores.
+    """
+    path = cache_dir() / "code" / f"{code_key(module, filename)}.pyc"
+
+    if (data := read_bytes(path)) is not None:
+        try:
+            code = marshal.loads(data)
+        except Exception:
+            pass
+        else:
+            touch(path)
+            return code
+
+    code = compile(module, filename, "exec")
+    if write_bytes(path, marshal.dumps(code)):
+        evict(path.parent, ast_cache_size())
+    return code
+
+
+def touch(path: Path) -> None:
+    """
+    Atualiza a data de modificação de um arquivo, marcando-o como recente.
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict(directory: Path, max_size: int) -> None:
+    """
+    Remove os arquivos menos recentes até que o diretório ocupe no máximo
+    `max_size` bytes.
+    """
+    entries = []
+    total = 0
+    for path in directory.iterdir():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
@@ -18,6 +18,8 @@ from lark import Token
 
 from . import eval as lox_eval
 from .ctx import Ctx
+from .engines import ENGINES
+from .optimize import optimize
 from .parser import lex, parse, parse_cst, parse_expr
 from .runtime import show_repr as lox_repr
 
@@ -58,6 +60,35 @@ def make_argparser():
         action="store_true",
         help="Mostra o código fonte do arquivo de entrada.",
     )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=ENGINES,
+        default="tree",
+        help="Mecanismo de execução (padrão: tree).",
+    )
+    parser.add_argument(
+        "-O",
+        "--optimize",
+        type=int,
+        choices=range(3),
+        default=0,
+        help="Nível de otimização da árvore sintática (padrão: 0, ver lox.optimize).",
+    )
+    parser.add_argument(
+        "-d",
+        "--disassemble",
+        action="store_true",
+        help="Imprime o bytecode usado pelo mecanismo vm.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=(
+            "Não usa o cache em disco de árvores sintáticas. Os objetos de código do "
+            "mecanismo python continuam armazenados (ver lox.cache.load_code)."
+        ),
+    )
     return parser
 
 
@@ -90,9 +121,10 @@ def main():
         print_color("=" * line_len, "blue")
         print()
 
-    if not args.ast and not args.cst and not args.lex:
+    if not args.ast and not args.cst and not args.lex and not args.disassemble:
         try:
-            lox_eval(source)
+            tree = optimize(parse(source, cache=not args.no_cache), args.optimize)
+            lox_eval(tree, engine=args.engine)
         except Exception as e:
             on_error(e, args.pm)
 
@@ -105,7 +137,7 @@ def debug_source(source: str, args):
     Mostra informações de depuração sobre o código Lox passado como argumento.
     """
     if args.ast:
-        ast = parse(source)
+        ast = parse(source, cache=not args.no_cache)
         for node in ast.lark_descendents():
             if isinstance(node, Token):
                 descr = repr(node)
@@ -119,6 +151,12 @@ def debug_source(source: str, args):
 
         print(ast.pretty())
 
+    if args.disassemble:
+        from .engines.bytecode import Compiler, disassemble
+
+        ast = parse(source, cache=not args.no_cache)
+        print(disassemble(Compiler.compile(ast)))
+
     if args.cst:
         cst = parse_cst(source)
         print(cst.pretty())
@@ -1,5 +1,6 @@
 import math
 import time
+from collections.abc import MutableMapping
 from dataclasses import field
 from typing import TYPE_CHECKING, Iterator, Optional, TypeVar
 
@@ -32,7 +33,19 @@ class _Builtins(dict):
 BUILTINS = _Builtins()
 
 
-@dataclass
+class _Undefined:
+    """
+    Marca posições de um `Frame` cujas variáveis ainda não foram definidas.
+    """
+
+    def __repr__(self) -> str:
+        return "UNDEFINED"
+
+
+UNDEFINED = _Undefined()
+
+
+@dataclass(slots=True)
 class Ctx:
     """
     Contexto de execução. Por enquanto é só um dicionário que armazena nomes
@@ -74,6 +87,60 @@ class Ctx:
         else:
             raise KeyError(f"Variable '{name}' not found in context.")
 
+    def get_at(self, depth: int, name: str) -> "Value":
+        """
+        Obtém o valor de uma variável no escopo `depth` níveis acima do atual.
+
+        Usado pelas variáveis resolvidas estaticamente, que conhecem de
+        antemão o escopo onde foram declaradas. Lança KeyError se a variável
+        não estiver definida nesse escopo.
+        """
+        this = self
+        for _ in range(depth):
+            this = this.parent  # type: ignore[assignment]
+        return this.scope[name]
+
+    def set_at(self, depth: int, name: str, value: "Value") -> None:
+        """
+        Define o valor de uma variável no escopo `depth` níveis acima do atual.
+
+        Lança KeyError se a variável não estiver definida nesse escopo.
+        """
+        this = self
+        for _ in range(depth):
+            this = this.parent  # type: ignore[assignment]
+        scope = this.scope
+        if name not in scope:
+            raise KeyError(f"Variable '{name}' not found in context.")
+        scope[name] = value
+
+    def get_slot(self, depth: int, slot: int) -> "Value":
+        """
+        Obtém o valor armazenado na posição `slot` do `Frame` localizado
+        `depth` níveis acima do atual.
+
+        Retorna UNDEFINED se a variável ainda não foi definida.
+        """
+        this = self
+        for _ in range(depth):
+            this = this.parent  # type: ignore[assignment]
+        return this.values[slot]  # type: ignore[attr-defined]
+
+    def set_slot(self, depth: int, slot: int, value: "Value") -> None:
+        """
+        Modifica o valor armazenado na posição `slot` do `Frame` localizado
+        `depth` níveis acima do atual.
+
+        Lança KeyError se a variável ainda não foi definida.
+        """
+        this = self
+        for _ in range(depth):
+            this = this.parent  # type: ignore[assignment]
+        values = this.values  # type: ignore[attr-defined]
+        if values[slot] is UNDEFINED:
+            raise KeyError(f"Variable in slot {slot} not found in context.")
+        values[slot] = value
+
     def __contains__(self, name: str) -> bool:
         """
         Verifica se uma variável existe no contexto.
@@ -151,6 +218,86 @@ class Ctx:
         return self.parent.parent is None
 
 
+class Frame(Ctx):
+    """
+    Escopo de uma chamada de função com as variáveis armazenadas em uma lista
+    de tamanho fixo.
+
+    As posições de cada variável são determinadas pelo resolvedor (ver
+    `Function.scope_slots`) e compartilhadas por todas as chamadas da mesma
+    função, de modo que cada chamada aloca apenas a lista de valores. Blocos
+    e laços `for` que declaram variáveis dentro de funções também criam um
+    `Frame` a cada execução (ver `ast.block_scope`). O acesso por nome
+    continua disponível através do atributo `scope`, que expõe uma visão da
+    lista como um dicionário.
+    """
+
+    # `parent` é herdado de `Ctx`. O campo `scope` de `Ctx` não é usado e é
+    # substituído pela propriedade abaixo.
+    __slots__ = ("slots", "values")
+
+    def __init__(self, slots: dict[str, int], values: list, parent: Ctx):
+        self.slots = slots
+        self.values = values
+        self.parent = parent
+
+    @property
+    def scope(self) -> "FrameScope":  # type: ignore[override]
+        return FrameScope(self.slots, self.values)
+
+    def __getitem__(self, name: str) -> "Value":
+        slot = self.slots.get(name)
+        if slot is not None:
+            value = self.values[slot]
+            if value is not UNDEFINED:
+                return value
+        return self.parent[name]  # type: ignore[index]
+
+    def var_def(self, name: str, value: "Value") -> None:
+        slot = self.slots[name]
+        if self.values[slot] is not UNDEFINED:
+            raise KeyError(f"Variable '{name}' already defined in the current scope.")
+        self.values[slot] = value
+
+
+class FrameScope(MutableMapping):
+    """
+    Visão de um `Frame` como um dicionário de variáveis definidas.
+    """
+
+    __slots__ = ("slots", "values")
+
+    def __init__(self, slots: dict[str, int], values: list):
+        self.slots = slots
+        self.values = values
+
+    def __getitem__(self, name: str) -> "Value":
+        value = self.values[self.slots[name]]
+        if value is UNDEFINED:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value: "Value") -> None:
+        self.values[self.slots[name]] = value
+
+    def __delitem__(self, name: str) -> None:
+        self[name]
+        self.values[self.slots[name]] = UNDEFINED
+
+    def __iter__(self) -> Iterator[str]:
+        values = self.values
+        return (name for name, slot in self.slots.items() if values[slot] is not UNDEFINED)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def copy(self) -> ScopeDict:
+        return dict(self)
+
+
 def pretty_scope(env: ScopeDict, index: int) -> str:
     """
     Representa um escopo como string.
@@ -0,0 +1,78 @@
+"""
+Mecanismos alternativos de execução para programas Lox.
+
+O mecanismo padrão ("tree") avalia a árvore sintática diretamente, chamando o
+método `eval` de cada nó. Os demais mecanismos transformam a árvore em outra
+representação antes de executá-la. Todos recebem uma árvore já validada e o
+contexto de execução e retornam o valor produzido pela árvore.
+
+Os valores que voltam ao código Python (o resultado e as variáveis do
+contexto) não contêm cordas (ver `runtime.Rope`), somente strings.
+"""
+
+from functools import wraps
+from importlib import import_module
+from typing import TYPE_CHECKING, Callable
+
+from ..ctx import Frame
+from ..runtime import Rope, flatten
+
+if TYPE_CHECKING:
+    from ..ast import Value
+    from ..ctx import Ctx
+    from ..node import Node
+
+Engine = Callable[["Node", "Ctx"], "Value"]
+
+# Os módulos são importados somente quando o mecanismo é utilizado.
+ENGINES: dict[str, str] = {
+    "tree": "lox.engines:run_tree",
+    "closure": "lox.engines.closures:run",
+    "vm": "lox.engines.vm:run",
+    "python": "lox.engines.pycode:run",
+    "stack": "lox.engines.stack:run",
+}
+
+
+def get_engine(name: str) -> Engine:
+    """
+    Retorna a função que executa uma árvore sintática com o mecanismo
+    indicado.
+    """
+    try:
+        module, _, attr = ENGINES[name].partition(":")
+    except KeyError:
+        options = ", ".join(ENGINES)
+        raise ValueError(f"Mecanismo de execução desconhecido: {name} ({options})")
+    return flattening(getattr(import_module(module), attr))
+
+
+def flattening(run: Engine) -> Engine:
+    """
+    Converte as cordas do resultado e das variáveis do contexto em strings
+    ao final da execução.
+    """
+
+    @wraps(run)
+    def engine(node: "Node", ctx: "Ctx") -> "Value":
+        try:
+            return flatten(run(node, ctx))
+        finally:
+            scope: "Ctx | None" = ctx
+            while scope is not None:
+                if isinstance(scope, Frame):
+                    scope.values[:] = map(flatten, scope.values)
+                else:
+                    values = scope.scope
+                    for name in [name for name, value in values.items() if type(value) is Rope]:
+                        values[name] = str(values[name])
+                scope = scope.parent
+
+    return engine
+
+
+def run_tree(node: "Node", ctx: "Ctx") -> "Value":
+    """
+    Executa o nó percorrendo a árvore sintática.
+    """
+    return node.eval(ctx)
@@ -0,0 +1,615 @@
+"""
+Compilador da árvore sintática para bytecode.
+
+Segue a organização do clox (a segunda implementação do livro Crafting
+Interpreters): cada função é compilada para um `Chunk` com uma sequência de
+bytes de instruções e um vetor de constantes. Variáveis locais ocupam posições
+fixas na pilha da máquina virtual e variáveis capturadas por closures são
+acessadas por meio de upvalues. Variáveis globais continuam armazenadas no
+contexto (`Ctx`) fornecido durante a execução.
+
+Os limites do clox são respeitados: no máximo 256 constantes por chunk, 256
+variáveis locais e 256 upvalues por função e saltos de até 65535 bytes.
+
+As variáveis declaradas em um bloco ou no inicializador de um `for` ocupam
+novas posições locais da função (ou do script, no nível superior), visíveis
+apenas dentro do bloco. Ao final do bloco, CLOSE_UPVALUE fecha os upvalues
+que apontam para essas posições e as torna indefinidas, de modo que cada
+execução do bloco (ex.: em cada iteração de um laço) define novas variáveis
+e closures criadas em iterações diferentes não compartilham variáveis.
+
+Como no interpretador de árvore, uma variável é visível em todo o bloco
+que a declara (ver `Cursor.resolve`). Antes da declaração, a variável ainda
+está indefinida e, assim como a busca por nome do interpretador de árvore
+encontra a declaração externa, o compilador usa a declaração externa nas
+leituras e atribuições que aparecem antes dela na mesma função.
+"""
+
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import singledispatchmethod
+from typing import Optional
+
+from .. import runtime as op
+from ..ast import *
+from ..ctx import UNDEFINED
+from ..errors import SemanticError
+from ..node import Node
+from ..runtime import COMPARISONS, show
+
+UINT8_COUNT = 256
+UINT16_MAX = 65535
+
+
+class OpCode(IntEnum):
+    CONSTANT = 0
+    NIL = 1
+    POP = 2
+    GET_LOCAL = 3
+    SET_LOCAL = 4
+    DEFINE_LOCAL = 5
+    GET_GLOBAL = 6
+    SET_GLOBAL = 7
+    DEFINE_GLOBAL = 8
+    GET_UPVALUE = 9
+    SET_UPVALUE = 10
+    SET_PROPERTY = 11
+    ADD = 12
+    SUBTRACT = 13
+    MULTIPLY = 14
+    DIVIDE = 15
+    EQUAL = 16
+    NOT_EQUAL = 17
+    GREATER = 18
+    GREATER_EQUAL = 19
+    LESS = 20
+    LESS_EQUAL = 21
+    BINARY = 22
+    TO_INT = 23
+    INT = 24
+    COERCE_INT = 25
+    PRINT = 26
+    JUMP = 27
+    JUMP_IF_FALSE = 28
+    LOOP = 29
+    CALL = 30
+    CLOSURE = 31
+    CLOSE_UPVALUE = 32
+    RETURN = 33
+    TAIL_CALL = 34
+    GET_PROPERTY = 35
+    INVOKE = 36
+
+
+# Operações da runtime com instruções dedicadas. Outras funções usadas em
+# BinOp são armazenadas no vetor de constantes e executadas por BINARY.
+BINARY_OPCODES = {
+    op.add: OpCode.ADD,
+    op.sub: OpCode.SUBTRACT,
+    op.mul: OpCode.MULTIPLY,
+    op.truediv: OpCode.DIVIDE,
+    op.eq: OpCode.EQUAL,
+    op.ne: OpCode.NOT_EQUAL,
+    op.gt: OpCode.GREATER,
+    op.ge: OpCode.GREATER_EQUAL,
+    op.lt: OpCode.LESS,
+    op.le: OpCode.LESS_EQUAL,
+}
+
+
+@dataclass
+class Chunk:
+    """
+    Sequência de instruções e constantes de uma função.
+    """
+
+    code: bytearray = field(default_factory=bytearray)
+    constants: list = field(default_factory=list)
+
+    def write(self, *data: int) -> None:
+        self.code.extend(data)
+
+    def add_constant(self, value) -> int:
+        """
+        Adiciona uma constante ao chunk e retorna o seu índice.
+        """
+        for i, other in enumerate(self.constants):
+            if other is value or (type(other) is type(value) and other == value):
+                return i
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+
+@dataclass
+class FunctionProto:
+    """
+    Função compilada, ainda sem os upvalues capturados durante a execução.
+    """
+
+    name: str
+    arity: int = 0
+    chunk: Chunk = field(default_factory=Chunk)
+    locals: list[str] = field(default_factory=list)
+    upvalues: list[tuple[bool, int]] = field(default_factory=list)
+    upvalue_names: list[str] = field(default_factory=list)
+    padding: tuple = ()
+
+    def __str__(self):
+        if self.name == "<script>":
+            return self.name
+        return f"<fn {self.name}>"
+
+
+@dataclass
+class Scope:
+    """
+    Estado do compilador antes do início de um bloco ou laço e posições das
+    variáveis declaradas nele (ver `Compiler.begin_scope`).
+    """
+
+    saved_slots: dict[str, int]
+    saved_pending: dict[str, Optional[int]]
+    slots: list[int] = field(default_factory=list)
+
+
+class Compiler:
+    """
+    Compila uma árvore sintática para um `FunctionProto`.
+
+    Cada função aninhada é compilada por um novo `Compiler` cujo atributo
+    `enclosing` aponta para o compilador da função que a contém. Isso permite
+    resolver variáveis capturadas como upvalues, como no clox.
+    """
+
+    def __init__(self, function: FunctionProto, enclosing: Optional["Compiler"] = None):
+        self.function = function
+        self.enclosing = enclosing
+        self.chunk = function.chunk
+        self.slots: dict[str, int] = {}
+        # Variáveis dos escopos atuais cuja declaração ainda não foi
+        # compilada, associadas à posição da declaração externa usada até lá
+        # (None se ela não for uma variável local da função).
+        self.pending: dict[str, Optional[int]] = {}
+
+    @classmethod
+    def compile(cls, node: Node) -> FunctionProto:
+        """
+        Compila um programa ou expressão para a função de nível superior.
+        """
+        compiler = cls(FunctionProto("<script>"))
+        compiler.emit_node(node)
+        if not isinstance(node, Expr):
+            compiler.emit(OpCode.NIL)
+        compiler.emit(OpCode.RETURN)
+        function = compiler.function
+        function.padding = (UNDEFINED,) * len(function.locals)
+        return function
+
+    #
+    # Emissão de instruções
+    #
+
+    def emit(self, *data: int) -> None:
+        self.chunk.write(*data)
+
+    def make_constant(self, value, token=None) -> int:
+        index = self.chunk.add_constant(value)
+        if index >= UINT8_COUNT:
+            raise SemanticError("Too many constants in one chunk.", token=token)
+        return index
+
+    def emit_constant(self, value) -> None:
+        self.emit(OpCode.CONSTANT, self.make_constant(value, show(value)))
+
+    def emit_jump(self, opcode: OpCode) -> int:
+        """
+        Emite um salto para frente e retorna a posição do deslocamento, que
+        deve ser preenchido posteriormente por `patch_jump`.
+        """
+        self.emit(opcode, 0xFF, 0xFF)
+        return len(self.chunk.code) - 2
+
+    def patch_jump(self, offset: int) -> None:
+        jump = len(self.chunk.code) - offset - 2
+        if jump > UINT16_MAX:
+            raise SemanticError("Too much code to jump over.")
+        self.chunk.code[offset] = (jump >> 8) & 0xFF
+        self.chunk.code[offset + 1] = jump & 0xFF
+
+    def emit_loop(self, start: int) -> None:
+        """
+        Emite um salto para trás até a posição `start`.
+        """
+        self.emit(OpCode.LOOP)
+        offset = len(self.chunk.code) - start + 2
+        if offset > UINT16_MAX:
+            raise SemanticError("Loop body too large.")
+        self.emit((offset >> 8) & 0xFF, offset & 0xFF)
+
+    #
+    # Resolução de nomes
+    #
+
+    def declare_locals(self, names: list[str], token=None) -> None:
+        """
+        Declara os parâmetros e as variáveis do escopo da função.
+
+        Os parâmetros devem ser os primeiros nomes e já começam definidos.
+        """
+        for name in names:
+            if name in self.slots:
+                continue
+            if len(self.slots) >= UINT8_COUNT:
+                raise SemanticError("Too many local variables in function.", token=token)
+            if len(self.slots) >= self.function.arity:
+                self.pending[name] = None
+            self.slots[name] = len(self.slots)
+            self.function.locals.append(name)
+
+    def resolve_upvalue(self, name: str) -> Optional[int]:
+        if self.enclosing is None:
+            return None
+        if (slot := self.enclosing.slots.get(name)) is not None:
+            return self.add_upvalue(name, True, slot)
+        if (index := self.enclosing.resolve_upvalue(name)) is not None:
+            return self.add_upvalue(name, False, index)
+        return None
+
+    def add_upvalue(self, name: str, is_local: bool, index: int) -> int:
+        upvalues = self.function.upvalues
+        for i, upvalue in enumerate(upvalues):
+            if upvalue == (is_local, index):
+                return i
+        if len(upvalues) >= UINT8_COUNT:
+            raise SemanticError("Too many closure variables in function.", token=name)
+        upvalues.append((is_local, index))
+        self.function.upvalue_names.append(name)
+        return len(upvalues) - 1
+
+    def begin_scope(self, stmts: list[Node]) -> Optional["Scope"]:
+        """
+        Inicia o escopo de um bloco ou laço com os comandos `stmts`.
+
+        As variáveis declaradas no escopo (ver `ast.declared_names`) recebem
+        novas posições locais. Retorna o estado anterior do compilador e as
+        novas posições, que devem ser passados a `end_scope`, ou None se o
+        escopo não declara variáveis.
+        """
+        names = [*dict.fromkeys(declared_names(stmts))]
+        if not names:
+            return None
+
+        scope = Scope(dict(self.slots), dict(self.pending))
+        for name in names:
+            if len(self.function.locals) >= UINT8_COUNT:
+                raise SemanticError("Too many local variables in function.", token=name)
+            self.pending[name] = self.resolve_local(name)
+            self.slots[name] = len(self.function.locals)
+            scope.slots.append(self.slots[name])
+            self.function.locals.append(name)
+        return scope
+
+    def end_scope(self, scope: Optional["Scope"]) -> None:
+        """
+        Encerra o escopo: as posições das variáveis deixam de ser visíveis e
+        CLOSE_UPVALUE as torna indefinidas durante a execução.
+        """
+        if scope is None:
+            return
+        for slot in scope.slots:
+            self.emit(OpCode.CLOSE_UPVALUE, slot)
+        self.slots, self.pending = scope.saved_slots, scope.saved_pending
+
+    def resolve_local(self, name: str) -> Optional[int]:
+        """
+        Posição local usada por leituras e atribuições de `name` no ponto
+        atual do código ou None se a variável não é local.
+        """
+        if name in self.pending:
+            return self.pending[name]
+        return self.slots.get(name)
+
+    def emit_get(self, name: str) -> None:
+        if (slot := self.resolve_local(name)) is not None:
+            self.emit(OpCode.GET_LOCAL, slot)
+        elif (index := self.resolve_upvalue(name)) is not None:
+            self.emit(OpCode.GET_UPVALUE, index)
+        else:
+            self.emit(OpCode.GET_GLOBAL, self.make_constant(name, name))
+
+    def emit_set(self, name: str) -> None:
+        if (slot := self.resolve_local(name)) is not None:
+            self.emit(OpCode.SET_LOCAL, slot)
+        elif (index := self.resolve_upvalue(name)) is not None:
+            self.emit(OpCode.SET_UPVALUE, index)
+        else:
+            self.emit(OpCode.SET_GLOBAL, self.make_constant(name, name))
+
+    def emit_define(self, name: str) -> None:
+        if (slot := self.slots.get(name)) is not None:
+            self.emit(OpCode.DEFINE_LOCAL, slot)
+            self.pending.pop(name, None)
+        else:
+            self.emit(OpCode.DEFINE_GLOBAL, self.make_constant(name, name))
+
+    #
+    # Compilação dos nós
+    #
+
+    @singledispatchmethod
+    def emit_node(self, node: Node) -> None:
+        name = type(node).__name__
+        raise NotImplementedError(f"Método eval não implementado para {name}!")
+
+    @emit_node.register
+    def _(self, node: Program) -> None:
+        for stmt in node.stmts:
+            self.emit_stmt(stmt)
+
+    def emit_stmt(self, node: Node) -> None:
+        """
+        Compila um comando, descartando o valor de expressões.
+        """
+        self.emit_node(node)
+        if isinstance(node, Expr):
+            self.emit(OpCode.POP)
+
+    @emit_node.register
+    def _(self, node: Literal) -> None:
+        if node.value is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.emit_constant(node.value)
+
+    @emit_node.register
+    def _(self, node: Var) -> None:
+        self.emit_get(node.name)
+
+    @emit_node.register
+    def _(self, node: BinOp) -> None:
+        integer = node.is_integer()
+        self.emit_node(node.left)
+        if integer:
+            self.emit(OpCode.TO_INT)
+        self.emit_node(node.right)
+        if integer:
+            self.emit(OpCode.TO_INT)
+
+        if (opcode := BINARY_OPCODES.get(node.op)) is not None:
+            self.emit(opcode)
+        else:
+            self.emit(OpCode.BINARY, self.make_constant(node.op))
+        if integer and node.op not in COMPARISONS:
+            self.emit(OpCode.INT)
+
+    @emit_node.register
+    def _(self, node: Call) -> None:
+        self.emit_call(node, OpCode.CALL)
+
+    def emit_call(self, node: Call, opcode: OpCode) -> None:
+        if len(node.params) >= UINT8_COUNT:
+            raise SemanticError("Can't have more than 255 arguments.", token=node.name)
+        self.emit_get(node.name)
+        for arg in node.params:
+            self.emit_node(arg)
+        self.emit(opcode, len(node.params))
+
+    @emit_node.register
+    def _(self, node: Assign) -> None:
+        self.emit_node(node.value)
+        if node.is_integer():
+            self.emit(OpCode.COERCE_INT)
+        self.emit_set(node.name)
+
+    @emit_node.register
+    def _(self, node: Setattr) -> None:
+        self.emit_node(node.obj)
+        self.emit_node(node.value)
+        if node.is_integer():
+            self.emit(OpCode.COERCE_INT)
+        self.emit(OpCode.SET_PROPERTY, self.make_constant(node.attr, node.attr))
+
+    @emit_node.register
+    def _(self, node: Getattr) -> None:
+        # O inline cache do nó (ver `runtime.InlineCache`) é armazenado como
+        # constante e compartilhado entre execuções do mesmo chunk.
+        self.emit_node(node.obj)
+        self.emit(OpCode.GET_PROPERTY, self.make_constant(node.cache, node.attr))
+
+    @emit_node.register
+    def _(self, node: Invoke) -> None:
+        if len(node.params) >= UINT8_COUNT:
+            raise SemanticError("Can't have more than 255 arguments.", token=node.attr)
+        self.emit_node(node.obj)
+        for arg in node.params:
+            self.emit_node(arg)
+        self.emit(OpCode.INVOKE, self.make_constant(node.cache, node.attr), len(node.params))
+
+    @emit_node.register
+    def _(self, node: Print) -> None:
+        self.emit_node(node.expr)
+        self.emit(OpCode.PRINT)
+
+    @emit_node.register
+    def _(self, node: VarDef) -> None:
+        if node.initializer is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.emit_node(node.initializer)
+            if node.is_integer():
+                self.emit(OpCode.COERCE_INT)
+        self.emit_define(node.name)
+
+    @emit_node.register
+    def _(self, node: Return) -> None:
+        if node.expr is None:
+            self.emit(OpCode.NIL)
+        elif isinstance(node.expr, Call) and self.enclosing is not None:
+            # Chamadas em posição de cauda reaproveitam o registro da função
+            # atual. Se a função chamada não for uma closure da máquina
+            # virtual, TAIL_CALL se comporta como CALL e o RETURN seguinte é
+            # executado normalmente.
+            self.emit_call(node.expr, OpCode.TAIL_CALL)
+        else:
+            self.emit_node(node.expr)
+        if self.enclosing is None:
+            # Um `return` fora de funções apenas encerra o programa.
+            self.emit(OpCode.POP, OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    @emit_node.register
+    def _(self, node: Block) -> None:
+        scope = self.begin_scope(node.stmts)
+        for stmt in node.stmts:
+            self.emit_stmt(stmt)
+        self.end_scope(scope)
+
+    @emit_node.register
+    def _(self, node: While) -> None:
+        start = len(self.chunk.code)
+        self.emit_node(node.condition)
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.emit_stmt(node.body)
+        self.emit_loop(start)
+        self.patch_jump(exit_jump)
+        self.emit(OpCode.POP)
+
+    @emit_node.register
+    def _(self, node: For) -> None:
+        # Laços de contagem (`CountedFor`) são compilados como laços comuns.
+        scope = self.begin_scope([] if node.initializer is None else [node.initializer])
+        if node.initializer is not None:
+            self.emit_stmt(node.initializer)
+
+        start = len(self.chunk.code)
+        exit_jump = None
+        if node.condition is not None:
+            self.emit_node(node.condition)
+            exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            self.emit(OpCode.POP)
+        self.emit_stmt(node.body)
+        if node.increment is not None:
+            self.emit_stmt(node.increment)
+        self.emit_loop(start)
+
+        if exit_jump is not None:
+            self.patch_jump(exit_jump)
+            self.emit(OpCode.POP)
+        self.end_scope(scope)
+
+    @emit_node.register
+    def _(self, node: InvariantScope) -> None:
+        # Os valores invariantes (ver `lox.optimize`) não são guardados: o
+        # laço é compilado normalmente e as expressões são avaliadas a cada
+        # uso, o que produz os mesmos resultados.
+        self.emit_node(node.loop)
+
+    @emit_node.register
+    def _(self, node: Invariant) -> None:
+        self.emit_node(node.expr)
+
+    @emit_node.register
+    def _(self, node: InductionProduct) -> None:
+        self.emit_node(node.expr)
+
+    @emit_node.register
+    def _(self, node: Function) -> None:
+        if len(node.params) >= UINT8_COUNT:
+            raise SemanticError("Can't have more than 255 parameters.", token=node.name)
+
+        function = FunctionProto(node.name, arity=len(node.params))
+        compiler = Compiler(function, self)
+        compiler.declare_locals([*node.scope_slots()], token=node.name)
+        if node.body is not None:
+            for stmt in node.body.stmts:
+                compiler.emit_stmt(stmt)
+        compiler.emit(OpCode.NIL, OpCode.RETURN)
+        function.padding = (UNDEFINED,) * (len(function.locals) - function.arity)
+
+        self.emit(OpCode.CLOSURE, self.make_constant(function, node.name))
+        for is_local, index in function.upvalues:
+            self.emit(int(is_local), index)
+        self.emit_define(node.name)
+
+
+#
+# DISASSEMBLER
+#
+
+
+def disassemble(function: FunctionProto) -> str:
+    """
+    Retorna uma listagem legível das instruções da função e de todas as
+    funções aninhadas.
+    """
+    lines = [f"== {function} =="]
+    chunk = function.chunk
+    offset = 0
+    while offset < len(chunk.code):
+        line, offset = disassemble_instruction(function, offset)
+        lines.append(line)
+
+    for constant in chunk.constants:
+        if isinstance(constant, FunctionProto):
+            lines.append("")
+            lines.append(disassemble(constant))
+    return "\n".join(lines)
+
+
+def disassemble_instruction(function: FunctionProto, offset: int) -> tuple[str, int]:
+    """
+    Retorna a descrição da instrução na posição `offset` e a posição da
+    instrução seguinte.
+    """
+    code = function.chunk.code
+    constants = function.chunk.constants
+    opcode = OpCode(code[offset])
+    name = f"OP_{opcode.name}"
+    prefix = f"{offset:04d} "
+
+    if opcode in (OpCode.CONSTANT, OpCode.GET_GLOBAL, OpCode.SET_GLOBAL,
+                  OpCode.DEFINE_GLOBAL, OpCode.SET_PROPERTY, OpCode.BINARY):
+        index = code[offset + 1]
+        value = constants[index]
+        shown = getattr(value, "__name__", None) or show(value)
+        return f"{prefix}{name:<16} {index:4d} '{shown}'", offset + 2
+
+    if opcode in (OpCode.GET_PROPERTY, OpCode.INVOKE):
+        index = code[offset + 1]
+        line = f"{prefix}{name:<16} {index:4d} '{constants[index].name}'"
+        if opcode == OpCode.INVOKE:
+            return f"{line} ({code[offset + 2]} args)", offset + 3
+        return line, offset + 2
+
+    if opcode in (OpCode.GET_LOCAL, OpCode.SET_LOCAL, OpCode.DEFINE_LOCAL, OpCode.CLOSE_UPVALUE):
+        slot = code[offset + 1]
+        return f"{prefix}{name:<16} {slot:4d} ({function.locals[slot]})", offset + 2
+
+    if opcode in (OpCode.GET_UPVALUE, OpCode.SET_UPVALUE):
+        index = code[offset + 1]
+        upvalue = function.upvalue_names[index]
+        return f"{prefix}{name:<16} {index:4d} ({upvalue})", offset + 2
+
+    if opcode in (OpCode.CALL, OpCode.TAIL_CALL):
+        return f"{prefix}{name:<16} {code[offset + 1]:4d}", offset + 2
+
+    if opcode in (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.LOOP):
+        jump = (code[offset + 1] << 8) | code[offset + 2]
+        sign = -1 if opcode == OpCode.LOOP else 1
+        target = offset + 3 + sign * jump
+        return f"{prefix}{name:<16} {offset:4d} -> {target}", offset + 3
+
+    if opcode == OpCode.CLOSURE:
+        index = code[offset + 1]
+        proto = constants[index]
+        lines = [f"{prefix}{name:<16} {index:4d} {proto}"]
+        offset += 2
+        for _ in proto.upvalues:
+            is_local, slot = code[offset], code[offset + 1]
+            kind = "local" if is_local else "upvalue"
+            lines.append(f"{offset:04d}    |                     {kind} {slot}")
+            offset += 2
+        return "\n".join(lines), offset
+
+    return f"{prefix}{name}", offset + 1
@@ -0,0 +1,260 @@
+"""
+Compila a árvore sintática em closures do Python.
+
+Cada nó é visitado uma única vez e convertido em uma função `(ctx) -> valor`
+com os operandos, operadores e demais decisões estáticas (resolução de nomes,
+regra dos inteiros, etc.) já embutidos na closure. Durante a execução não há
+mais consultas a atributos dos nós nem verificações de tipo repetidas.
+
+Nós sem uma compilação especializada usam o próprio método `eval`, de modo
+que este mecanismo executa exatamente os mesmos programas que o
+interpretador de árvore.
+"""
+
+import builtins
+from functools import singledispatch
+from typing import Callable
+
+from ..ast import *
+from ..ctx import UNDEFINED, Ctx, Frame
+from ..node import Node
+from ..runtime import (
+    COMPARISONS,
+    ReturnValue,
+    coerce_integer,
+    flatten,
+    set_attribute,
+    specialize,
+    to_integer,
+    trampoline,
+)
+
+Thunk = Callable[[Ctx], Value]
+
+
+def run(node: Node, ctx: Ctx) -> Value:
+    """
+    Compila e executa o nó no contexto fornecido.
+    """
+    return compile_node(node)(ctx)
+
+
+@singledispatch
+def compile_node(node: Node) -> Thunk:
+    """
+    Converte um nó em uma função que recebe o contexto de execução.
+
+    A implementação genérica delega para o método `eval` do nó.
+    """
+    return node.eval
+
+
+@compile_node.register
+def _(node: Program) -> Thunk:
+    stmts = [compile_node(stmt) for stmt in node.stmts]
+
+    def program(ctx):
+        for stmt in stmts:
+            if type(result := stmt(ctx)) is ReturnValue:
+                trampoline(result.value)
+                return
+
+    return program
+
+
+#
+# EXPRESSÕES
+#
+
+
+@compile_node.register
+def _(node: Literal) -> Thunk:
+    value = node.value
+    return lambda ctx: value
+
+
+@compile_node.register
+def _(node: Var) -> Thunk:
+    name = node.name
+
+    def lookup(ctx):
+        try:
+            return ctx[name]
+        except KeyError:
+            raise NameError(f"variável {name} não existe!")
+
+    if node.slot is None:
+        return lookup
+
+    slot, depth = node.slot, node.depth
+    if depth == 0:
+
+        def local(ctx):
+            value = ctx.values[slot]
+            if value is UNDEFINED:
+                return lookup(ctx)
+            return value
+
+        return local
+
+    def nonlocal_(ctx):
+        value = ctx.get_slot(depth, slot)
+        if value is UNDEFINED:
+            return lookup(ctx)
+        return value
+
+    return nonlocal_
+
+
+@compile_node.register
+def _(node: BinOp) -> Thunk:
+    left, right, op = compile_node(node.left), compile_node(node.right), node.op
+
+    if node.is_integer() and op in COMPARISONS:
+        return lambda ctx: op(to_integer(left(ctx)), to_integer(right(ctx)))
+    if node.is_integer():
+        return lambda ctx: int(op(to_integer(left(ctx)), to_integer(right(ctx))))
+
+    # A variante da operação é escolhida na primeira execução, de acordo com
+    # os tipos dos operandos (ver `runtime.specialize`).
+    impl = None
+
+    def binop(ctx):
+        nonlocal impl
+        a, b = left(ctx), right(ctx)
+        if impl is None:
+            impl = specialize(op, a, b)
+        return impl(a, b)
+
+    return binop
+
+
+@compile_node.register
+def _(node: Call) -> Thunk:
+    name, slot, depth = node.name, node.slot, node.depth
+    args = [compile_node(arg) for arg in node.params]
+
+    def call(ctx):
+        if slot is None or (func := ctx.get_slot(depth, slot)) is UNDEFINED:
+            func = ctx[name]
+        values = [flatten(arg(ctx)) for arg in args]
+        if callable(func):
+            return func(*values)
+        raise TypeError(f"{name} não é uma função!")
+
+    return call
+
+
+@compile_node.register
+def _(node: Assign) -> Thunk:
+    name, slot, depth = node.name, node.slot, node.depth
+    expr = compile_node(node.value)
+    coerce = coerce_integer if node.is_integer() else None
+
+    def assign(ctx):
+        value = expr(ctx)
+        if coerce is not None:
+            value = coerce(value)
+        if slot is not None:
+            try:
+                ctx.set_slot(depth, slot, value)
+                return value
+            except KeyError:
+                pass
+        ctx[name] = value
+        return value
+
+    return assign
+
+
+@compile_node.register
+def _(node: Setattr) -> Thunk:
+    attr = node.attr
+    obj, expr = compile_node(node.obj), compile_node(node.value)
+
+    if node.is_integer():
+
+        def setattr_int(ctx):
+            target = obj(ctx)
+            value = coerce_integer(expr(ctx))
+            set_attribute(target, attr, value)
+            return value
+
+        return setattr_int
+
+    def setattr_(ctx):
+        target = obj(ctx)
+        value = expr(ctx)
+        set_attribute(target, attr, value)
+        return value
+
+    return setattr_
+
+
+#
+# COMANDOS
+#
+
+
+@compile_node.register
+def _(node: Print) -> Thunk:
+    expr = compile_node(node.expr)
+    print = builtins.print
+    return lambda ctx: print(expr(ctx))
+
+
+@compile_node.register
+def _(node: VarDef) -> Thunk:
+    name, slot = node.name, node.slot
+    if node.initializer is None:
+        init = lambda ctx: None  # noqa: E731
+    elif node.is_integer():
+        expr = compile_node(node.initializer)
+        init = lambda ctx: coerce_integer(expr(ctx))  # noqa: E731
+    else:
+        init = compile_node(node.initializer)
+
+    if slot is None:
+        return lambda ctx: ctx.var_def(name, init(ctx))
+    return lambda ctx: define_slot(ctx, name, slot, init(ctx))
+
+
+@compile_node.register
+def _(node: Return) -> Thunk:
+    if node.expr is None:
+        return lambda ctx: ReturnValue(None)
+    expr = compile_node(node.expr)
+    return lambda ctx: ReturnValue(expr(ctx))
+
+
+@compile_node.register
+def _(node: Function) -> Thunk:
+    name, slot, slots = node.name, node.slot, node.frame_slots
+    params = [param for param, _ in node.params]
+    body = [compile_node(stmt) for stmt in node.body.stmts] if node.body else []
+
+    def run_body(env):
+        # Comandos sem compilação especializada (ex.: blocos aninhados) usam
+        # `eval` e podem devolver chamadas em posição de cauda (`TailCall`).
+        for stmt in body:
+            if type(result := stmt(env)) is ReturnValue:
+                return trampoline(result.value)
+        return None
+
+    def function(ctx):
+        if slots is None:
+
+            def lox_function(*args):
+                return run_body(ctx.push(dict(zip(params, args))))
+
+        else:
+
+            def lox_function(*args):
+                return run_body(Frame(slots, node.frame_values(args), ctx))
+
+        if slot is None:
+            ctx.var_def(name, lox_function)
+        else:
+            define_slot(ctx, name, slot, lox_function)
+
+    return function
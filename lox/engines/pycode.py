@@ -0,0 +1,635 @@
+"""
+Compila a árvore sintática para código Python.
+
+O programa é traduzido para uma árvore do módulo `ast` do Python e compilado
+com `compile()`, de modo que o próprio interpretador do CPython execute os
+programas Lox. Funções Lox se tornam funções Python, variáveis locais se
+tornam variáveis locais do Python e variáveis capturadas por closures usam
+as células do Python (`nonlocal`). Variáveis globais continuam armazenadas no
+contexto (`Ctx`).
+
+As operações da runtime (`runtime.add`, `runtime.truthy`, etc.) e a regra dos
+inteiros são preservadas chamando as mesmas funções usadas pelo interpretador
+de árvore, disponíveis como variáveis globais do código gerado (ver
+`HELPERS`). Os nomes de variáveis Lox recebem o prefixo "l_", o que evita
+conflitos com essas funções e com palavras reservadas do Python.
+
+Os objetos de código são armazenados em disco (ver `lox.cache.load_code`),
+indexados pelo código Python gerado, e execuções repetidas do mesmo programa
+dispensam a compilação. Esse cache é sempre usado: a opção `--no-cache` da
+linha de comando desativa somente o cache de árvores sintáticas.
+
+Dentro de funções, cada declaração de um bloco ou laço `for` recebe uma
+variável Python própria (ex.: `b3_x`), de modo que blocos irmãos e execuções
+repetidas do mesmo bloco não interferem entre si (ver `PyCompiler.scoped`).
+Referências anteriores à declaração usam a variável do escopo externo, como
+na máquina virtual. No nível superior do programa, cada bloco e cada laço
+`for` se torna uma função Python aninhada que recebe um novo escopo do
+contexto.
+
+Diferentemente do interpretador de árvore, chamar uma função com menos
+argumentos que parâmetros produz um TypeError, como em `LoxFunction`.
+"""
+
+import ast
+import builtins
+from dataclasses import dataclass, field
+from functools import singledispatchmethod
+from typing import Callable, Iterable, Optional
+
+from .. import runtime as op
+from ..ast import *
+from ..cache import load_code
+from ..ctx import UNDEFINED, Ctx
+from ..node import Node
+from ..runtime import COMPARISONS, coerce_integer, flatten, set_attribute, to_integer
+
+FILENAME = "<lox>"
+ENTRY = "rt_main"
+
+# Operações da runtime referenciadas diretamente pelo código gerado. Outras
+# funções usadas em BinOp são acessadas pelo vetor `rt_consts`.
+BINARY_HELPERS = {
+    op.add: "rt_add",
+    op.sub: "rt_sub",
+    op.mul: "rt_mul",
+    op.truediv: "rt_truediv",
+    op.eq: "rt_eq",
+    op.ne: "rt_ne",
+    op.gt: "rt_gt",
+    op.ge: "rt_ge",
+    op.lt: "rt_lt",
+    op.le: "rt_le",
+}
+
+LITERAL_TYPES = (type(None), bool, int, float, str)
+
+
+def lookup(ctx: Ctx, name: str) -> Value:
+    try:
+        return ctx[name]
+    except KeyError:
+        raise NameError(f"variável {name} não existe!")
+
+
+def assign(ctx: Ctx, name: str, value: Value) -> Value:
+    ctx[name] = value
+    return value
+
+
+def set_attr(obj: Value, attr: str, value: Value) -> Value:
+    set_attribute(obj, attr, value)
+    return value
+
+
+def store(box: list, value: Value) -> Value:
+    box[0] = value
+    return value
+
+
+def redefined(name: str):
+    raise KeyError(f"Variable '{name}' already defined in the current scope.")
+
+
+HELPERS = {
+    "rt_U": UNDEFINED,
+    "rt_lookup": lookup,
+    "rt_assign": assign,
+    "rt_setattr": set_attr,
+    "rt_store": store,
+    "rt_redefined": redefined,
+    "rt_truthy": op.truthy,
+    "rt_print": builtins.print,
+    "rt_to_int": to_integer,
+    "rt_int_assign": coerce_integer,
+    "rt_int": int,
+    "rt_flatten": flatten,
+    **{name: func for func, name in BINARY_HELPERS.items()},
+}
+
+
+def run(node: Node, ctx: Ctx) -> Value:
+    """
+    Compila o nó para código Python e o executa no contexto fornecido.
+    """
+    program = PyCompiler.compile(node)
+    return program(ctx)
+
+
+@dataclass
+class FunctionScope:
+    """
+    Estado da compilação de uma função Lox.
+
+    `nonlocals` guarda as variáveis de funções externas modificadas pela
+    função, `cells` as variáveis da função lidas ou modificadas por funções
+    aninhadas e `boxes` as caixas de escopos externos usadas pela função ou
+    pelas funções aninhadas nela (ver `PyCompiler.scoped`).
+    """
+
+    parent: Optional["FunctionScope"] = None
+    nonlocals: set[str] = field(default_factory=set)
+    cells: set[str] = field(default_factory=set)
+    boxes: set[str] = field(default_factory=set)
+
+
+@dataclass
+class Scope:
+    """
+    Escopo de uma função, bloco ou laço `for` durante a compilação.
+
+    `names` associa as variáveis Lox declaradas no escopo às variáveis Python
+    correspondentes e `defined` guarda as declarações já compiladas. Como o
+    corpo é executado em sequência, leituras de variáveis definidas na
+    própria função dispensam a verificação de UNDEFINED. As variáveis em
+    `boxes` são guardadas em listas de um elemento.
+    """
+
+    names: dict[str, str]
+    function: FunctionScope
+    parent: Optional["Scope"] = None
+    defined: set[str] = field(default_factory=set)
+    boxes: set[str] = field(default_factory=set)
+
+
+class PyCompiler:
+    """
+    Traduz nós Lox para nós do módulo `ast` do Python.
+    """
+
+    def __init__(self):
+        self.scope: Optional[Scope] = None
+        self.function: Optional[FunctionScope] = None
+        self.consts: list = []
+        # Laços que envolvem o comando atual dentro da função atual.
+        self.loops = 0
+        # Blocos do nível superior que envolvem o comando atual e número de
+        # blocos já criados (ver `script_block`).
+        self.nested = 0
+        self.blocks = 0
+        # Variáveis Python já criadas para declarações em blocos.
+        self.bindings = 0
+
+    @classmethod
+    def compile(cls, node: Node):
+        """
+        Compila o nó e retorna uma função que o executa num contexto.
+        """
+        compiler = cls()
+        module = compiler.module(node)
+        code = load_code(module, FILENAME)
+        namespace = {**HELPERS, "rt_consts": compiler.consts}
+        exec(code, namespace)
+        return namespace[ENTRY]
+
+    def module(self, node: Node) -> ast.Module:
+        """
+        Cria o módulo Python que define a função de entrada `rt_main(ctx)`.
+        """
+        if isinstance(node, Expr):
+            body = [ast.Return(self.expr(node))]
+        else:
+            body = [*self.stmt(node), ast.Return(ast.Constant(None))]
+        entry = ast.FunctionDef(
+            name=ENTRY,
+            args=arguments([ast.arg("ctx")]),
+            body=body,
+            decorator_list=[],
+            type_params=[],
+        )
+        return ast.fix_missing_locations(ast.Module(body=[entry], type_ignores=[]))
+
+    def const(self, value) -> ast.expr:
+        """
+        Referencia um valor que não pode ser embutido no código gerado.
+        """
+        for i, other in enumerate(self.consts):
+            if other is value:
+                break
+        else:
+            self.consts.append(value)
+            i = len(self.consts) - 1
+        return ast.Subscript(load("rt_consts"), ast.Constant(i), ast.Load())
+
+    #
+    # Variáveis
+    #
+
+    def find(self, name: str) -> Optional[Scope]:
+        """
+        Escopo da declaração visível no ponto atual da compilação.
+
+        Declarações da função atual que ainda não foram compiladas são
+        ignoradas, de modo que referências anteriores à declaração usam a
+        variável do escopo externo.
+        """
+        scope = self.scope
+        while scope is not None:
+            if name in scope.names and (name in scope.defined or scope.function is not self.function):
+                return scope
+            scope = scope.parent
+        return None
+
+    def capture(self, scope: Scope, name: str) -> None:
+        """
+        Registra o uso de uma variável de uma função externa.
+        """
+        binding = scope.names[name]
+        if name not in scope.boxes:
+            scope.function.cells.add(binding)
+            return
+        function = self.function
+        while function is not None and function is not scope.function:
+            function.boxes.add(binding)
+            function = function.parent
+
+    def read(self, name: str) -> ast.expr:
+        scope = self.find(name)
+        if scope is None:
+            return call("rt_lookup", load("ctx"), ast.Constant(name))
+        value = variable(scope, name)
+        if scope.function is self.function:
+            return value
+        # A variável pode não ter sido definida ainda: nesse caso, o nome é
+        # procurado no contexto global.
+        self.capture(scope, name)
+        return ast.IfExp(
+            test=ast.Compare(variable(scope, name), [ast.IsNot()], [load("rt_U")]),
+            body=value,
+            orelse=call("rt_lookup", load("ctx"), ast.Constant(name)),
+        )
+
+    def write(self, name: str, value: Node, integer: bool) -> ast.expr:
+        scope = self.find(name)
+        if scope is None:
+            return call("rt_assign", load("ctx"), ast.Constant(name), self.value(value, integer))
+        if scope.function is self.function:
+            return set_variable(scope, name, self.value(value, integer))
+
+        # O valor é guardado em uma variável temporária antes de verificar se
+        # a variável já foi definida.
+        self.capture(scope, name)
+        if name not in scope.boxes:
+            self.function.nonlocals.add(scope.names[name])  # type: ignore[union-attr]
+        check = ast.IfExp(
+            test=ast.Compare(variable(scope, name), [ast.IsNot()], [load("rt_U")]),
+            body=set_variable(scope, name, load("rt_value")),
+            orelse=call("rt_assign", load("ctx"), ast.Constant(name), load("rt_value")),
+        )
+        temporary = ast.NamedExpr(ast.Name("rt_value", ast.Store()), self.value(value, integer))
+        return ast.Subscript(ast.Tuple([temporary, check], ast.Load()), ast.Constant(1), ast.Load())
+
+    def value(self, node: Node, integer: bool) -> ast.expr:
+        """
+        Valor atribuído a uma variável, aplicando a regra dos inteiros.
+        """
+        value = self.expr(node)
+        if integer:
+            return call("rt_int_assign", value)
+        return value
+
+    def define(self, name: str, value: ast.expr) -> list[ast.stmt]:
+        scope = self.scope
+        if scope is None:
+            define = ast.Attribute(load("ctx"), "var_def", ast.Load())
+            return [ast.Expr(ast.Call(define, [ast.Constant(name), value], []))]
+        if name in scope.defined:
+            return [ast.Expr(value), ast.Expr(call("rt_redefined", ast.Constant(name)))]
+        scope.defined.add(name)
+        binding = scope.names[name]
+        if name in scope.boxes:
+            target: ast.expr = ast.Subscript(load(binding), ast.Constant(0), ast.Store())
+        else:
+            target = ast.Name(binding, ast.Store())
+        return [ast.Assign([target], value)]
+
+    #
+    # Blocos e laços
+    #
+
+    def script_block(self, compile_body: Callable[[], list[ast.stmt]]) -> list[ast.stmt]:
+        """
+        Cria um escopo no nível superior do programa.
+
+        O corpo é compilado como uma função Python aninhada que recebe
+        `ctx.push({})`, de modo que funções declaradas no bloco capturam o
+        escopo do bloco. Um `return` dentro do bloco faz a função retornar
+        True, o que encerra também os blocos que a envolvem.
+        """
+        name = f"rt_block{self.blocks}"
+        self.blocks += 1
+        self.nested += 1
+        try:
+            body = compile_body()
+        finally:
+            self.nested -= 1
+
+        function = ast.FunctionDef(
+            name=name,
+            args=arguments([ast.arg("ctx")]),
+            body=[*body, ast.Return(ast.Constant(None))],
+            decorator_list=[],
+            type_params=[],
+        )
+        scope = ast.Call(ast.Attribute(load("ctx"), "push", ast.Load()), [ast.Dict([], [])], [])
+        exit = ast.Return(ast.Constant(True if self.nested else None))
+        return [function, ast.If(call(name, scope), [exit], [])]
+
+    def scoped(self, names: Iterable[str], nodes: list[Node], compile_body: Callable[[], list[ast.stmt]]) -> list[ast.stmt]:
+        """
+        Cria o escopo de um bloco ou laço `for` dentro de uma função.
+
+        Cada variável declarada recebe uma variável Python própria. Se o
+        escopo está dentro de um laço, as variáveis capturadas por funções
+        aninhadas são guardadas em caixas criadas a cada execução do escopo e
+        passadas às funções aninhadas como valores padrão de argumentos
+        nomeados. Assim, cada closure criada no laço enxerga as variáveis da
+        iteração em que foi criada.
+        """
+        names = list(names)
+        if not names:
+            return compile_body()
+        bindings = {}
+        for name in names:
+            bindings[name] = f"b{self.bindings}_{name}"
+            self.bindings += 1
+        scope = Scope(bindings, self.function, self.scope)  # type: ignore[arg-type]
+        if self.loops:
+            scope.boxes = {name for name in names if name in captured_names(nodes)}
+
+        init = [
+            ast.Assign([ast.Name(bindings[name], ast.Store())], ast.List([load("rt_U")], ast.Load()))
+            for name in sorted(scope.boxes)
+        ]
+        self.scope = scope
+        try:
+            return [*init, *compile_body()]
+        finally:
+            self.scope = scope.parent
+
+    def loop(self, condition: Optional[Expr], body: Stmt, increment: Optional[Expr]) -> list[ast.stmt]:
+        """
+        Compila um laço `while` do Python.
+
+        As variáveis definidas no corpo não são consideradas definidas depois
+        do laço, que pode não executar nenhuma vez.
+        """
+        if condition is None:
+            test: ast.expr = ast.Constant(True)
+        else:
+            test = call("rt_truthy", self.expr(condition))
+        defined = None if self.scope is None else set(self.scope.defined)
+        self.loops += 1
+        try:
+            stmts = self.stmt(body)
+            if increment is not None:
+                stmts += self.stmt(increment)
+        finally:
+            self.loops -= 1
+            if self.scope is not None and defined is not None:
+                self.scope.defined = defined
+        return [ast.While(test, stmts or [ast.Pass()], [])]
+
+    #
+    # Expressões
+    #
+
+    @singledispatchmethod
+    def expr(self, node: Node) -> ast.expr:
+        name = type(node).__name__
+        raise NotImplementedError(f"Método eval não implementado para {name}!")
+
+    @expr.register
+    def _(self, node: Literal) -> ast.expr:
+        if type(node.value) in LITERAL_TYPES:
+            return ast.Constant(node.value)
+        return self.const(node.value)
+
+    @expr.register
+    def _(self, node: Var) -> ast.expr:
+        return self.read(node.name)
+
+    @expr.register
+    def _(self, node: BinOp) -> ast.expr:
+        left, right = self.expr(node.left), self.expr(node.right)
+        if helper := BINARY_HELPERS.get(node.op):
+            func = load(helper)
+        else:
+            func = self.const(node.op)
+
+        if node.is_integer():
+            args = [call("rt_to_int", left), call("rt_to_int", right)]
+            if node.op in COMPARISONS:
+                return ast.Call(func, args, [])
+            return call("rt_int", ast.Call(func, args, []))
+        return ast.Call(func, [left, right], [])
+
+    @expr.register
+    def _(self, node: Call) -> ast.expr:
+        # Cordas (ver `runtime.Rope`) são convertidas em strings antes de
+        # serem passadas a funções, que podem ser nativas.
+        args = [
+            self.expr(arg) if isinstance(arg, Literal) else call("rt_flatten", self.expr(arg))
+            for arg in node.params
+        ]
+        return ast.Call(self.read(node.name), args, [])
+
+    @expr.register
+    def _(self, node: Getattr) -> ast.expr:
+        get = ast.Attribute(self.const(node.cache), "get", ast.Load())
+        return ast.Call(get, [self.expr(node.obj)], [])
+
+    @expr.register
+    def _(self, node: Invoke) -> ast.expr:
+        invoke = ast.Attribute(self.const(node.cache), "invoke", ast.Load())
+        args = ast.Tuple([self.expr(arg) for arg in node.params], ast.Load())
+        return ast.Call(invoke, [self.expr(node.obj), args], [])
+
+    @expr.register
+    def _(self, node: Invariant) -> ast.expr:
+        return self.expr(node.expr)
+
+    @expr.register
+    def _(self, node: InductionProduct) -> ast.expr:
+        return self.expr(node.expr)
+
+    @expr.register
+    def _(self, node: Assign) -> ast.expr:
+        return self.write(node.name, node.value, node.is_integer())
+
+    @expr.register
+    def _(self, node: Setattr) -> ast.expr:
+        value = self.value(node.value, node.is_integer())
+        return call("rt_setattr", self.expr(node.obj), ast.Constant(node.attr), value)
+
+    #
+    # Comandos
+    #
+
+    @singledispatchmethod
+    def stmt(self, node: Node) -> list[ast.stmt]:
+        if isinstance(node, Expr):
+            return [ast.Expr(self.expr(node))]
+        name = type(node).__name__
+        raise NotImplementedError(f"Método eval não implementado para {name}!")
+
+    @stmt.register
+    def _(self, node: Program) -> list[ast.stmt]:
+        return [py for stmt in node.stmts for py in self.stmt(stmt)]
+
+    @stmt.register
+    def _(self, node: Print) -> list[ast.stmt]:
+        return [ast.Expr(call("rt_print", self.expr(node.expr)))]
+
+    @stmt.register
+    def _(self, node: VarDef) -> list[ast.stmt]:
+        if node.initializer is None:
+            value: ast.expr = ast.Constant(None)
+        else:
+            value = self.value(node.initializer, node.is_integer())
+        return self.define(node.name, value)
+
+    @stmt.register
+    def _(self, node: Return) -> list[ast.stmt]:
+        value = ast.Constant(None) if node.expr is None else self.expr(node.expr)
+        if self.scope is None:
+            # Um `return` fora de funções apenas encerra o programa.
+            exit = ast.Constant(True if self.nested else None)
+            return [ast.Expr(value), ast.Return(exit)]
+        return [ast.Return(value)]
+
+    @stmt.register
+    def _(self, node: Block) -> list[ast.stmt]:
+        def body() -> list[ast.stmt]:
+            return [py for stmt in node.stmts for py in self.stmt(stmt)]
+
+        if self.scope is None:
+            return self.script_block(body)
+        return self.scoped(node.scope_slots(), node.stmts, body)
+
+    @stmt.register
+    def _(self, node: While) -> list[ast.stmt]:
+        return self.loop(node.condition, node.body, None)
+
+    @stmt.register
+    def _(self, node: InvariantScope) -> list[ast.stmt]:
+        # Como na máquina virtual, os valores invariantes (ver `lox.optimize`)
+        # não são guardados e as expressões são avaliadas a cada uso.
+        return self.stmt(node.loop)
+
+    @stmt.register
+    def _(self, node: For) -> list[ast.stmt]:
+        # Laços de contagem (`CountedFor`) são compilados como laços comuns.
+        def body() -> list[ast.stmt]:
+            init = [] if node.initializer is None else self.stmt(node.initializer)
+            return [*init, *self.loop(node.condition, node.body, node.increment)]
+
+        if self.scope is None:
+            return self.script_block(body)
+        return self.scoped(node.scope_slots(), [node], body)
+
+    @stmt.register
+    def _(self, node: Function) -> list[ast.stmt]:
+        params = [name for name, _ in node.params]
+        function = FunctionScope(self.function)
+        names = {name: mangle(name) for name in node.scope_slots()}
+        scope = Scope(names, function, self.scope, defined={*params})
+
+        self.scope, self.function, loops, self.loops = scope, function, self.loops, 0
+        try:
+            stmts = node.body.stmts if node.body is not None else []
+            body = [py for stmt in stmts for py in self.stmt(stmt)]
+        finally:
+            self.scope, self.function, self.loops = scope.parent, function.parent, loops
+
+        # As variáveis usadas por closures começam indefinidas para que elas
+        # encontrem o marcador UNDEFINED antes da declaração.
+        prologue: list[ast.stmt] = []
+        if function.nonlocals:
+            prologue.append(ast.Nonlocal(sorted(function.nonlocals)))
+        for binding in sorted(function.cells - {mangle(name) for name in params}):
+            prologue.append(ast.Assign([ast.Name(binding, ast.Store())], load("rt_U")))
+
+        # Caixas de escopos externos são recebidas como argumentos nomeados.
+        boxes = sorted(function.boxes)
+        args = arguments([ast.arg(mangle(name)) for name in params], vararg=ast.arg("rt_extra"))
+        args.kwonlyargs = [ast.arg(box) for box in boxes]
+        args.kw_defaults = [load(box) for box in boxes]
+
+        outer = self.scope
+        if outer is None:
+            name = mangle(node.name)
+        elif node.name in outer.defined:
+            return [ast.Expr(call("rt_redefined", ast.Constant(node.name)))]
+        elif node.name in outer.boxes:
+            name = "rt_function"
+        else:
+            name = outer.names[node.name]
+        definition = ast.FunctionDef(
+            name=name,
+            args=args,
+            body=[*prologue, *body, ast.Return(ast.Constant(None))],
+            decorator_list=[],
+            type_params=[],
+        )
+        if outer is None or node.name in outer.boxes:
+            return [definition, *self.define(node.name, load(name))]
+        outer.defined.add(node.name)
+        return [definition]
+
+
+#
+# FUNÇÕES AUXILIARES
+#
+
+
+def mangle(name: str) -> str:
+    return f"l_{name}"
+
+
+def load(name: str) -> ast.Name:
+    return ast.Name(name, ast.Load())
+
+
+def call(name: str, *args: ast.expr) -> ast.Call:
+    return ast.Call(load(name), list(args), [])
+
+
+def variable(scope: Scope, name: str) -> ast.expr:
+    binding = scope.names[name]
+    if name in scope.boxes:
+        return ast.Subscript(load(binding), ast.Constant(0), ast.Load())
+    return load(binding)
+
+
+def set_variable(scope: Scope, name: str, value: ast.expr) -> ast.expr:
+    binding = scope.names[name]
+    if name in scope.boxes:
+        return call("rt_store", load(binding), value)
+    return ast.NamedExpr(ast.Name(binding, ast.Store()), value)
+
+
+def captured_names(nodes: Iterable[Node]) -> set[str]:
+    """
+    Nomes de variáveis usados dentro das funções declaradas nos nós.
+    """
+    names = set()
+    for node in nodes:
+        for function in node.descendants():
+            if isinstance(function, Function):
+                for child in function.descendants():
+                    if isinstance(child, (Var, Assign, Call)):
+                        names.add(child.name)
+    return names
+
+
+def arguments(args: list[ast.arg], vararg: Optional[ast.arg] = None) -> ast.arguments:
+    return ast.arguments(
+        posonlyargs=[],
+        args=args,
+        vararg=vararg,
+        kwonlyargs=[],
+        kw_defaults=[],
+        kwarg=None,
+        defaults=[],
+    )
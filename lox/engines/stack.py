@@ -0,0 +1,286 @@
+"""
+Interpretador de árvore com pilha de controle explícita.
+
+O interpretador padrão associa cada chamada Lox a vários registros da pilha
+do Python e programas com recursão profunda (que não está em posição de
+cauda) produzem um RecursionError muito antes do que aconteceria em uma
+implementação real de Lox.
+
+Aqui a avaliação de cada nó é um gerador que solicita a avaliação dos nós
+filhos com `yield` e recebe o valor produzido por eles. O laço principal
+(`Machine.execute`) mantém os geradores pendentes em uma lista, de modo que
+a profundidade da recursão é limitada apenas pela memória disponível. O
+número de chamadas Lox simultâneas é limitado por `max_depth()` e exceder
+esse limite produz o erro "Stack overflow." esperado pelos exemplos.
+
+Nós sem uma avaliação especializada usam o próprio método `eval`, como no
+mecanismo "closure".
+"""
+
+import builtins
+import os
+from functools import singledispatch
+from typing import Generator
+
+from ..ast import *
+from ..ctx import Ctx, Frame
+from ..node import Node
+from ..runtime import (
+    COMPARISONS,
+    LoxError,
+    ReturnValue,
+    coerce_integer,
+    flatten,
+    set_attribute,
+    to_integer,
+    trampoline,
+)
+
+MAX_DEPTH_ENV = "LOX_MAX_DEPTH"
+MAX_DEPTH = 100_000
+
+# Um passo da avaliação: produz pedidos de avaliação (`Eval` ou `Activation`)
+# e recebe o valor correspondente a cada um deles.
+Steps = Generator["Eval | Activation", Value, Value]
+
+
+def max_depth() -> int:
+    """
+    Número máximo de chamadas de funções Lox ativas simultaneamente.
+    """
+    try:
+        return int(os.environ[MAX_DEPTH_ENV])
+    except (KeyError, ValueError):
+        return MAX_DEPTH
+
+
+def run(node: Node, ctx: Ctx) -> Value:
+    """
+    Executa o nó no contexto fornecido usando a pilha de controle explícita.
+    """
+    return Machine(max_depth()).execute(Eval(node, ctx))
+
+
+class Eval:
+    """
+    Pedido de avaliação de um nó filho.
+    """
+
+    __slots__ = ("node", "ctx")
+
+    def __init__(self, node: Node, ctx: Ctx):
+        self.node = node
+        self.ctx = ctx
+
+
+class Activation:
+    """
+    Pedido de execução do corpo de uma função Lox.
+
+    Diferentemente de `Eval`, conta como uma chamada para o limite de
+    profundidade da máquina.
+    """
+
+    __slots__ = ("body",)
+
+    def __init__(self, body: Steps):
+        self.body = body
+
+
+class Machine:
+    """
+    Executa os passos de avaliação mantendo os geradores pendentes em uma
+    lista em vez da pilha do Python.
+    """
+
+    def __init__(self, max_depth: int = MAX_DEPTH):
+        self.max_depth = max_depth
+        self.depth = 0
+
+    def execute(self, request: "Eval | Activation") -> Value:
+        """
+        Atende o pedido e os pedidos feitos durante a sua execução e retorna
+        o valor produzido.
+        """
+        stack: list[Steps] = []
+        # Posições de `stack` onde começam os corpos de funções.
+        activations: list[int] = []
+        try:
+            while True:
+                if type(request) is Eval:
+                    stack.append(steps(request.node, request.ctx, self))
+                else:
+                    if self.depth >= self.max_depth:
+                        raise LoxError("Stack overflow.")
+                    self.depth += 1
+                    activations.append(len(stack))
+                    stack.append(request.body)
+
+                value = None
+                while True:
+                    try:
+                        request = stack[-1].send(value)
+                        break
+                    except StopIteration as stop:
+                        stack.pop()
+                        value = stop.value
+                    if activations and activations[-1] == len(stack):
+                        activations.pop()
+                        self.depth -= 1
+                    if not stack:
+                        return value
+        finally:
+            self.depth -= len(activations)
+            for gen in reversed(stack):
+                gen.close()
+
+
+class StackFunction:
+    """
+    Função Lox criada por este mecanismo.
+
+    Chamadas feitas pelo código Lox executam o corpo na mesma máquina (ver
+    `activate`). Funções nativas que recebem a função como argumento a
+    chamam normalmente e o corpo é executado por um novo laço que
+    compartilha o limite de profundidade.
+    """
+
+    __slots__ = ("node", "ctx", "machine")
+
+    def __init__(self, node: Function, ctx: Ctx, machine: Machine):
+        self.node = node
+        self.ctx = ctx
+        self.machine = machine
+
+    def __call__(self, *args):
+        return self.machine.execute(self.activate(args))
+
+    def __repr__(self):
+        return f"<fn {self.node.name}>"
+
+    def activate(self, args) -> Activation:
+        node = self.node
+        if node.frame_slots is None:
+            env = self.ctx.push({name: arg for (name, _), arg in zip(node.params, args)})
+        else:
+            env = Frame(node.frame_slots, node.frame_values(tuple(args)), self.ctx)
+        return Activation(function_body(node, env))
+
+
+def function_body(node: Function, env: Ctx) -> Steps:
+    if node.body is not None:
+        for stmt in node.body.stmts:
+            if type(result := (yield Eval(stmt, env))) is ReturnValue:
+                # Comandos avaliados com `eval` (ex.: blocos aninhados) podem
+                # devolver chamadas em posição de cauda (`TailCall`).
+                return trampoline(result.value)
+    return None
+
+
+@singledispatch
+def steps(node: Node, ctx: Ctx, machine: "Machine") -> Steps:
+    """
+    Avalia o nó, solicitando a avaliação dos filhos à máquina.
+
+    A implementação genérica delega para o método `eval` do nó.
+    """
+    # `yield from ()` não produz pedidos, mas torna a função um gerador.
+    yield from ()
+    return node.eval(ctx)
+
+
+@steps.register
+def _(node: Program, ctx: Ctx, machine: "Machine") -> Steps:
+    for stmt in node.stmts:
+        if type(result := (yield Eval(stmt, ctx))) is ReturnValue:
+            trampoline(result.value)
+            return None
+    return None
+
+
+#
+# EXPRESSÕES
+#
+
+
+@steps.register
+def _(node: BinOp, ctx: Ctx, machine: "Machine") -> Steps:
+    left = yield Eval(node.left, ctx)
+    right = yield Eval(node.right, ctx)
+    if node.is_integer() and node.op in COMPARISONS:
+        return node.op(to_integer(left), to_integer(right))
+    if node.is_integer():
+        return int(node.op(to_integer(left), to_integer(right)))
+    return node.op(left, right)
+
+
+@steps.register
+def _(node: Call, ctx: Ctx, machine: "Machine") -> Steps:
+    func = node.callee(ctx)
+    args = []
+    for param in node.params:
+        args.append((yield Eval(param, ctx)))
+    if type(func) is StackFunction:
+        return (yield func.activate(args))
+    return func(*[flatten(arg) for arg in args])
+
+
+@steps.register
+def _(node: Assign, ctx: Ctx, machine: "Machine") -> Steps:
+    value = yield Eval(node.value, ctx)
+    if node.is_integer():
+        value = coerce_integer(value)
+    return node.assign(ctx, value)
+
+
+@steps.register
+def _(node: Setattr, ctx: Ctx, machine: "Machine") -> Steps:
+    obj = yield Eval(node.obj, ctx)
+    value = yield Eval(node.value, ctx)
+    if node.is_integer():
+        value = coerce_integer(value)
+    set_attribute(obj, node.attr, value)
+    return value
+
+
+#
+# COMANDOS
+#
+
+
+@steps.register
+def _(node: Print, ctx: Ctx, machine: "Machine") -> Steps:
+    builtins.print((yield Eval(node.expr, ctx)))
+    return None
+
+
+@steps.register
+def _(node: VarDef, ctx: Ctx, machine: "Machine") -> Steps:
+    value = None
+    if node.initializer is not None:
+        value = yield Eval(node.initializer, ctx)
+        if node.is_integer():
+            value = coerce_integer(value)
+    node.define(ctx, value)
+    return None
+
+
+@steps.register
+def _(node: Return, ctx: Ctx, machine: "Machine") -> Steps:
+    # Chamadas em posição de cauda (TailReturn) também são executadas aqui:
+    # como a pilha de controle fica na memória, não é preciso devolvê-las ao
+    # chamador.
+    if node.expr is None:
+        return ReturnValue(None)
+    return ReturnValue((yield Eval(node.expr, ctx)))
+
+
+@steps.register
+def _(node: Function, ctx: Ctx, machine: "Machine") -> Steps:
+    yield from ()
+    function = StackFunction(node, ctx, machine)
+    if node.slot is None:
+        ctx.var_def(node.name, function)
+    else:
+        define_slot(ctx, node.name, node.slot, function)
+    return None
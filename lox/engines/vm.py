@@ -0,0 +1,438 @@
+"""
+Máquina virtual de pilha que executa o bytecode produzido por
+`lox.engines.bytecode`.
+
+Assim como no clox, os argumentos e as variáveis locais de cada chamada
+ocupam posições consecutivas de uma única pilha de valores e as variáveis
+capturadas por closures são representadas por upvalues. Um upvalue aponta
+para a posição da variável na pilha enquanto a função que a declarou está
+ativa e passa a guardar o próprio valor quando essa função retorna.
+
+Closures criadas pela máquina virtual podem ser chamadas por código Python
+(ex.: funções nativas), que reentra no laço de execução.
+"""
+
+import builtins
+
+from .. import runtime as op
+from ..ctx import UNDEFINED, Ctx
+from ..node import Node
+from ..runtime import LoxError, coerce_integer, flatten, set_attribute, show, to_integer
+from .bytecode import Compiler, FunctionProto, OpCode
+
+FRAMES_MAX = 64
+
+# Os opcodes são copiados para constantes inteiras do módulo para evitar o
+# custo de comparar membros de IntEnum no laço de execução.
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+DEFINE_LOCAL = OpCode.DEFINE_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+EQUAL = OpCode.EQUAL.value
+NOT_EQUAL = OpCode.NOT_EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+BINARY = OpCode.BINARY.value
+TO_INT = OpCode.TO_INT.value
+INT = OpCode.INT.value
+COERCE_INT = OpCode.COERCE_INT.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+LOOP = OpCode.LOOP.value
+CALL = OpCode.CALL.value
+CLOSURE = OpCode.CLOSURE.value
+CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+RETURN = OpCode.RETURN.value
+TAIL_CALL = OpCode.TAIL_CALL.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+INVOKE = OpCode.INVOKE.value
+
+
+def run(node: Node, ctx: Ctx):
+    """
+    Compila o nó para bytecode e o executa no contexto fornecido.
+    """
+    return VM(ctx).interpret(Compiler.compile(node))
+
+
+class Upvalue:
+    """
+    Referência para uma variável capturada por uma closure.
+
+    O valor é sempre lido em `location[index]`: enquanto a variável está na
+    pilha, `location` é a própria pilha da máquina virtual; depois que o
+    upvalue é fechado, passa a ser uma lista com um único elemento.
+    """
+
+    __slots__ = ("location", "index")
+
+    def __init__(self, location: list, index: int):
+        self.location = location
+        self.index = index
+
+    def close(self) -> None:
+        self.location = [self.location[self.index]]
+        self.index = 0
+
+
+class Closure:
+    """
+    Função compilada junto com os upvalues capturados na sua criação.
+    """
+
+    __slots__ = ("function", "upvalues", "vm")
+
+    def __init__(self, function: FunctionProto, upvalues: list[Upvalue], vm: "VM"):
+        self.function = function
+        self.upvalues = upvalues
+        self.vm = vm
+
+    def __call__(self, *args):
+        return self.vm.call(self, args)
+
+    def __repr__(self):
+        return str(self.function)
+
+
+class VM:
+    """
+    Máquina virtual de pilha.
+
+    Variáveis globais são armazenadas no contexto `ctx`.
+    """
+
+    def __init__(self, ctx: Ctx):
+        self.ctx = ctx
+        self.stack: list = []
+        self.frames: list[tuple[Closure, int, int]] = []
+        self.open_upvalues: dict[int, Upvalue] = {}
+
+    def interpret(self, function: FunctionProto):
+        return self.call(Closure(function, [], self), ())
+
+    def call(self, closure: Closure, args: tuple):
+        """
+        Executa a closure com os argumentos fornecidos e retorna o resultado.
+        """
+        if len(self.frames) >= FRAMES_MAX:
+            raise LoxError("Stack overflow.")
+        stack = self.stack
+        stack.append(closure)
+        base = len(stack)
+        stack.extend(args)
+        self.adjust_arguments(closure.function, len(args))
+        return self.execute(closure, base)
+
+    def adjust_arguments(self, function: FunctionProto, argc: int) -> None:
+        """
+        Ajusta os argumentos no topo da pilha à aridade da função e reserva
+        as posições das demais variáveis locais.
+
+        Assim como no interpretador de árvore, argumentos extras são
+        ignorados e parâmetros sem argumento ficam indefinidos.
+        """
+        stack = self.stack
+        arity = function.arity
+        if argc > arity:
+            del stack[arity - argc :]
+        elif argc < arity:
+            stack.extend([UNDEFINED] * (arity - argc))
+        stack.extend(function.padding)
+
+    def capture_upvalue(self, index: int) -> Upvalue:
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.open_upvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def close_upvalues(self, last: int) -> None:
+        """
+        Fecha todos os upvalues que apontam para posições da pilha a partir
+        de `last`.
+        """
+        open_upvalues = self.open_upvalues
+        for index in [index for index in open_upvalues if index >= last]:
+            open_upvalues.pop(index).close()
+
+    def lookup(self, name: str):
+        try:
+            return self.ctx[name]
+        except KeyError:
+            raise NameError(f"variável {name} não existe!")
+
+    def execute(self, closure: Closure, base: int):
+        """
+        Laço principal da máquina virtual.
+
+        Executa a closure cujos argumentos começam na posição `base` da pilha
+        até que ela retorne. Chamadas feitas a partir do bytecode empilham um
+        novo registro em `frames` em vez de chamar `execute` recursivamente.
+        """
+        stack, frames, ctx = self.stack, self.frames, self.ctx
+        push, pop = stack.append, stack.pop
+        add, sub, mul, truediv = op.add, op.sub, op.mul, op.truediv
+        entry = len(frames)
+
+        function = closure.function
+        code, constants = function.chunk.code, function.chunk.constants
+        upvalues = closure.upvalues
+        ip = 0
+
+        try:
+            while True:
+                instruction = code[ip]
+                ip += 1
+
+                if instruction == GET_LOCAL:
+                    value = stack[base + code[ip]]
+                    if value is UNDEFINED:
+                        value = self.lookup(function.locals[code[ip]])
+                    push(value)
+                    ip += 1
+
+                elif instruction == CONSTANT:
+                    push(constants[code[ip]])
+                    ip += 1
+
+                elif instruction == ADD:
+                    right = pop()
+                    stack[-1] = add(stack[-1], right)
+
+                elif instruction == SUBTRACT:
+                    right = pop()
+                    stack[-1] = sub(stack[-1], right)
+
+                elif instruction == MULTIPLY:
+                    right = pop()
+                    stack[-1] = mul(stack[-1], right)
+
+                elif instruction == DIVIDE:
+                    right = pop()
+                    stack[-1] = truediv(stack[-1], right)
+
+                elif instruction == GET_GLOBAL:
+                    push(self.lookup(constants[code[ip]]))
+                    ip += 1
+
+                elif instruction == SET_LOCAL:
+                    slot = base + code[ip]
+                    if stack[slot] is UNDEFINED:
+                        ctx[function.locals[code[ip]]] = stack[-1]
+                    else:
+                        stack[slot] = stack[-1]
+                    ip += 1
+
+                elif instruction == DEFINE_LOCAL:
+                    slot = base + code[ip]
+                    if stack[slot] is not UNDEFINED:
+                        name = function.locals[code[ip]]
+                        raise KeyError(f"Variable '{name}' already defined in the current scope.")
+                    stack[slot] = pop()
+                    ip += 1
+
+                elif instruction == POP:
+                    pop()
+
+                elif instruction == GET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    value = upvalue.location[upvalue.index]
+                    if value is UNDEFINED:
+                        value = self.lookup(function.upvalue_names[code[ip]])
+                    push(value)
+                    ip += 1
+
+                elif instruction == SET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    if upvalue.location[upvalue.index] is UNDEFINED:
+                        ctx[function.upvalue_names[code[ip]]] = stack[-1]
+                    else:
+                        upvalue.location[upvalue.index] = stack[-1]
+                    ip += 1
+
+                elif instruction == SET_GLOBAL:
+                    ctx[constants[code[ip]]] = stack[-1]
+                    ip += 1
+
+                elif instruction == DEFINE_GLOBAL:
+                    ctx.var_def(constants[code[ip]], pop())
+                    ip += 1
+
+                elif instruction == TO_INT:
+                    stack[-1] = to_integer(stack[-1])
+
+                elif instruction == INT:
+                    stack[-1] = int(stack[-1])
+
+                elif instruction == COERCE_INT:
+                    stack[-1] = coerce_integer(stack[-1])
+
+                elif instruction == CALL:
+                    argc = code[ip]
+                    ip += 1
+                    callee = stack[-argc - 1]
+                    if type(callee) is Closure and callee.vm is self:
+                        if len(frames) >= FRAMES_MAX:
+                            raise LoxError("Stack overflow.")
+                        frames.append((closure, ip, base))
+                        closure = callee
+                        function = closure.function
+                        code, constants = function.chunk.code, function.chunk.constants
+                        upvalues = closure.upvalues
+                        base = len(stack) - argc
+                        ip = 0
+                        self.adjust_arguments(function, argc)
+                    elif callable(callee):
+                        args = [flatten(arg) for arg in stack[len(stack) - argc :]]
+                        del stack[-argc - 1 :]
+                        push(callee(*args))
+                    else:
+                        raise TypeError(f"{show(callee)} não é uma função!")
+
+                elif instruction == TAIL_CALL:
+                    argc = code[ip]
+                    ip += 1
+                    callee = stack[-argc - 1]
+                    if type(callee) is Closure and callee.vm is self:
+                        # Substitui o registro atual pelo da função chamada.
+                        if self.open_upvalues:
+                            self.close_upvalues(base)
+                        stack[base - 1 :] = stack[-argc - 1 :]
+                        closure = callee
+                        function = closure.function
+                        code, constants = function.chunk.code, function.chunk.constants
+                        upvalues = closure.upvalues
+                        ip = 0
+                        self.adjust_arguments(function, argc)
+                    elif callable(callee):
+                        args = [flatten(arg) for arg in stack[len(stack) - argc :]]
+                        del stack[-argc - 1 :]
+                        push(callee(*args))
+                    else:
+                        raise TypeError(f"{show(callee)} não é uma função!")
+
+                elif instruction == RETURN:
+                    result = pop()
+                    if self.open_upvalues:
+                        self.close_upvalues(base)
+                    del stack[base - 1 :]
+                    if len(frames) == entry:
+                        return result
+                    push(result)
+                    closure, ip, base = frames.pop()
+                    function = closure.function
+                    code, constants = function.chunk.code, function.chunk.constants
+                    upvalues = closure.upvalues
+
+                elif instruction == CLOSURE:
+                    proto = constants[code[ip]]
+                    ip += 1
+                    captured = []
+                    for _ in proto.upvalues:
+                        is_local, index = code[ip], code[ip + 1]
+                        ip += 2
+                        if is_local:
+                            captured.append(self.capture_upvalue(base + index))
+                        else:
+                            captured.append(upvalues[index])
+                    push(Closure(proto, captured, self))
+
+                elif instruction == NIL:
+                    push(None)
+
+                elif instruction == PRINT:
+                    builtins.print(pop())
+
+                elif instruction == SET_PROPERTY:
+                    value = pop()
+                    set_attribute(pop(), constants[code[ip]], value)
+                    push(value)
+                    ip += 1
+
+                elif instruction == GET_PROPERTY:
+                    stack[-1] = constants[code[ip]].get(stack[-1])
+                    ip += 1
+
+                elif instruction == INVOKE:
+                    cache, argc = constants[code[ip]], code[ip + 1]
+                    ip += 2
+                    args = tuple(stack[len(stack) - argc :])
+                    del stack[len(stack) - argc :]
+                    stack[-1] = cache.invoke(stack[-1], args)
+
+                elif instruction == EQUAL:
+                    right = pop()
+                    stack[-1] = op.eq(stack[-1], right)
+
+                elif instruction == NOT_EQUAL:
+                    right = pop()
+                    stack[-1] = op.ne(stack[-1], right)
+
+                elif instruction == GREATER:
+                    right = pop()
+                    stack[-1] = op.gt(stack[-1], right)
+
+                elif instruction == GREATER_EQUAL:
+                    right = pop()
+                    stack[-1] = op.ge(stack[-1], right)
+
+                elif instruction == LESS:
+                    right = pop()
+                    stack[-1] = op.lt(stack[-1], right)
+
+                elif instruction == LESS_EQUAL:
+                    right = pop()
+                    stack[-1] = op.le(stack[-1], right)
+
+                elif instruction == BINARY:
+                    right = pop()
+                    stack[-1] = constants[code[ip]](stack[-1], right)
+                    ip += 1
+
+                elif instruction == JUMP:
+                    ip += 2 + ((code[ip] << 8) | code[ip + 1])
+
+                elif instruction == JUMP_IF_FALSE:
+                    if op.truthy(stack[-1]):
+                        ip += 2
+                    else:
+                        ip += 2 + ((code[ip] << 8) | code[ip + 1])
+
+                elif instruction == LOOP:
+                    ip -= (code[ip] << 8) | code[ip + 1]
+                    ip += 2
+
+                elif instruction == CLOSE_UPVALUE:
+                    # Fim do escopo de uma variável local (ver `end_scope`).
+                    slot = base + code[ip]
+                    if (upvalue := self.open_upvalues.pop(slot, None)) is not None:
+                        upvalue.close()
+                    stack[slot] = UNDEFINED
+                    ip += 1
+
+                else:
+                    raise LoxError(f"Unknown opcode {instruction}.")
+
+        except BaseException:
+            # Descarta os registros e valores das chamadas interrompidas para
+            # que a máquina virtual continue utilizável por quem capturar o
+            # erro (ex.: uma função nativa que chamou uma closure).
+            base = frames[entry][2] if len(frames) > entry else base
+            del frames[entry:]
+            self.close_upvalues(base)
+            del stack[base - 1 :]
+            raise
@@ -4,10 +4,12 @@ ATENÇÃO: EVITE MODIFICAR ESTE ARQUIVO!
 Define estrutura de dados básicas para as árvores sintáticas.
 """
 
+import collections.abc
+import dataclasses
 from abc import ABC
 from dataclasses import dataclass, field
-from functools import singledispatch
-from types import BuiltinFunctionType, FunctionType, MethodDescriptorType, MethodType
+from functools import cache, singledispatch
+from types import BuiltinFunctionType, FunctionType, MethodDescriptorType, MethodType, NoneType
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -15,9 +17,12 @@ from typing import (
     Generic,
     Iterable,
     Iterator,
+    NamedTuple,
     Optional,
     TypeVar,
     cast,
+    get_args,
+    get_origin,
 )
 
 from lark import Token, Tree
@@ -28,6 +33,9 @@ if TYPE_CHECKING:
 
 N = TypeVar("N", bound="Node", contravariant=True)
 
+# Valor de campos calculados sob demanda que ainda não foram calculados.
+UNSET: Any = object()
+
 
 class Node(ABC):
     """
@@ -36,8 +44,14 @@ class Node(ABC):
     O módulo `abc` é usado para criar uma classe abstrata. Isso significa que
     não podemos instanciar essa classe diretamente. Em vez disso, devemos
     criar subclasses que implementem os métodos abstratos definidos aqui.
+
+    As subclasses são dataclasses com `__slots__`, de modo que os nós não
+    possuem um `__dict__`. Os campos que fazem parte da árvore são obtidos
+    com `node_fields`.
     """
 
+    __slots__ = ()
+
     def eval(self, ctx):
         name = type(self).__name__
         raise NotImplementedError(f"Método eval não implementado para {name}!")
@@ -61,7 +75,7 @@ class Node(ABC):
 
         Um nó é considerado uma folha se não tem filhos do tipo `Node`.
         """
-        for name in self.__annotations__:
+        for name in node_fields(type(self)).names:
             value = getattr(self, name)
             if isinstance(value, (Node, list, tuple, dict)):
                 return False
@@ -87,10 +101,9 @@ class Node(ABC):
         # o nome da classe e um parêntese de abertura
         yield indent_level, str(self.__class__.__name__) + "("
 
-        # O attributo "__annotations__" é um dicionário que contém os nomes dos
-        # atributos declarados e seus tipos correspondentes. Vamos pegar os tipos
-        # na ordem de declaração e imprimir o nome e valores correspondentes
-        for attr in self.__annotations__:
+        # A função `node_fields` retorna os nomes dos campos da classe na
+        # ordem de declaração. Vamos imprimir o nome e valores correspondentes
+        for attr in node_fields(type(self)).names:
             # attr é o nome do atributo. Obtemos o valor do atributo usando a
             # função `getattr` do Python
             value = getattr(self, attr)
@@ -157,23 +170,30 @@ class Node(ABC):
 
         Executa a função correspondente ao tipo para cada nó na árvore sintática.
         """
+        dispatch = Dispatcher(visitors)
 
-        # Primeiro visitamos os filhos do nó atual.
-        for name in self.__annotations__:
-            value = getattr(self, name)
-            if isinstance(value, Node):
-                value.visit(visitors)
-            elif isinstance(value, (list, tuple)):
-                for item in value:
-                    if isinstance(item, Node):
-                        item.visit(visitors)
-                    else:
-                        visit_once(item, visitors)
-            else:
-                visit_once(value, visitors)
-
-        # Agora visitamos self
-        visit_once(self, visitors)
+        # Os filhos são visitados antes do próprio nó. A pilha guarda pares
+        # (objeto, expandido): um nó é empilhado novamente como expandido
+        # antes de seus filhos, para ser visitado depois deles.
+        pending: list[tuple[Any, bool]] = [(self, False)]
+        while pending:
+            obj, expanded = pending.pop()
+            handler, names = dispatch.entry(type(obj))
+            if expanded or names is None:
+                if handler is not None:
+                    handler(obj)
+                continue
+            # Nós sem função correspondente não precisam ser revisitados.
+            if handler is not None:
+                pending.append((obj, True))
+            items = []
+            for name in names:
+                value = getattr(obj, name)
+                if isinstance(value, (list, tuple)):
+                    items.extend(value)
+                else:
+                    items.append(value)
+            pending.extend((item, False) for item in reversed(items))
 
     def children(self) -> Iterable["Node"]:
         """
@@ -183,9 +203,13 @@ class Node(ABC):
         do nó atual. Isso é útil para percorrer a árvore sintática de forma
         recursiva.
         """
-        for name in self.__annotations__:
+        for name, is_list in node_fields(type(self)).children:
             value = getattr(self, name)
-            if isinstance(value, Node):
+            if is_list and isinstance(value, (list, tuple)):
+                for item in value:
+                    if isinstance(item, Node):
+                        yield item
+            elif isinstance(value, Node):
                 yield value
             elif isinstance(value, (list, tuple)):
                 for item in value:
@@ -203,19 +227,20 @@ class Node(ABC):
         método ajuda a encontrar nós não-tranformados que podem ter escapado seu
         Transformer.
         """
-        for name in self.__annotations__:
-            value = getattr(self, name)
-            if isinstance(value, (Tree, Token)):
-                yield value
-
-            if isinstance(value, Node):
-                yield from value.lark_descendents()
-            elif isinstance(value, (list, tuple)):
-                for item in value:
-                    if isinstance(item, Node):
-                        yield from item.lark_descendents()
-                    elif isinstance(item, (Tree, Token)):
-                        yield item
+        pending: list[Any] = [self]
+        while pending:
+            obj = pending.pop()
+            if isinstance(obj, (Tree, Token)):
+                yield obj
+                continue
+            items = []
+            for name in node_fields(type(obj)).names:
+                value = getattr(obj, name)
+                if isinstance(value, (Node, Tree, Token)):
+                    items.append(value)
+                elif isinstance(value, (list, tuple)):
+                    items.extend(item for item in value if isinstance(item, (Node, Tree, Token)))
+            pending.extend(reversed(items))
 
     def descendants(self) -> Iterable[Any]:
         """
@@ -224,17 +249,26 @@ class Node(ABC):
         O método `descendants` retorna um iterador que percorre todos os
         descendentes do nó atual. Isso é útil para percorrer a árvore sintática
         de forma recursiva.
+
+        A travessia usa uma pilha explícita em vez de geradores aninhados,
+        de modo que árvores muito profundas (ex.: longas cadeias de `else if`)
+        não esgotam a pilha do Python.
         """
-        yield self
-        for child in self.children():
-            yield from child.descendants()
+        pending: list[Node] = [self]
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(reversed(list(node.children())))
 
-    def cursor(self, cursor: Optional["Cursor[N]"] = None) -> "Cursor[N]":
+    def cursor(self, cursor: Optional["Cursor[N]"] = None, index: Optional["ParentIndex"] = None) -> "Cursor[N]":
         """
         Retorna um cursor para o nó atual.
 
         O método `cursor` retorna um cursor para o nó atual. Isso é útil
         para navegar na árvore sintática de forma recursiva.
+
+        Com um índice de pais (ver `ParentIndex`), o cursor é construído
+        subindo do nó atual até o nó de `cursor`, sem percorrer a subárvore.
         """
         if cursor is None:
             return Cursor(self)  # type: ignore
@@ -242,6 +276,9 @@ class Node(ABC):
         if cursor.node is self:
             return cursor
 
+        if index is not None and (found := index.cursor(self, cursor)) is not None:
+            return found  # type: ignore
+
         # Busca em largura
         pending = [cursor]
         while pending:
@@ -251,14 +288,24 @@ class Node(ABC):
             pending.extend(cursor.children())
         raise ValueError("O cursor não aponta para o nó atual")
 
-    def replace_child(self, old: "Node", new: "Node") -> None:
+    def replace_child(self, old: "Node", new: "Node", index: Optional["ParentIndex"] = None) -> None:
         """
         Substitui um filho do nó atual.
 
         O método `replace_child` substitui um filho do nó atual por um novo
         nó. Isso é útil para modificar a árvore sintática de forma recursiva.
+
+        Com um índice de pais, a posição do filho é obtida diretamente do
+        índice, que também é atualizado com o novo nó.
         """
-        for name in self.__annotations__:
+        if index is not None and index.parent(old) is self and index.replace(old, new):
+            return
+        self._replace_child(old, new)
+        if index is not None:
+            index.update(self)
+
+    def _replace_child(self, old: "Node", new: "Node") -> None:
+        for name, _ in node_fields(type(self)).children:
             value = getattr(self, name)
             if isinstance(value, Node):
                 if value is old:
@@ -279,18 +326,20 @@ class Node(ABC):
 
         A implementação padrão não faz nada, mas subclasses podem
         sobrescrever esse método para realizar transformações específicas.
+        Se o método retornar um novo nó, ele substitui o nó atual na árvore
+        (ver `lox.passes.traverse`).
         """
 
     def desugar_tree(self):
         """
         Remove açúcar sintático do nó atual e todos os filhos.
+
+        Programas registram as etapas já aplicadas e não passam por elas
+        novamente (ver `lox.passes`).
         """
-        pending = [self.cursor()]
+        from .passes import run_passes
 
-        while pending:
-            cursor = pending.pop()
-            cursor.node.desugar_self()
-            pending.extend(cursor.children())
+        run_passes(self, ["desugar"])
 
     def validate_self(self, cursor: "Cursor[Node]"):
         """
@@ -306,11 +355,29 @@ class Node(ABC):
         """
         Valida o nó atual e todos os filhos.
         """
-        for cursor in self.cursor().descendants():
-            cursor.node.validate_self(cursor)
+        from .passes import run_passes
+
+        run_passes(self, ["validate"])
+
+    def resolve_self(self, cursor: "Cursor[Node]"):
+        """
+        Resolve estaticamente os nomes usados pelo nó atual.
+
+        Nós que leem ou escrevem variáveis podem sobrescrever este método para
+        anotar em qual escopo a variável foi declarada (ver `Cursor.resolve`).
+        A implementação padrão não faz nada.
+        """
+
+    def resolve_tree(self):
+        """
+        Resolve os nomes do nó atual e de todos os filhos.
+        """
+        from .passes import run_passes
+
+        run_passes(self, ["resolve"])
 
 
-@dataclass
+@dataclass(slots=True)
 class Cursor(Generic[N]):
     """
     Classe que representa um cursor para navegar na árvore sintática.
@@ -319,6 +386,9 @@ class Cursor(Generic[N]):
     node: N
     parent_cursor: Optional["Cursor[Node]"] = field(default=None, repr=False)
 
+    # Cursor do escopo mais próximo entre os pais (ver `enclosing_scope`).
+    _scope: Any = field(default=UNSET, init=False, repr=False, compare=False)
+
     def parent(self) -> "Cursor[Node]":
         """
         Retorna o nó pai do cursor.
@@ -337,9 +407,10 @@ class Cursor(Generic[N]):
         O método `root` retorna o nó raiz do cursor. Isso é útil para
         navegar na árvore sintática de forma recursiva.
         """
-        if not self.parent_cursor:
-            return cast("Cursor[Node]", self)
-        return self.parent_cursor.root()
+        cursor = cast("Cursor[Node]", self)
+        while cursor.parent_cursor is not None:
+            cursor = cursor.parent_cursor
+        return cursor
 
     def is_root(self) -> bool:
         """
@@ -399,12 +470,19 @@ class Cursor(Generic[N]):
         O método `descendants` retorna um iterador que percorre todos os
         descendentes do nó atual. Isso é útil para navegar na árvore sintática
         de forma recursiva.
+
+        Cursores em que `skip` retorna True são omitidos junto com seus
+        descendentes. A travessia usa uma pilha explícita (ver
+        `Node.descendants`) e cria um único cursor por nó.
         """
-        if skip is None or not skip(self):
-            if not skip_self:
-                yield cast("Cursor[Node]", self)
-            for child in self.children():
-                yield from child.descendants(skip)
+        pending = [cast("Cursor[Node]", self)]
+        while pending:
+            cursor = pending.pop()
+            if skip is not None and skip(cursor):
+                continue
+            if cursor is not self or not skip_self:
+                yield cursor
+            pending.extend(reversed([Cursor(child, cursor) for child in cursor.node.children()]))
 
     def is_scoped_to(self, scope: type[Node]) -> bool:
         """
@@ -452,6 +530,251 @@ class Cursor(Generic[N]):
             raise ValueError("O cursor não está dentro de uma função")
         return cursor
 
+    def resolve(self, name: str) -> tuple[int, int] | tuple[None, None]:
+        """
+        Localiza estaticamente o escopo onde a variável `name` foi declarada.
+
+        Retorna uma dupla (depth, slot) onde `depth` é o número de escopos
+        entre o nó atual e a declaração e `slot` é a posição da variável nesse
+        escopo. Os escopos considerados são os que criam um `Frame` durante a
+        execução (ver `enclosing_scope`), de modo que a variável encontrada é
+        a declaração mais interna que envolve o nó. Variáveis globais ou
+        embutidas (como `clock`) não podem ser resolvidas estaticamente, pois
+        o ambiente global é fornecido somente durante a execução. Nesse caso,
+        retorna (None, None).
+        """
+        depth = 0
+        scope = self.enclosing_scope()
+        while scope is not None:
+            slots = scope.node.frame_slots  # type: ignore[attr-defined]
+            if name in slots:
+                return depth, slots[name]
+            depth += 1
+            scope = scope.enclosing_scope()
+        return None, None
+
+    def enclosing_scope(self) -> Optional["Cursor[Node]"]:
+        """
+        Retorna o cursor do escopo mais próximo entre os pais do nó atual ou
+        None se o nó não está dentro de uma função.
+
+        Escopos são os nós cujo atributo `frame_slots` foi preenchido pelo
+        resolvedor: funções e, dentro delas, blocos e laços `for` que declaram
+        variáveis. Como a resolução visita os pais antes dos filhos, os
+        escopos acima do nó atual já estão anotados.
+
+        O resultado é guardado nos cursores percorridos, de modo que resolver
+        todas as variáveis de uma árvore profunda não percorre a mesma cadeia
+        de pais repetidas vezes.
+        """
+        path = []
+        cursor = cast("Cursor[Node]", self)
+        while True:
+            if cursor._scope is not UNSET:
+                result = cursor._scope
+                break
+            path.append(cursor)
+            parent = cursor.parent_cursor
+            if parent is None or getattr(parent.node, "frame_slots", None) is not None:
+                result = parent
+                break
+            cursor = parent
+        for cursor in path:
+            cursor._scope = result
+        return result  # type: ignore[return-value]
+
+
+class ParentIndex:
+    """
+    Índice com a posição de cada nó da árvore dentro do seu pai.
+
+    As posições são guardadas em uma tabela indexada por `id(nó)`, junto com
+    uma referência ao próprio nó (o que impede que o id seja reutilizado).
+    Cada consulta confere se o pai ainda guarda o nó na posição registrada,
+    de modo que modificações feitas sem o índice nunca produzem respostas
+    erradas: nesse caso a consulta falha e os métodos de `Node` voltam a
+    procurar o nó na árvore. Substituições feitas com `replace` (ou
+    `Node.replace_child` com o índice) mantêm o índice atualizado.
+    """
+
+    __slots__ = ("root", "positions")
+
+    def __init__(self, root: Node):
+        self.root = root
+        self.positions: dict[int, tuple[Node, Node, str, Optional[int]]] = {}
+        self.update(root)
+
+    def update(self, node: Node) -> None:
+        """
+        Registra as posições dos descendentes de `node`.
+
+        Subárvores cujas posições já estão registradas corretamente não são
+        percorridas novamente, portanto o custo é proporcional ao número de
+        nós novos ou que mudaram de lugar.
+        """
+        positions = self.positions
+        pending = [node]
+        while pending:
+            parent = pending.pop()
+            for name, i, child in child_positions(parent):
+                entry = positions.get(id(child))
+                if entry is None or entry[0] is not child or entry[1] is not parent or entry[2:] != (name, i):
+                    positions[id(child)] = (child, parent, name, i)
+                    pending.append(child)
+
+    def position(self, node: Node) -> Optional[tuple[Node, str, Optional[int]]]:
+        """
+        Retorna uma tripla (pai, campo, posição na lista) ou None se o nó não
+        está registrado ou mudou de lugar.
+        """
+        entry = self.positions.get(id(node))
+        if entry is None or entry[0] is not node:
+            return None
+        _, parent, name, i = entry
+        value = getattr(parent, name, None)
+        if i is not None:
+            if not isinstance(value, (list, tuple)) or i >= len(value):
+                return None
+            value = value[i]
+        return (parent, name, i) if value is node else None
+
+    def parent(self, node: Node) -> Optional[Node]:
+        """
+        Retorna o pai do nó ou None.
+        """
+        position = self.position(node)
+        return None if position is None else position[0]
+
+    def cursor(self, node: Node, start: Optional["Cursor"] = None) -> Optional["Cursor[Node]"]:
+        """
+        Constrói um cursor para o nó, a partir do cursor `start` (que deve
+        apontar para um ancestral) ou da raiz do índice.
+
+        Retorna None se o nó não descende do ancestral.
+        """
+        path = []
+        current = node
+        while True:
+            if start is not None and current is start.node:
+                cursor = start
+                break
+            if start is None and current is self.root:
+                cursor = Cursor(current)
+                break
+            if (parent := self.parent(current)) is None:
+                return None
+            path.append(current)
+            current = parent
+        for child in reversed(path):
+            cursor = Cursor(child, cursor)
+        return cursor
+
+    def replace(self, old: Node, new: Node) -> bool:
+        """
+        Substitui `old` por `new` no pai de `old` e atualiza o índice.
+
+        Retorna False (sem modificar a árvore) se a posição de `old` não é
+        conhecida ou se ele está em uma tupla.
+        """
+        position = self.position(old)
+        if position is None:
+            return False
+        parent, name, i = position
+        if i is None:
+            setattr(parent, name, new)
+        else:
+            value = getattr(parent, name)
+            if isinstance(value, tuple):
+                return False
+            value[i] = new
+        self.discard(old)
+        self.positions[id(new)] = (new, parent, name, i)
+        self.update(new)
+        return True
+
+    def discard(self, node: Node) -> None:
+        """
+        Remove do índice as posições de `node` e de seus descendentes.
+
+        Posições que foram atualizadas depois que o nó mudou de lugar (ex.:
+        um descendente reaproveitado em outra parte da árvore) são mantidas.
+        """
+        positions = self.positions
+        entry = positions.get(id(node))
+        if entry is not None and entry[0] is node:
+            del positions[id(node)]
+        pending = [node]
+        while pending:
+            parent = pending.pop()
+            for _, _, child in child_positions(parent):
+                entry = positions.get(id(child))
+                if entry is not None and entry[0] is child and entry[1] is parent:
+                    del positions[id(child)]
+                    pending.append(child)
+
+
+def child_positions(node: Node) -> Iterator[tuple[str, Optional[int], Node]]:
+    """
+    Itera sobre os filhos do nó junto com o campo e a posição na lista (ou
+    None, se o campo guarda o filho diretamente).
+    """
+    for name, _ in node_fields(type(node)).children:
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            yield name, None, value
+        elif isinstance(value, (list, tuple)):
+            for i, item in enumerate(value):
+                if isinstance(item, Node):
+                    yield name, i, item
+
+
+class NodeFields(NamedTuple):
+    """
+    Campos de uma classe de nós.
+
+    `names` contém todos os campos que fazem parte da árvore, na ordem de
+    declaração, e `children` os campos que podem conter nós, junto com um
+    indicador de que o campo foi declarado como uma lista. Campos escalares
+    (strings, números, funções, etc.) não aparecem em `children`, nem em
+    `child_names`, que contém apenas os nomes.
+    """
+
+    names: tuple[str, ...]
+    children: tuple[tuple[str, bool], ...]
+    child_names: tuple[str, ...]
+
+
+# Tipos cujos valores nunca são nós.
+SCALAR_TYPES = (str, bool, int, float, NoneType)
+
+
+@cache
+def node_fields(cls: type) -> NodeFields:
+    """
+    Calcula os campos da classe de nós uma única vez.
+
+    Em dataclasses, campos com `init=False` guardam anotações das etapas de
+    análise (ex.: a posição de variáveis resolvidas) e não fazem parte da
+    árvore.
+    """
+    if dataclasses.is_dataclass(cls):
+        types = {f.name: f.type for f in dataclasses.fields(cls) if f.init}
+    else:
+        types = dict(getattr(cls, "__annotations__", {}))
+    children = tuple((name, is_list_type(tp)) for name, tp in types.items() if not is_scalar_type(tp))
+    return NodeFields(tuple(types), children, tuple(name for name, _ in children))
+
+
+def is_scalar_type(tp: Any) -> bool:
+    if tp in SCALAR_TYPES or get_origin(tp) is collections.abc.Callable:
+        return True
+    args = get_args(tp)
+    return get_origin(tp) is not None and bool(args) and not is_list_type(tp) and all(map(is_scalar_type, args))
+
+
+def is_list_type(tp: Any) -> bool:
+    return tp in (list, tuple) or get_origin(tp) in (list, tuple)
+
 
 @singledispatch
 def pretty(obj: Any) -> str:
@@ -494,14 +817,59 @@ def _(obj) -> str:
 def visit_once(obj: Node, visitors: dict[type[Node], Callable[[N], Any]]) -> None:
     """
     Visita um nó e executa a primeira função consistente com o tipo do objecto.
+
+    Para visitas repetidas com o mesmo dicionário, use `Dispatcher`, que
+    guarda a escolha feita para cada tipo.
     """
-    for subtype in type(obj).mro():
-        try:
-            visitor = visitors[subtype]
+    for subtype in type(obj).__mro__:
+        if (visitor := visitors.get(subtype)) is not None:
             visitor(obj)  # type: ignore
-            break
+            return
+
+
+class Dispatcher:
+    """
+    Escolhe a função de `visitors` correspondente a cada objeto visitado.
+
+    A função é o valor associado ao primeiro tipo da MRO do objeto presente
+    no dicionário. A escolha é feita uma única vez para cada tipo concreto e
+    guardada em `entries`, junto com os campos que devem ser percorridos em
+    nós desse tipo. Se todos os tipos do dicionário são subclasses de `Node`,
+    nenhuma função pode corresponder a valores escalares e os campos
+    escalares não são percorridos.
+    """
+
+    __slots__ = ("visitors", "entries", "visit_scalars")
+
+    def __init__(self, visitors: dict[type[Node], Callable[[N], Any]]):
+        self.visitors = visitors
+        self.entries: dict[type, tuple[Optional[Callable[[Any], Any]], Optional[tuple[str, ...]]]] = {}
+        self.visit_scalars = not all(issubclass(tp, Node) for tp in visitors)
+
+    def __call__(self, obj: Any) -> None:
+        if (handler := self.handler(type(obj))) is not None:
+            handler(obj)
+
+    def handler(self, cls: type) -> Optional[Callable[[Any], Any]]:
+        return self.entry(cls)[0]
+
+    def entry(self, cls: type) -> tuple[Optional[Callable[[Any], Any]], Optional[tuple[str, ...]]]:
+        """
+        Retorna a função correspondente ao tipo e os nomes dos campos a
+        percorrer, ou None no lugar dos campos se o tipo não é um nó.
+        """
+        try:
+            return self.entries[cls]
         except KeyError:
-            continue
+            pass
+        visitors = self.visitors
+        handler = next((visitors[tp] for tp in cls.__mro__ if tp in visitors), None)
+        names = None
+        if issubclass(cls, Node):
+            fields = node_fields(cls)
+            names = fields.names if self.visit_scalars else fields.child_names
+        entry = self.entries[cls] = (handler, names)
+        return entry
 
 
 def can_print_as_leaf(node: Node) -> bool:
@@ -512,7 +880,7 @@ def can_print_as_leaf(node: Node) -> bool:
     """
     while node:
         args = []
-        for attr in node.__annotations__:
+        for attr in node_fields(type(node)).names:
             obj = getattr(node, attr)
             if isinstance(obj, (list, tuple)) and obj:
                 return False
@@ -0,0 +1,172 @@
+"""
+Otimizações opcionais da árvore sintática.
+
+As otimizações são aplicadas depois da remoção de açúcar sintático e da
+resolução de nomes e são habilitadas pelo nível de otimização (opção `-O` da
+linha de comando):
+
+    0: nenhuma otimização;
+    1: move expressões invariantes para fora dos laços;
+    2: também substitui multiplicações pelo contador de laços de contagem
+       por somas (redução de força).
+
+Expressões invariantes não são calculadas antes do laço, mas na primeira vez
+em que são usadas em cada execução do laço (ver `InvariantScope`). Assim, um
+laço que não executa nenhuma iteração também não avalia as expressões, e os
+erros de execução acontecem nos mesmos pontos do programa original.
+"""
+
+from dataclasses import dataclass, field
+
+from . import runtime as op
+from .ast import *
+from .node import Node, node_fields
+
+# Operações sem efeitos colaterais que podem ser movidas para fora de laços.
+PURE_OPS = {op.add, op.sub, op.mul, op.truediv, op.eq, op.ne, op.lt, op.le, op.gt, op.ge}
+
+
+def optimize(tree: Node, level: int = 1) -> Node:
+    """
+    Otimiza a árvore sintática de acordo com o nível de otimização.
+
+    A árvore é modificada e retornada. O nó raiz muda apenas se ele próprio
+    for um laço.
+    """
+    if level >= 1:
+        tree = hoist_invariants(tree, nonlocal_writes(tree), reduce=level >= 2)
+    return tree
+
+
+def nonlocal_writes(tree: Node) -> set[str]:
+    """
+    Nomes de variáveis globais ou declaradas em outras funções que são
+    modificados por atribuições na árvore.
+
+    A profundidade anotada pelo resolvedor conta os escopos de blocos e laços
+    (ver `Cursor.resolve`). Por isso, a travessia acompanha quantos escopos
+    separam cada nó do escopo da função que o contém.
+    """
+    names = set()
+    # Pares (nó, escopos da função atual que envolvem o nó) ou None fora de
+    # funções.
+    pending: list[tuple[Node, int | None]] = [(tree, None)]
+    while pending:
+        node, frames = pending.pop()
+        if isinstance(node, Assign) and (node.slot is None or frames is None or node.depth >= frames):
+            names.add(node.name)
+        if isinstance(node, Function):
+            frames = 1
+        elif frames is not None and getattr(node, "frame_slots", None) is not None:
+            frames += 1
+        pending.extend((child, frames) for child in node.children())
+    return names
+
+
+def hoist_invariants(node: Node, nonlocal_writes: set[str], reduce: bool) -> Node:
+    """
+    Otimiza os laços do nó e de seus descendentes, retornando o nó que deve
+    substituí-lo.
+    """
+    if isinstance(node, (For, While)):
+        node = LoopOptimizer(node, nonlocal_writes).optimize(reduce)
+        loop = node.loop if isinstance(node, InvariantScope) else node
+        map_children(loop, lambda child: hoist_invariants(child, nonlocal_writes, reduce))
+        return node
+    map_children(node, lambda child: hoist_invariants(child, nonlocal_writes, reduce))
+    return node
+
+
+@dataclass
+class LoopOptimizer:
+    """
+    Analisa um laço e substitui suas expressões invariantes.
+    """
+
+    loop: For | While
+    nonlocal_writes: set[str]
+    written: set[str] = field(default_factory=set)
+    written_attrs: set[str] = field(default_factory=set)
+    has_calls: bool = False
+
+    def __post_init__(self):
+        for node in self.loop.descendants():
+            if isinstance(node, (Assign, VarDef, Function)):
+                self.written.add(node.name)
+            elif isinstance(node, Setattr):
+                self.written_attrs.add(node.attr)
+            elif isinstance(node, (Call, Invoke)):
+                self.has_calls = True
+        self.scope = InvariantScope(self.loop)
+
+    def optimize(self, reduce: bool) -> Node:
+        """
+        Retorna o laço otimizado, envolvido em um `InvariantScope` se alguma
+        expressão foi substituída.
+        """
+        # O inicializador de laços `for` é executado uma única vez.
+        init = getattr(self.loop, "initializer", None)
+        map_children(self.loop, lambda child: child if child is init else self.hoist(child))
+        if reduce and isinstance(self.loop, CountedFor):
+            map_children(self.loop.body, self.reduce)
+        if self.scope.size == 0:
+            return self.loop
+        return self.scope
+
+    def hoist(self, node: Node) -> Node:
+        if isinstance(node, Function):
+            return node
+        if isinstance(node, (BinOp, Getattr)) and self.is_invariant(node):
+            invariant = Invariant(node)
+            invariant.scope, invariant.index = self.scope, self.scope.allocate()
+            return invariant
+        map_children(node, self.hoist)
+        return node
+
+    def reduce(self, node: Node) -> Node:
+        if isinstance(node, Function):
+            return node
+        if isinstance(node, BinOp) and node.op is op.mul:
+            counter = self.loop.initializer.name  # type: ignore[union-attr]
+            for counter_left, this, other in [(True, node.left, node.right), (False, node.right, node.left)]:
+                if isinstance(this, Var) and this.name == counter and self.is_invariant(other):
+                    product = InductionProduct(node)
+                    product.scope, product.index = self.scope, self.scope.allocate()
+                    product.counter_left = counter_left
+                    return product
+        map_children(node, self.reduce)
+        return node
+
+    def is_invariant(self, node: Node) -> bool:
+        """
+        Verifica se a expressão produz o mesmo valor em todas as iterações e
+        não possui efeitos colaterais.
+        """
+        if isinstance(node, (Literal, Invariant)):
+            return True
+        if isinstance(node, Var):
+            if node.name in self.written:
+                return False
+            # Funções chamadas no laço podem modificar variáveis globais ou
+            # capturadas por closures, mas não as variáveis locais resolvidas.
+            return not self.has_calls or (node.slot is not None and node.name not in self.nonlocal_writes)
+        if isinstance(node, BinOp):
+            return node.op in PURE_OPS and self.is_invariant(node.left) and self.is_invariant(node.right)
+        if isinstance(node, Getattr):
+            return not self.has_calls and node.attr not in self.written_attrs and self.is_invariant(node.obj)
+        return False
+
+
+def map_children(node: Node, func) -> None:
+    """
+    Substitui cada filho do nó pelo resultado de `func(filho)`.
+    """
+    for name, _ in node_fields(type(node)).children:
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            if (new := func(value)) is not value:
+                setattr(node, name, new)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, Node) and (new := func(item)) is not item:
+                    value[i] = new
@@ -5,32 +5,45 @@ Define a gramática da Linguagem e funções para realizar a análise sintática
 análise léxica, etc.
 """
 
+from functools import cache
 from pathlib import Path
 from typing import Iterator
 
 from lark import Lark, Token, Tree
 
 from .ast import Expr, Node, Program
+from .cache import load_tree, make_parser
+from .passes import run_passes
 from .transformer import LoxTransformer
 
 DIR = Path(__file__).parent
 GRAMMAR_PATH = DIR / "grammar.lark"
 
+# As tabelas LALR são calculadas uma única vez e salvas em disco. Os parsers
+# de AST e de CST compartilham as mesmas tabelas e diferem apenas no
+# transformer.
+GRAMMAR_OPTIONS = {"parser": "lalr", "start": ["start", "expr"]}
+ast_parser = make_parser(GRAMMAR_PATH, transformer=LoxTransformer(), **GRAMMAR_OPTIONS)
 
-ast_parser = Lark(
-    GRAMMAR_PATH.open(),
-    transformer=LoxTransformer(),
-    parser="lalr",
-    start=["start", "expr"],
-)
-cst_parser = Lark(
-    GRAMMAR_PATH.open(),
-    parser="lalr",
-    start=["start", "expr"],
-)
+
+@cache
+def get_cst_parser() -> Lark:
+    """
+    Retorna o parser que produz árvores Lark.
+
+    O parser é criado sob demanda, já que só é necessário para depuração e
+    para os testes que inspecionam a árvore concreta.
+    """
+    return make_parser(GRAMMAR_PATH, **GRAMMAR_OPTIONS)
 
 
-def parse(src: str) -> Program:
+def __getattr__(name: str):
+    if name == "cst_parser":
+        return get_cst_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def parse(src: str, cache: bool = False) -> Program:
     """
     Função que recebe um código fonte e retorna a árvore sintática.
 
@@ -41,15 +54,20 @@ def parse(src: str) -> Program:
     Args:
         src (str):
             Código fonte a ser analisado.
+        cache (bool):
+            Se True, reutiliza a árvore armazenada no cache em disco, caso
+            exista, ou armazena o resultado para execuções futuras.
     """
+    if cache:
+        return load_tree(src, "start", lambda: parse(src))
+
     tree = ast_parser.parse(src, start="start")
     assert isinstance(tree, Program), f"Esperava um Program, mas recebi {tree}"
-    tree.validate_tree()
-    tree.desugar_tree()
+    run_passes(tree)
     return tree
 
 
-def parse_expr(src: str) -> Expr:
+def parse_expr(src: str, cache: bool = False) -> Expr:
     """
     Função que recebe um código fonte e retorna a árvore sintática
     representando uma expressão.
@@ -62,6 +80,8 @@ def parse_expr(src: str) -> Expr:
     Args:
         src (str):
             Código fonte a ser analisado.
+        cache (bool):
+            Se True, usa o cache em disco de árvores sintáticas.
 
     Examples:
         >>> parse_expr("1 + 2")
@@ -70,10 +90,12 @@ def parse_expr(src: str) -> Expr:
         >>> parse_expr("1 + 2 * 3").eval(Ctx())
         7
     """
+    if cache:
+        return load_tree(src, "expr", lambda: parse_expr(src))
+
     tree = ast_parser.parse(src, start="expr")
     assert isinstance(tree, Node), f"Esperava uma Expr, mas recebi {tree}"
-    tree.validate_tree()
-    tree.desugar_tree()
+    run_passes(tree)
     return tree
 
 
@@ -92,7 +114,7 @@ def parse_cst(src: str, expr: bool = False) -> Tree:
             Se True, analisa o código como se fosse apenas uma expressão.
     """
     start = "expr" if expr else "start"
-    return cst_parser.parse(src, start=start)
+    return get_cst_parser().parse(src, start=start)
 
 
 def lex(src: str) -> Iterator[Token]:
@@ -0,0 +1,114 @@
+"""
+Gerenciador das etapas de análise da árvore sintática.
+
+Depois da análise sintática, a árvore passa pelas etapas de validação
+(`validate_self`), remoção de açúcar sintático (`desugar_self`) e resolução
+de nomes (`resolve_self`). Em vez de percorrer a árvore uma vez para cada
+etapa, `run_passes` executa todas as etapas pendentes em uma única travessia:
+cada nó, em pré-ordem, passa por todas as etapas antes que seus filhos sejam
+visitados.
+
+A fusão é equivalente a executar as etapas uma após a outra desde que cada
+método `*_self` modifique apenas o próprio nó (ex.: trocando sua classe) ou
+seus filhos, que ainda não foram visitados. Os filhos são obtidos somente
+depois que o nó passou por todas as etapas.
+
+Um método que retorna um novo nó substitui o nó atual no pai. A mesma etapa
+e as seguintes são então aplicadas ao novo nó. As substituições usam um índice de pais
+(`ParentIndex`), criado na primeira substituição, de modo que etapas que
+substituem muitos nós não precisam procurá-los nos campos dos pais.
+
+As etapas já aplicadas a um `Program` são registradas em `Program.passes`,
+de modo que chamar `validate_tree` (ex.: em `lox.eval`) em uma árvore
+produzida por `lox.parse` não a valida novamente. Árvores carregadas do cache
+em disco preservam esse registro.
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from .node import Cursor, Node, ParentIndex
+
+
+@dataclass(frozen=True)
+class Pass:
+    """
+    Etapa de análise executada em cada nó da árvore.
+    """
+
+    name: str
+    method: str
+    uses_cursor: bool
+
+
+PASSES = {
+    "validate": Pass("validate", "validate_self", uses_cursor=True),
+    "desugar": Pass("desugar", "desugar_self", uses_cursor=False),
+    "resolve": Pass("resolve", "resolve_self", uses_cursor=True),
+}
+
+# Etapas aplicadas por `lox.parse`, na ordem de execução.
+PIPELINE = ("validate", "desugar", "resolve")
+
+
+def run_passes(tree: Node, names: Iterable[str] = PIPELINE, force: bool = False) -> list[str]:
+    """
+    Executa as etapas indicadas que ainda não foram aplicadas à árvore e
+    retorna os nomes das etapas executadas.
+
+    Se `force` for True, executa as etapas mesmo que já tenham sido
+    registradas.
+    """
+    done: set[str] | None = getattr(tree, "passes", None)
+    passes = [PASSES[name] for name in names if force or done is None or name not in done]
+    if passes:
+        traverse(tree, passes)
+        if done is not None:
+            done.update(p.name for p in passes)
+    return [p.name for p in passes]
+
+
+def traverse(tree: Node, passes: list[Pass]) -> None:
+    """
+    Aplica as etapas a todos os nós da árvore em uma única travessia.
+    """
+    methods = [(p.method, p.uses_cursor) for p in passes]
+    index: Optional[ParentIndex] = None
+
+    def replace(node: Node, new: Node) -> None:
+        # O índice é criado na primeira substituição e reconstruído se o nó
+        # mudou de lugar sem passar por ele.
+        nonlocal index
+        if node is tree:
+            raise ValueError("A raiz da árvore não pode ser substituída.")
+        if index is None or index.position(node) is None:
+            index = ParentIndex(tree)
+        if not index.replace(node, new):
+            raise ValueError(f"Não foi possível substituir o nó {type(node).__name__}.")
+
+    if not any(p.uses_cursor for p in passes):
+        pending: list[Node] = [tree]
+        while pending:
+            node = pending.pop()
+            for method, _ in methods:
+                while (new := getattr(node, method)()) is not None and new is not node:
+                    replace(node, new)
+                    node = new
+            pending.extend(reversed(list(node.children())))
+        return
+
+    cursors: list[Cursor[Node]] = [Cursor(tree)]
+    while cursors:
+        cursor = cursors.pop()
+        node = cursor.node
+        # O método é obtido a cada etapa, já que `desugar_self` pode trocar a
+        # classe do nó.
+        for method, uses_cursor in methods:
+            while True:
+                new = getattr(node, method)(cursor) if uses_cursor else getattr(node, method)()
+                if new is None or new is node:
+                    break
+                replace(node, new)
+                node = new
+                cursor = Cursor(new, cursor.parent_cursor)
+        cursors.extend(reversed([Cursor(child, cursor) for child in node.children()]))
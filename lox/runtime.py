@@ -1,9 +1,12 @@
 import builtins
+import sys
+import weakref
 from dataclasses import dataclass, field
+from functools import cache
 from types import BuiltinFunctionType, FunctionType
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Callable, Optional
 
-from .ctx import Ctx
+from .ctx import UNDEFINED, Ctx, Frame
 
 if TYPE_CHECKING:
     from .ast import Stmt, Value
@@ -24,9 +27,9 @@ def is_integer_var(name: str) -> bool:
 
 def to_integer(value: "Value") -> int:
     """Converte um valor para inteiro seguindo as regras do Lox"""
-    if isinstance(value, str):
+    if isinstance(value, (str, Rope)):
         try:
-            return int(float(value))
+            return int(float(str(value)))
         except (ValueError, TypeError):
             return 0
     elif isinstance(value, (int, float)):
@@ -34,22 +37,101 @@ def to_integer(value: "Value") -> int:
     return 0
 
 
+def coerce_integer(value: "Value") -> "Value":
+    """
+    Converte o valor atribuído a uma variável inteira.
+
+    Números e strings numéricas são truncados, strings inválidas viram 0 e
+    os demais valores (nil, objetos, funções) são preservados.
+    """
+    if isinstance(value, (str, Rope)):
+        try:
+            return int(float(str(value)))
+        except (ValueError, TypeError):
+            return 0
+    elif isinstance(value, (float, int)):
+        return int(value)
+    return value
+
+
+def keep_value(value: "Value") -> "Value":
+    """Coerção usada por variáveis que não seguem a regra dos inteiros"""
+    return value
+
+
+@cache
+def coercion(name: str) -> Callable[["Value"], "Value"]:
+    """
+    Retorna a coerção aplicada aos valores atribuídos à variável ou atributo
+    com o nome dado. A decisão é tomada uma única vez para cada nome.
+    """
+    return coerce_integer if is_integer_var(name) else keep_value
+
+
 def coerce_value(name: str, value: "Value") -> "Value":
     """Aplica coerção para inteiro se o nome da variável indicar"""
-    if is_integer_var(name):
-        return to_integer(value)
-    return value
+    return coercion(name)(value)
+
+
+class Shape:
+    """
+    Forma (hidden class) compartilhada por instâncias com os mesmos campos,
+    criados na mesma ordem.
+
+    A forma associa cada campo à sua posição na lista de valores da
+    instância e guarda a coerção aplicada aos valores do campo. Adicionar um
+    campo a uma instância troca a sua forma pela forma seguinte, registrada
+    na tabela de transições, de modo que objetos construídos da mesma
+    maneira terminam com a mesma forma.
+    """
+
+    __slots__ = ("fields", "coercions", "transitions")
+
+    def __init__(self, fields: Optional[dict[str, int]] = None, coercions: tuple = ()):
+        self.fields: dict[str, int] = {} if fields is None else fields
+        self.coercions: tuple[Callable[["Value"], "Value"], ...] = coercions
+        self.transitions: dict[str, Shape] = {}
+
+    def __repr__(self):
+        return f"Shape({', '.join(self.fields)})"
+
+    def add(self, name: str) -> "Shape":
+        """
+        Retorna a forma obtida ao adicionar o campo `name`.
+        """
+        shape = self.transitions.get(name)
+        if shape is None:
+            fields = {**self.fields, name: len(self.fields)}
+            shape = Shape(fields, (*self.coercions, coercion(name)))
+            self.transitions[name] = shape
+        return shape
 
 
 @dataclass(frozen=True)
 class LoxClass:
     """
     Classe base para todos os tipos de classe Lox.
+
+    Os métodos próprios e herdados são reunidos em uma única tabela
+    (`vtable`) na criação da classe, de modo que buscar um método consulta
+    apenas um dicionário. Métodos devem ser adicionados com `define_method`,
+    que reconstrói as tabelas da classe e de suas subclasses.
     """
 
     name: str
     methods: dict[str, "LoxFunction"]
     base: Optional["LoxClass"] = None
+    shape: Shape = field(default_factory=Shape, compare=False, repr=False)
+    vtable: dict[str, "LoxFunction"] = field(init=False, compare=False, repr=False)
+    initializer: Optional["LoxFunction"] = field(init=False, compare=False, repr=False)
+    arity: int = field(init=False, compare=False, repr=False)
+    subclasses: list[weakref.ref] = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "subclasses", [])
+        if self.base is not None:
+            self.base.subclasses.append(weakref.ref(self))
+        self.build_vtable()
 
     def __repr__(self):
         return self.name
@@ -58,46 +140,91 @@ class LoxClass:
         return self.name
 
     def __call__(self, *args):
-        instance = LoxInstance(self)
-        try:
-            init = self.get_method("init")
-        except LoxError:
+        instance = new_instance(self)
+        init = self.initializer
+        if init is None:
             if args:
                 raise TypeError(f"Class {self} não aceita argumentos no construtor")
+        elif len(args) != self.arity:
+            raise TypeError(f"Expected {self.arity} arguments but got {len(args)}.")
+        elif type(init) is LoxFunction:
+            init.invoke(instance, args)
         else:
-            init = init.bind(instance)
-            init(*args)
+            init.bind(instance)(*args)
         return instance
 
     def get_method(self, name: str) -> "LoxFunction":
         """
         Retorna um método da classe ou superclasse.
         """
-        try:
-            return self.methods[name]
-        except KeyError:
-            if self.base is None:
-                raise LoxError(f"Method '{name}' not found in class '{self.name}'")
-            return self.base.get_method(name)
+        method = self.vtable.get(name)
+        if method is None:
+            raise LoxError(f"Method '{name}' not found in class '{self.name}'")
+        return method
+
+    def define_method(self, name: str, method: "LoxFunction") -> None:
+        """
+        Adiciona ou substitui um método da classe.
+        """
+        self.methods[name] = method
+        self.build_vtable()
+
+    def build_vtable(self) -> None:
+        """
+        Reconstrói a tabela de métodos da classe e das subclasses, junto com
+        o inicializador usado pelo construtor.
+
+        Cada reconstrução cria um novo dicionário, o que também invalida os
+        inline caches que guardaram a tabela anterior.
+        """
+        inherited = {} if self.base is None else self.base.vtable
+        vtable = {**inherited, **self.methods}
+        init = vtable.get("init")
+        object.__setattr__(self, "vtable", vtable)
+        object.__setattr__(self, "initializer", init)
+        object.__setattr__(self, "arity", 0 if init is None else len(init.args))
+
+        alive = []
+        for ref in self.subclasses:
+            if (subclass := ref()) is not None:
+                subclass.build_vtable()
+                alive.append(ref)
+        self.subclasses[:] = alive
 
 
-@dataclass
 class LoxInstance:
     """
     Classe base para todos os objetos Lox.
+
+    Os valores dos campos são armazenados em uma lista, nas posições
+    definidas pela forma (`Shape`) da instância. Todas as instâncias de uma
+    classe partem da forma vazia da própria classe.
     """
 
-    __lox_class: LoxClass = field()
+    __slots__ = ("__lox_class", "__shape", "__values")
+
+    def __init__(self, lox_class: LoxClass):
+        set_class(self, lox_class)
+        set_shape(self, lox_class.shape)
+        set_values(self, [])
 
     def __setattr__(self, name: str, value: "Value"):
-        if name.startswith('_'):
-            super().__setattr__(name, value)
+        shape = self.__shape
+        index = shape.fields.get(name)
+        if index is None:
+            shape = shape.add(name)
+            set_shape(self, shape)
+            self.__values.append(shape.coercions[-1](value))
         else:
             # Aplica coerção para inteiro se necessário
-            coerced_value = coerce_value(name, value)
-            self.__dict__[name] = coerced_value
+            self.__values[index] = shape.coercions[index](value)
 
     def __getattr__(self, name: str) -> "Value":
+        # Chamado somente por código Python: o interpretador lê os campos
+        # pelo `InlineCache`. Cordas são entregues como strings.
+        index = self.__shape.fields.get(name)
+        if index is not None:
+            return flatten(self.__values[index])
         method = self.__lox_class.get_method(name)
         return method.bind(self)
 
@@ -113,6 +240,24 @@ class LoxInstance:
         return self
 
 
+# Descritores das posições de LoxInstance, usados para escrever nelas sem
+# passar pelo __setattr__ que armazena campos Lox.
+set_class = LoxInstance._LoxInstance__lox_class.__set__  # type: ignore[attr-defined]
+set_shape = LoxInstance._LoxInstance__shape.__set__  # type: ignore[attr-defined]
+set_values = LoxInstance._LoxInstance__values.__set__  # type: ignore[attr-defined]
+
+
+def new_instance(lox_class: LoxClass) -> LoxInstance:
+    """
+    Cria uma instância sem campos, sem chamar o inicializador.
+    """
+    instance = object.__new__(LoxInstance)
+    set_class(instance, lox_class)
+    set_shape(instance, lox_class.shape)
+    set_values(instance, [])
+    return instance
+
+
 @dataclass(frozen=True)
 class LoxFunction:
     """
@@ -123,15 +268,25 @@ class LoxFunction:
     args: list[str]
     body: list["Stmt"]
     ctx: Ctx
+    slots: Optional[dict[str, int]] = None
 
-    def __call__(self, *args):
-        env = dict(zip(self.args, args, strict=True))
-        env = self.ctx.push(env)
-        try:
-            for stmt in self.body:
-                stmt.eval(env)
-        except LoxReturn as e:
-            return e.value
+    def __call__(self, *args, tail_call: bool = False):
+        result = self.call_in(self.ctx, args)
+        if tail_call or type(result) is not TailCall:
+            return result
+        return trampoline(result)
+
+    def call_in(self, ctx: Ctx, args: tuple):
+        """
+        Executa a função com os argumentos fornecidos, usando `ctx` como
+        escopo envolvente.
+        """
+        if self.slots is None:
+            env = dict(zip(self.args, args, strict=True))
+            env = ctx.push(env)
+        else:
+            env = Frame(self.slots, frame_values(self, args), ctx)
+        return run_body(self.body, env)
 
     def __str__(self):
         return f"<fn {self.name}>"
@@ -148,8 +303,15 @@ class LoxFunction:
             self.args,
             self.body,
             self.ctx.push({"this": instance}),
+            self.slots,
         )
 
+    def invoke(self, instance: LoxInstance, args: tuple):
+        """
+        Chama a função como método da instância sem criar o método vinculado.
+        """
+        return trampoline(self.call_in(self.ctx.push({"this": instance}), args))
+
 
 @dataclass(frozen=True)
 class LoxCommand:
@@ -161,17 +323,19 @@ class LoxCommand:
     args: list[str]
     body: list["Stmt"]
     ctx: Ctx
+    slots: Optional[dict[str, int]] = None
 
     def __call__(self, ctx, *args):
-        env = dict(zip(self.args, args, strict=True))
-        env["!"] = ctx
-        env = self.ctx.push(env)
+        if self.slots is None:
+            env = dict(zip(self.args, args, strict=True))
+            env["!"] = ctx
+            env = self.ctx.push(env)
+        else:
+            values = frame_values(self, args)
+            values[self.slots["!"]] = ctx
+            env = Frame(self.slots, values, self.ctx)
 
-        try:
-            for stmt in self.body:
-                stmt.eval(env)
-        except LoxReturn as e:
-            return e.value
+        return trampoline(run_body(self.body, env))
 
     def __str__(self):
         return f"<fn {self.name}>"
@@ -188,17 +352,186 @@ class LoxCommand:
             self.args,
             self.body,
             self.ctx.push({"this": instance}),
+            self.slots,
         )
 
 
-class LoxReturn(Exception):
+def class_of(instance: LoxInstance) -> LoxClass:
+    """
+    Retorna a classe Lox de uma instância.
+    """
+    return instance._LoxInstance__lox_class  # type: ignore[attr-defined]
+
+
+class InlineCache:
+    """
+    Cache dos métodos encontrados em um ponto do programa que acessa o
+    atributo `name` de objetos (ver `Getattr` e `Invoke`).
+
+    Campos são lidos na posição registrada para a última forma (`Shape`)
+    observada. Métodos são guardados junto com a tabela de métodos
+    (`vtable`) da classe de onde vieram; redefinir um método substitui a
+    tabela e invalida as entradas antigas. Enquanto o ponto de acesso vê uma
+    única classe (monomórfico) ou poucas classes (polimórfico), a tabela é
+    consultada somente na primeira vez. Depois de `LIMIT` classes diferentes,
+    o ponto de acesso é considerado megamórfico e novos métodos deixam de ser
+    armazenados.
+    """
+
+    __slots__ = ("name", "entries", "shape", "index")
+    LIMIT = 4
+
+    def __init__(self, name: str):
+        self.name = name
+        self.entries: list[tuple[dict, LoxFunction]] = []
+        self.shape: Optional[Shape] = None
+        self.index = 0
+
+    def __repr__(self):
+        return f"InlineCache({self.name!r}, {len(self.entries)} entries)"
+
+    def method(self, cls: LoxClass) -> "LoxFunction":
+        """
+        Retorna o método `name` da classe.
+        """
+        vtable = cls.vtable
+        for cached, method in self.entries:
+            if cached is vtable:
+                return method
+        method = cls.get_method(self.name)
+        if len(self.entries) < self.LIMIT:
+            self.entries.append((vtable, method))
+        return method
+
+    def field(self, obj: LoxInstance) -> Optional[int]:
+        """
+        Retorna a posição do campo `name` na instância ou None se a instância
+        não possui esse campo.
+        """
+        shape = obj._LoxInstance__shape  # type: ignore[attr-defined]
+        if shape is self.shape:
+            return self.index
+        index = shape.fields.get(self.name)
+        if index is not None:
+            self.shape, self.index = shape, index
+        return index
+
+    def get(self, obj: "Value") -> "Value":
+        """
+        Lê o atributo do objeto. Campos têm prioridade sobre métodos.
+        """
+        if type(obj) is not LoxInstance:
+            return getattr(obj, self.name)
+        if obj._LoxInstance__shape is self.shape:  # type: ignore[attr-defined]
+            return obj._LoxInstance__values[self.index]  # type: ignore[attr-defined]
+        if (index := self.field(obj)) is not None:
+            return obj._LoxInstance__values[index]  # type: ignore[attr-defined]
+        return self.method(class_of(obj)).bind(obj)
+
+    def invoke(self, obj: "Value", args: tuple) -> "Value":
+        """
+        Chama o método do objeto com os argumentos fornecidos.
+
+        Objetos que não são instâncias Lox pertencem ao código Python e
+        recebem cordas convertidas em strings, como em `set_attribute`.
+        """
+        if type(obj) is not LoxInstance:
+            return getattr(obj, self.name)(*[flatten(arg) for arg in args])
+        if (index := self.field(obj)) is not None:
+            return obj._LoxInstance__values[index](*args)  # type: ignore[attr-defined]
+        method = self.method(class_of(obj))
+        if type(method) is LoxFunction:
+            return method.invoke(obj, args)
+        return method.bind(obj)(*args)
+
+
+def run_body(body: list["Stmt"], env: Ctx) -> "Value":
     """
-    Exceção para retornar de uma função Lox.
+    Executa o corpo de uma função e retorna o valor do primeiro `return`
+    executado ou None.
     """
+    for stmt in body:
+        if type(result := stmt.eval(env)) is ReturnValue:
+            return result.value
+    return None
+
 
-    def __init__(self, value):
+def frame_values(function: LoxFunction | LoxCommand, args: tuple) -> list:
+    """
+    Cria a lista de valores do `Frame` de uma chamada de função.
+
+    Os argumentos ocupam as primeiras posições e as demais variáveis começam
+    indefinidas.
+    """
+    if len(args) != len(function.args):
+        n = len(function.args)
+        raise TypeError(f"Expected {n} arguments but got {len(args)}.")
+    values = [*args]
+    values += [UNDEFINED] * (len(function.slots) - len(args))  # type: ignore[arg-type]
+    return values
+
+
+class ReturnValue:
+    """
+    Sinal produzido pela avaliação de um comando `return`.
+
+    Comandos normalmente são avaliados para None (ou para o valor da
+    expressão, no caso de expressões usadas como comandos). Um comando
+    `return` produz uma instância desta classe, que é repassada por quem
+    executa sequências de comandos até chegar à função, que então retorna
+    `value`. Isso evita o custo de lançar e capturar exceções a cada retorno.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: "Value"):
         self.value = value
-        super().__init__()
+
+    def __repr__(self):
+        return f"ReturnValue({self.value!r})"
+
+
+class TailCall:
+    """
+    Chamada feita em posição de cauda (`return f(x);`) e ainda não executada.
+
+    A função que executou o `return` devolve este objeto a quem a chamou, e
+    o chamador executa a chamada em um laço (ver `trampoline`). Assim, uma
+    sequência de chamadas em posição de cauda usa uma quantidade constante
+    da pilha do Python.
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: "Value", args: tuple):
+        self.func = func
+        self.args = args
+
+    def __repr__(self):
+        return f"TailCall({self.func!r}, {self.args!r})"
+
+
+def accepts_tail_calls(func: "Value") -> bool:
+    """
+    Verifica se a função aceita o argumento `tail_call`, que a faz devolver
+    as chamadas em posição de cauda em vez de executá-las.
+    """
+    if type(func) is LoxFunction:
+        return True
+    return type(func) is FunctionType and "tail_call" in (func.__kwdefaults__ or ())
+
+
+def trampoline(result: "Value") -> "Value":
+    """
+    Executa chamadas em posição de cauda até obter um valor.
+    """
+    while type(result) is TailCall:
+        func, args = result.func, result.args
+        if accepts_tail_calls(func):
+            result = func(*args, tail_call=True)
+        else:
+            result = func(*args)
+    return result
 
 
 class LoxError(Exception):
@@ -237,11 +570,114 @@ def show_repr(value: "Value") -> str:
     """
     Mostra um valor lox, mas coloca aspas em strings.
     """
-    if isinstance(value, str):
+    if isinstance(value, (str, Rope)):
         return f'"{value}"'
     return show(value)
 
 
+class Rope:
+    """
+    String Lox produzida por concatenações sucessivas.
+
+    Concatenar strings do Python copia os dois operandos e laços como
+    `s = s + x;` levam tempo quadrático. Uma corda guarda as partes em uma
+    lista e só as junta quando o texto é necessário (ver `__str__`).
+
+    Cordas derivadas de uma mesma corda compartilham a lista de partes:
+    `count` indica quantas partes pertencem a esta corda. Acrescentar uma
+    parte à corda mais recente apenas estende a lista; as demais copiam as
+    suas partes antes de estendê-la.
+
+    Cordas são iguais às strings com o mesmo texto, mas não são instâncias
+    de `str`. Os mecanismos de execução as convertem com `flatten` antes de
+    passá-las para funções nativas.
+    """
+
+    __slots__ = ("parts", "count", "length", "text")
+
+    def __init__(self, parts: list[str], length: int):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+        self.text: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.text is None:
+            parts = self.parts
+            if len(parts) != self.count:
+                parts = parts[: self.count]
+            self.text = "".join(parts)
+        return self.text
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (str, Rope)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def concat(self, text: str) -> "Rope":
+        """
+        Cria a corda com o texto acrescentado ao final.
+        """
+        parts = self.parts
+        if len(parts) != self.count:
+            parts = parts[: self.count]
+        parts.append(text)
+        return Rope(parts, self.length + len(text))
+
+
+# Concatenações menores que este tamanho produzem strings comuns.
+ROPE_MIN_LENGTH = 256
+
+# Concatenações com até este tamanho são internadas, como os literais.
+INTERN_MAX_LENGTH = 64
+
+
+def concat(a: "str | Rope", b: "str | Rope") -> "str | Rope":
+    """
+    Concatena duas strings Lox.
+
+    Resultados curtos são internados, como os literais do código fonte, e
+    textos longos produzem uma corda.
+    """
+    if type(a) is Rope:
+        return a.concat(str(b))
+    if (size := len(a) + len(b)) <= INTERN_MAX_LENGTH:
+        return sys.intern(a + str(b))
+    if size < ROPE_MIN_LENGTH:
+        return a + str(b)
+    return Rope([a, str(b)], size)
+
+
+def flatten(value: "Value") -> "Value":
+    """
+    Converte cordas em strings do Python e preserva os demais valores.
+    """
+    if type(value) is Rope:
+        return str(value)
+    return value
+
+
+def set_attribute(obj: "Value", attr: str, value: "Value") -> None:
+    """
+    Modifica o atributo do objeto.
+
+    Objetos que não são instâncias Lox pertencem ao código Python e recebem
+    cordas convertidas em strings.
+    """
+    if type(obj) is not LoxInstance:
+        value = flatten(value)
+    setattr(obj, attr, value)
+
+
 def truthy(value: "Value") -> bool:
     """
     Converte valor lox para booleano segundo a semântica do lox.
@@ -252,71 +688,231 @@ def truthy(value: "Value") -> bool:
 
 
 def eq(a, b):
-    return type(a) is type(b) and a == b
+    if a is b:
+        # Caminho rápido para strings internadas e objetos idênticos. A
+        # comparação só é falsa para NaN.
+        return a == a
+    if type(a) is type(b):
+        return a == b
+    if type(a) is Rope or type(b) is Rope:
+        return isinstance(a, (str, Rope)) and isinstance(b, (str, Rope)) and str(a) == str(b)
+    return False
 
 
 def ne(a, b):
+    if a is b:
+        return a != a
     return not eq(a, b)
 
 
+# Comparações aceitam floats e inteiros (regra dos inteiros), mas não bool,
+# que é subclasse de int no Python.
 def lt(a, b):
-    if isinstance(a, float) and isinstance(b, float):
+    if type(a) is float and type(b) is float:
         return a < b
-    raise LoxError(f"Comparação entre {type(a).__name__} e {type(b).__name__}")
+    if type(a) in number and type(b) in number:
+        return a < b
+    raise comparison_error(a, b)
 
 
 def gt(a, b):
-    return lt(b, a)
+    if type(a) is float and type(b) is float:
+        return a > b
+    if type(a) in number and type(b) in number:
+        return a > b
+    raise comparison_error(a, b)
 
 
 def le(a, b):
-    return lt(a, b) or eq(a, b)
+    if type(a) is float and type(b) is float:
+        return a <= b
+    if type(a) in number and type(b) in number:
+        return a <= b
+    raise comparison_error(a, b)
 
 
 def ge(a, b):
-    return le(b, a)
+    if type(a) is float and type(b) is float:
+        return a >= b
+    if type(a) in number and type(b) in number:
+        return a >= b
+    raise comparison_error(a, b)
+
+
+def comparison_error(a, b) -> "LoxError":
+    return LoxError(f"Comparação entre {type(a).__name__} e {type(b).__name__}")
+
+
+# Operações que produzem booleanos. Pela regra dos inteiros, somente o
+# resultado das demais operações é convertido para inteiro: int(False) é 0,
+# que é verdadeiro em Lox.
+COMPARISONS = frozenset({eq, ne, lt, gt, le, ge})
 
 
 def add(a, b):
+    if type(a) is float and type(b) is float:
+        return a + b
     if isinstance(a, number) and isinstance(b, number):
-        result = a + b
-        if is_integer_var(getattr(a, 'name', '')) and is_integer_var(getattr(b, 'name', '')):
-            return int(result)
-        return result
-    if isinstance(a, str) and isinstance(b, str):
         return a + b
+    if isinstance(a, (str, Rope)) and isinstance(b, (str, Rope)):
+        return concat(a, b)
     raise LoxError(f"Soma entre {type(a).__name__} e {type(b).__name__}")
 
 
 def sub(a, b):
+    if type(a) is float and type(b) is float:
+        return a - b
     if isinstance(a, number) and isinstance(b, number):
-        result = a - b
-        if is_integer_var(getattr(a, 'name', '')) and is_integer_var(getattr(b, 'name', '')):
-            return int(result)
-        return result
+        return a - b
     raise LoxError(f"Subtração entre {type(a).__name__} e {type(b).__name__}")
 
+
 def mul(a, b):
+    if type(a) is float and type(b) is float:
+        return a * b
     if isinstance(a, number) and isinstance(b, number):
-        result = a * b
-        if is_integer_var(getattr(a, 'name', '')) and is_integer_var(getattr(b, 'name', '')):
-            return int(result)
-        return result
+        return a * b
     raise LoxError(f"Multiplicação entre {type(a).__name__} e {type(b).__name__}")
 
 
 def truediv(a, b):
-
     if isinstance(a, number) and isinstance(b, number):
         if b == 0:
             return float("nan")
-        result = a / b
-        if is_integer_var(getattr(a, 'name', '')) and is_integer_var(getattr(b, 'name', '')):
-            return int(result) if result >= 0 else int(result) - 1
-        return result
+        return a / b
     raise LoxError(f"Divisão entre {type(a).__name__} e {type(b).__name__}")
 
 
+#
+# OPERAÇÕES ESPECIALIZADAS
+#
+
+
+# As variantes abaixo verificam os tipos dos operandos (guarda) e aplicam a
+# operação do Python diretamente. Operandos de outros tipos são repassados para
+# a operação genérica, que produz o mesmo resultado ou o mesmo erro.
+
+
+def add_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a + b
+    return add(a, b)
+
+
+def add_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a + b
+    return add(a, b)
+
+
+def sub_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a - b
+    return sub(a, b)
+
+
+def sub_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a - b
+    return sub(a, b)
+
+
+def mul_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a * b
+    return mul(a, b)
+
+
+def mul_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a * b
+    return mul(a, b)
+
+
+def lt_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a < b
+    return lt(a, b)
+
+
+def lt_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a < b
+    return lt(a, b)
+
+
+def gt_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a > b
+    return gt(a, b)
+
+
+def gt_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a > b
+    return gt(a, b)
+
+
+def le_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a <= b
+    return le(a, b)
+
+
+def le_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a <= b
+    return le(a, b)
+
+
+def ge_float(a, b):
+    if type(a) is float and type(b) is float:
+        return a >= b
+    return ge(a, b)
+
+
+def ge_int(a, b):
+    if type(a) is int and type(b) is int:
+        return a >= b
+    return ge(a, b)
+
+
+def add_str(a, b):
+    if type(a) is str and type(b) is str:
+        return concat(a, b)
+    return add(a, b)
+
+
+SPECIALIZED: dict[tuple[Callable, type], Callable] = {
+    (add, float): add_float,
+    (add, int): add_int,
+    (add, str): add_str,
+    (sub, float): sub_float,
+    (sub, int): sub_int,
+    (mul, float): mul_float,
+    (mul, int): mul_int,
+    (lt, float): lt_float,
+    (lt, int): lt_int,
+    (gt, float): gt_float,
+    (gt, int): gt_int,
+    (le, float): le_float,
+    (le, int): le_int,
+    (ge, float): ge_float,
+    (ge, int): ge_int,
+}
+
+
+def specialize(op: Callable, a: "Value", b: "Value") -> Callable:
+    """
+    Escolhe a variante da operação para os tipos dos operandos observados.
+
+    Retorna a própria operação se não houver uma variante adequada.
+    """
+    if type(a) is type(b):
+        return SPECIALIZED.get((op, type(a)), op)
+    return op
+
+
 def neg(a):
     if isinstance(a, number):
         return -a
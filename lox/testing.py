@@ -108,7 +108,7 @@ class Example:
         with contextlib.redirect_stdout(stdout) as stdout:
             ctx = Ctx.from_dict({})
             try:
-                lox_eval(self.src, ctx)
+                lox_eval(parse(self.src, cache=True), ctx)
             except Exception as e:
                 if self.error is not None and self.error.runtime:
                     return ctx, "", str(e)
@@ -159,7 +159,7 @@ class Example:
         """
         Verifica se o exemplo foi totalmente convertido de CST para AST.
         """
-        ast = parse(self.src)
+        ast = parse(self.src, cache=True)
         assert isinstance(ast, Node)
 
         def assert_not_lark(obj):
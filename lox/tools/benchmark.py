@@ -0,0 +1,229 @@
+"""
+Medições de desempenho do interpretador Lox.
+
+Os programas em `exemplos/benchmark` usam recursos (`if`, `return`, classes,
+laços) que a gramática atual ainda não reconhece. Por isso, as cargas de
+trabalho abaixo são construídas diretamente com os nós da AST, reproduzindo o
+padrão de chamadas de `fib.lox` e `invocation.lox`.
+
+Execute com:
+
+    uv run python -m lox.tools.benchmark
+"""
+
+import time
+import tracemalloc
+from typing import Callable
+
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import Ctx
+from lox.engines import ENGINES, get_engine
+from lox.runtime import LoxClass, LoxFunction
+
+
+def call_program() -> Program:
+    """
+    Programa equivalente a:
+
+        fun f(a, b) {
+            var c = a + b;
+            fun g() {}
+            keep(g);
+        }
+
+    A função `keep` é nativa e guarda a closure `g`, mantendo vivo o escopo
+    de cada chamada de `f`. Isso permite medir a memória ocupada por cada
+    ativação.
+    """
+    body = Block(
+        [
+            VarDef("c", BinOp(Var("a"), Var("b"), op.add)),
+            Function("g", [], body=Block([])),
+            Call("keep", [Var("g")]),
+        ]
+    )
+    return Program([Function("f", [("a", None), ("b", None)], body=body)])
+
+
+def load_function(resolve: bool) -> tuple[Callable, list]:
+    """
+    Avalia o programa de chamadas e retorna a função `f` e a lista onde as
+    closures são guardadas.
+    """
+    kept: list = []
+    program = call_program()
+    if resolve:
+        program.resolve_tree()
+    ctx = Ctx.from_dict({"keep": kept.append})
+    program.eval(ctx)
+    return ctx["f"], kept
+
+
+def measure_calls(resolve: bool, n: int = 20_000, repeat: int = 5) -> tuple[float, float]:
+    """
+    Retorna o tempo médio de cada chamada (em µs) e a memória retida por
+    cada ativação (em bytes).
+
+    O tempo considerado é o da repetição mais rápida, o que reduz o ruído
+    causado por outros processos.
+    """
+    f, kept = load_function(resolve)
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            f(1.0, 2.0)
+        elapsed = min(elapsed, time.perf_counter() - start)
+        kept.clear()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(n):
+        f(1.0, 2.0)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed / n * 1e6, (after - before) / n
+
+
+def arith_program() -> Program:
+    """
+    Programa equivalente a:
+
+        fun f(x, y) {
+            var a = x * y + x - y;
+            var b = a * a - x / y;
+            a = b + a * x - y;
+            b = a - b * y + x;
+            n = n + 1;
+        }
+
+    A variável global `n` conta o número de chamadas e segue a regra dos
+    inteiros.
+    """
+
+    def binop(left, symbol, right):
+        ops = {"+": op.add, "-": op.sub, "*": op.mul, "/": op.truediv}
+        return BinOp(left, right, ops[symbol])
+
+    x, y, a, b = Var("x"), Var("y"), Var("a"), Var("b")
+    body = Block(
+        [
+            VarDef("a", binop(binop(binop(x, "*", y), "+", x), "-", y)),
+            VarDef("b", binop(binop(a, "*", a), "-", binop(x, "/", y))),
+            Assign("a", binop(binop(b, "+", binop(a, "*", x)), "-", y)),
+            Assign("b", binop(binop(a, "-", binop(b, "*", y)), "+", x)),
+            Assign("n", binop(Var("n"), "+", Literal(1.0))),
+        ]
+    )
+    return Program([Function("f", [("x", None), ("y", None)], body=body)])
+
+
+def measure_engine(engine: str, n: int = 20_000, repeat: int = 5) -> float:
+    """
+    Retorna o tempo médio (em µs) de cada chamada de `arith_program` usando
+    o mecanismo de execução indicado.
+    """
+    program = arith_program()
+    program.resolve_tree()
+    ctx = Ctx.from_dict({"n": 0})
+    get_engine(engine)(program, ctx)
+    f = ctx["f"]
+
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            f(3.0, 2.0)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed / n * 1e6
+
+
+def method_class() -> LoxClass:
+    """
+    Classe equivalente a:
+
+        class Counter { inc(x) { this.count = this.count + x; } }
+    """
+    this = Var("this")
+    body = [Setattr(this, "count", BinOp(Getattr(this, "count"), Var("x"), op.add))]
+    inc = LoxFunction("inc", ["x"], body, Ctx.from_dict({}))
+    return LoxClass("Counter", {"inc": inc})
+
+
+def measure_methods(n: int = 20_000, repeat: int = 5) -> tuple[float, float]:
+    """
+    Retorna o tempo médio (em µs) de uma chamada de método feita através do
+    acesso a atributos do Python (busca na classe e método vinculado a cada
+    chamada) e através de um nó `Invoke` com inline cache.
+    """
+    obj = method_class()()
+    obj.count = 0.0
+    ctx = Ctx.from_dict({"obj": obj})
+    invoke = Invoke(Var("obj"), "inc", [Literal(1.0)])
+
+    def lookup():
+        getattr(obj, "inc")(1.0)
+
+    def cached():
+        invoke.eval(ctx)
+
+    results = []
+    for func in [lookup, cached]:
+        elapsed = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(n):
+                func()
+            elapsed = min(elapsed, time.perf_counter() - start)
+        results.append(elapsed / n * 1e6)
+    return results[0], results[1]
+
+
+def measure_instances(n: int = 10_000) -> float:
+    """
+    Retorna a memória ocupada (em bytes) por cada instância de uma classe
+    com três campos, como os nós de `binary_trees.lox`.
+    """
+    cls = LoxClass("Tree", {})
+
+    def make():
+        obj = cls()
+        obj.left = None
+        obj.right = None
+        obj.item = 1.0
+        return obj
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objs = [make() for _ in range(n)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    return (after - before) / n
+
+
+def main():
+    print(f"{'escopos':<12} {'µs/chamada':>12} {'bytes/ativação':>16}")
+    for label, resolve in [("dict", False), ("frame", True)]:
+        elapsed, size = measure_calls(resolve)
+        print(f"{label:<12} {elapsed:>12.2f} {size:>16.0f}")
+
+    print()
+    print(f"{'mecanismo':<12} {'µs/chamada':>12}")
+    for engine in ENGINES:
+        print(f"{engine:<12} {measure_engine(engine):>12.2f}")
+
+    print()
+    lookup, cached = measure_methods()
+    print(f"{'métodos':<12} {'µs/chamada':>12}")
+    print(f"{'getattr':<12} {lookup:>12.2f}")
+    print(f"{'invoke':<12} {cached:>12.2f}")
+
+    print()
+    print(f"{'instâncias':<12} {measure_instances():>12.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
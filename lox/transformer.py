@@ -7,6 +7,7 @@ A resolução de vários exercícios requer a modificação ou implementação d
 métodos desta classe.
 """
 
+import sys
 from typing import Callable, Optional
 
 from lark import Transformer, v_args
@@ -122,7 +123,8 @@ class LoxTransformer(Transformer):
         return Literal(num)
 
     def STRING(self, token):
-        text = str(token)[1:-1]
+        # Strings internadas podem ser comparadas por identidade (ver op.eq).
+        text = sys.intern(str(token)[1:-1])
         return Literal(text)
 
     def NIL(self, _):
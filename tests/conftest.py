@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+# Não importamos `lox` aqui: o parser salva as tabelas da gramática no cache
+# durante a importação, o que deve acontecer somente depois de
+# `pytest_configure` redirecionar o cache.
+CACHE_DIR_ENV = "LOX_CACHE_DIR"
+
+_cache_dir: tempfile.TemporaryDirectory | None = None
+_previous: str | None = None
+
+
+def pytest_configure(config):
+    """
+    Usa um diretório temporário como cache em disco durante os testes, sem
+    modificar o cache do usuário (~/.cache/lox).
+    """
+    global _cache_dir, _previous
+    _previous = os.environ.get(CACHE_DIR_ENV)
+    _cache_dir = tempfile.TemporaryDirectory(prefix="lox-cache-")
+    os.environ[CACHE_DIR_ENV] = _cache_dir.name
+
+
+def pytest_unconfigure(config):
+    global _cache_dir
+    if _previous is None:
+        os.environ.pop(CACHE_DIR_ENV, None)
+    else:
+        os.environ[CACHE_DIR_ENV] = _previous
+    if _cache_dir is not None:
+        _cache_dir.cleanup()
+        _cache_dir = None
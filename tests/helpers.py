@@ -0,0 +1,33 @@
+"""
+Funções auxiliares compartilhadas pelos testes.
+"""
+
+import io
+from contextlib import redirect_stdout
+
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import Ctx
+
+
+def counting_loop(limit: Expr, *body: Stmt) -> For:
+    """
+    Equivalente a: for (var i = 0; i < limit; i = i + 1) { body }
+    """
+    return For(
+        VarDef("i", Literal(0.0)),
+        BinOp(Var("i"), limit, op.lt),
+        Assign("i", BinOp(Var("i"), Literal(1.0), op.add)),
+        Block(list(body)),
+    )
+
+
+def run_program(program: Node, env: dict | None = None) -> str:
+    """
+    Avalia o programa com o interpretador de árvore e retorna a saída.
+
+    O dicionário `env` é copiado, de modo que pode ser reutilizado.
+    """
+    with redirect_stdout(io.StringIO()) as stdout:
+        program.eval(Ctx.from_dict(dict(env or {})))
+    return stdout.getvalue()
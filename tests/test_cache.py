@@ -0,0 +1,136 @@
+import os
+import sys
+
+from lark import Tree
+
+import lox
+from lox import cache, parse, parse_expr
+from lox.ast import *
+from lox.parser import GRAMMAR_PATH
+from lox.transformer import LoxTransformer
+
+OPTIONS = {"parser": "lalr", "start": ["start", "expr"]}
+
+
+class TestGrammarCache:
+    def test_tabelas_são_salvas_e_recarregadas(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        cache.make_parser(GRAMMAR_PATH, **OPTIONS)
+        files = [*tmp_path.glob("grammar/*.lark")]
+        assert len(files) == 1
+
+        mtime = files[0].stat().st_mtime_ns
+        parser = cache.make_parser(GRAMMAR_PATH, **OPTIONS)
+        assert isinstance(parser.parse("1 + 2", start="expr"), Tree)
+        assert files[0].stat().st_mtime_ns == mtime
+
+    def test_cache_corrompido_é_reconstruído(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        cache.make_parser(GRAMMAR_PATH, **OPTIONS)
+        [path] = tmp_path.glob("grammar/*.lark")
+        path.write_bytes(b"lixo")
+
+        parser = cache.make_parser(GRAMMAR_PATH, **OPTIONS)
+        assert isinstance(parser.parse("1 + 2", start="expr"), Tree)
+        assert path.read_bytes() != b"lixo"
+
+    def test_parsers_compartilham_as_tabelas(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        ast = cache.make_parser(GRAMMAR_PATH, transformer=LoxTransformer(), **OPTIONS).parse(
+            "1 + 2", start="expr"
+        )
+        cst = cache.make_parser(GRAMMAR_PATH, **OPTIONS).parse("1 + 2", start="expr")
+        assert isinstance(cst, Tree) and cst.data == "add"
+        assert isinstance(ast, BinOp)
+        assert len([*tmp_path.glob("grammar/*.lark")]) == 1
+
+    def test_diretório_inválido_não_impede_o_parser(self, tmp_path, monkeypatch):
+        file = tmp_path / "arquivo"
+        file.write_text("")
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(file))
+
+        parser = cache.make_parser(GRAMMAR_PATH, **OPTIONS)
+        assert isinstance(parser.parse("1 + 2", start="expr"), Tree)
+
+    def test_chave_depende_do_conteúdo_da_gramática(self):
+        key = cache.grammar_key("start: 'a'", **OPTIONS)
+        assert key == cache.grammar_key("start: 'a'", **OPTIONS)
+        assert key != cache.grammar_key("start: 'b'", **OPTIONS)
+        assert key != cache.grammar_key("start: 'a'", parser="earley")
+
+
+class TestAstCache:
+    SRC = "print 1 + 2 * 3;"
+
+    def test_árvore_é_recarregada_do_disco(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        tree = parse(self.SRC, cache=True)
+        [path] = tmp_path.glob("ast/*")
+        assert tree == parse(self.SRC)
+
+        loaded = parse(self.SRC, cache=True)
+        assert loaded == tree
+        assert loaded is not tree
+        assert [*tmp_path.glob("ast/*")] == [path]
+
+    def test_strings_recarregadas_são_internadas(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        parse_expr('"tag-cache"', cache=True)
+        loaded = parse_expr('"tag-cache"', cache=True)
+        assert loaded.value is sys.intern("tag-cache")
+
+    def test_expressões_e_programas_usam_chaves_diferentes(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        assert isinstance(parse_expr("1 + 2", cache=True), BinOp)
+        assert isinstance(parse("1 + 2;", cache=True), Program)
+        assert len([*tmp_path.glob("ast/*")]) == 2
+
+    def test_cache_sem_flag_não_escreve_no_disco(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        parse(self.SRC)
+        assert [*tmp_path.glob("ast/*")] == []
+
+    def test_arquivos_antigos_são_removidos(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+        monkeypatch.setenv(cache.AST_CACHE_SIZE_ENV, "0")
+
+        parse("print 1;", cache=True)
+        parse("print 2;", cache=True)
+        assert [*tmp_path.glob("ast/*")] == []
+
+    def test_remoção_preserva_arquivos_recentes(self, tmp_path):
+        for i, name in enumerate("abc"):
+            path = tmp_path / name
+            path.write_bytes(b"x" * 10)
+            os.utime(path, ns=(i, i))
+
+        cache.evict(tmp_path, 20)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["b", "c"]
+
+
+class TestCodeCache:
+    def test_código_compilado_é_reutilizado(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        assert lox.eval(parse_expr("1 + 2 * 3"), engine="python") == 7.0
+        [path] = tmp_path.glob("code/*.pyc")
+        os.utime(path, ns=(0, 0))
+
+        assert lox.eval(parse_expr("1 + 2 * 3"), engine="python") == 7.0
+        assert [*tmp_path.glob("code/*.pyc")] == [path]
+        assert path.stat().st_mtime_ns != 0
+
+    def test_cache_corrompido_é_recompilado(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+
+        lox.eval(parse_expr("1 + 2"), engine="python")
+        [path] = tmp_path.glob("code/*.pyc")
+        path.write_bytes(b"lixo")
+        assert lox.eval(parse_expr("1 + 2"), engine="python") == 3.0
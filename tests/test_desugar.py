@@ -0,0 +1,111 @@
+import io
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+import pytest
+
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import Ctx
+
+from helpers import counting_loop, run_program
+
+
+class TestIntegerSpecialization:
+    def program(self) -> Program:
+        n, m = Var("n"), Var("m")
+        return Program(
+            [
+                VarDef("n", Literal(30.5)),
+                VarDef("m", Literal("7")),
+                VarDef("x", Literal(2.5)),
+                Assign("k", BinOp(n, m, op.truediv)),
+                Setattr(Var("obj"), "j", Literal("42")),
+                Setattr(Var("obj"), "y", Literal("42")),
+                Print(BinOp(n, BinOp(m, Var("k"), op.mul), op.sub)),
+                Print(BinOp(Var("x"), n, op.mul)),
+            ]
+        )
+
+    def test_nós_são_especializados(self):
+        program = self.program()
+        program.desugar_tree()
+        classes = [type(stmt) for stmt in program.stmts]
+        assert classes[:6] == [IntVarDef, IntVarDef, FloatVarDef, IntAssign, IntSetattr, FloatSetattr]
+        assert type(program.stmts[3].value) is IntBinOp
+        assert type(program.stmts[7].expr) is FloatBinOp
+
+    def test_especialização_preserva_a_semântica(self):
+        outputs = []
+        for desugar in [False, True]:
+            program = self.program()
+            if desugar:
+                program.desugar_tree()
+            ctx = Ctx.from_dict({"k": 0, "obj": SimpleNamespace()})
+            with redirect_stdout(io.StringIO()) as stdout:
+                program.eval(ctx)
+            obj = ctx["obj"]
+            outputs.append((stdout.getvalue(), ctx["n"], ctx["k"], obj.j, obj.y))
+        assert outputs[0] == outputs[1] == ("2\n75.0\n", 30, 4, 42, "42")
+
+    def test_coerção_decidida_por_nome(self):
+        assert op.coercion("index") is op.coerce_integer
+        assert op.coercion("x") is op.keep_value
+        assert op.coerce_integer(None) is None
+
+
+class TestOperatorSpecialization:
+    def test_primeira_avaliação_escolhe_a_variante(self):
+        node = BinOp(Var("x"), Var("y"), op.add)
+        node.desugar_self()
+        ctx = Ctx.from_dict({"x": 1.0, "y": 2.0})
+        assert node.eval(ctx) == 3.0
+        assert type(node) is SpecializedBinOp
+        assert node.impl.__name__ == "add_float"
+
+        # A guarda recorre à operação genérica quando os tipos mudam.
+        ctx["x"], ctx["y"] = "a", "b"
+        assert node.eval(ctx) == "ab"
+
+    def test_operações_sem_variante(self):
+        node = BinOp(Literal(1.0), Literal("a"), op.eq)
+        node.desugar_self()
+        assert node.eval(Ctx.from_dict({})) is False
+        assert node.impl is op.eq
+
+    def test_comparações(self):
+        assert op.lt(1, 2.0) and op.le(2.0, 2.0) and op.ge(3, 2) and op.gt(3.0, 2)
+        assert not op.le(float("nan"), float("nan"))
+
+    @pytest.mark.parametrize("func", [op.lt, op.gt, op.le, op.ge, op.lt_float, op.ge_int])
+    def test_comparações_com_booleanos(self, func):
+        with pytest.raises(op.LoxError, match="Comparação entre bool e float"):
+            func(True, 2.0)
+
+
+class TestCountedFor:
+    def test_laço_de_contagem(self):
+        generic = Program([counting_loop(Literal(4.5), Print(Var("i")))])
+        counted = Program([counting_loop(Literal(4.5), Print(Var("i")))])
+        counted.desugar_tree()
+        assert type(counted.stmts[0]) is CountedFor
+        assert run_program(counted) == run_program(generic) == "0\n1\n2\n3\n4\n"
+
+    def test_limite_variável(self):
+        program = Program([counting_loop(Var("n"), Print(Var("i")))])
+        program.desugar_tree()
+        assert type(program.stmts[0]) is CountedFor
+        assert run_program(program, {"n": 2}) == "0\n1\n"
+        assert run_program(program, {"n": 0}) == ""
+
+    def test_corpo_que_modifica_o_contador(self):
+        loop = counting_loop(Literal(10.0), Print(Var("i")), Assign("i", BinOp(Var("i"), Literal(4.0), op.add)))
+        program = Program([loop])
+        program.desugar_tree()
+        assert type(loop) is For
+        assert run_program(program) == "0\n5\n"
+
+    def test_limite_que_pode_ser_modificado(self):
+        loop = counting_loop(Var("n"), Call("f", []))
+        Program([loop]).desugar_tree()
+        assert type(loop) is For
@@ -0,0 +1,592 @@
+import io
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+import pytest
+
+import lox
+from lox import *
+from lox import runtime as op
+from lox.ast import *
+from lox.engines import ENGINES, get_engine
+from lox.passes import run_passes
+from lox.runtime import LoxError
+
+ALT_ENGINES = [name for name in ENGINES if name != "tree"]
+
+
+def closures_program() -> Program:
+    """
+    Equivalente a:
+
+        fun outer(a) {
+            var b = 10;
+            fun inner(c) { print a + b + c; b = c; }
+            inner(1);
+            inner(2);
+        }
+        outer(5);
+    """
+    inner = Function(
+        "inner",
+        [("c", None)],
+        body=Block(
+            [
+                Print(BinOp(BinOp(Var("a"), Var("b"), op.add), Var("c"), op.add)),
+                Assign("b", Var("c")),
+            ]
+        ),
+    )
+    outer = Function(
+        "outer",
+        [("a", None)],
+        body=Block(
+            [
+                VarDef("b", Literal(10.0)),
+                inner,
+                Call("inner", [Literal(1.0)]),
+                Call("inner", [Literal(2.0)]),
+            ]
+        ),
+    )
+    return Program([outer, Call("outer", [Literal(5.0)])])
+
+
+def integers_program() -> Program:
+    """
+    Equivalente a:
+
+        var n = 30;
+        var m = 7;
+        k = n / m;
+        obj.j = "42";
+        print n - m * k;
+    """
+    n, m, k = Var("n"), Var("m"), Var("k")
+    return Program(
+        [
+            Assign("n", Literal(30.0)),
+            Assign("m", Literal(7.0)),
+            Assign("k", BinOp(n, m, op.truediv)),
+            Setattr(Var("obj"), "j", Literal("42")),
+            Print(BinOp(n, BinOp(m, k, op.mul), op.sub)),
+        ]
+    )
+
+
+def returns_program() -> Program:
+    """
+    Equivalente a:
+
+        fun f(x) { print x; return x + 1; print "nunca"; }
+        fun g() { return; }
+        print f(1) + f(2);
+        print g();
+        return;
+        print "nunca";
+    """
+    f = Function(
+        "f",
+        [("x", None)],
+        body=Block(
+            [
+                Print(Var("x")),
+                Return(BinOp(Var("x"), Literal(1.0), op.add)),
+                Print(Literal("nunca")),
+            ]
+        ),
+    )
+    g = Function("g", [], body=Block([Return()]))
+    call = lambda x: Call("f", [Literal(x)])  # noqa: E731
+    return Program(
+        [
+            f,
+            g,
+            Print(BinOp(call(1.0), call(2.0), op.add)),
+            Print(Call("g", [])),
+            Return(),
+            Print(Literal("nunca")),
+        ]
+    )
+
+
+def loops_program() -> Program:
+    """
+    Equivalente a:
+
+        var a = "global";
+        { var a = "bloco"; print a; }
+        print a;
+        for (var x = 0; x < 3; x = x + 1) {
+            var y = x * 2;
+            fun show() { print y; }
+            keep(show);
+        }
+        fun f(x) {
+            var t = 0;
+            while (t < x) { t = t + 1; { print t; } }
+            return t;
+        }
+        print f(2);
+    """
+    show = Function("show", [], body=Block([Print(Var("y"))]))
+    loop = For(
+        VarDef("x", Literal(0.0)),
+        BinOp(Var("x"), Literal(3.0), op.lt),
+        Assign("x", BinOp(Var("x"), Literal(1.0), op.add)),
+        Block([VarDef("y", BinOp(Var("x"), Literal(2.0), op.mul)), show, Call("keep", [Var("show")])]),
+    )
+    body = [
+        VarDef("t", Literal(0.0)),
+        While(
+            BinOp(Var("t"), Var("x"), op.lt),
+            Block([Assign("t", BinOp(Var("t"), Literal(1.0), op.add)), Block([Print(Var("t"))])]),
+        ),
+        Return(Var("t")),
+    ]
+    return Program(
+        [
+            VarDef("a", Literal("global")),
+            Block([VarDef("a", Literal("bloco")), Print(Var("a"))]),
+            Print(Var("a")),
+            loop,
+            Function("f", [("x", None)], body=Block(body)),
+            Print(Call("f", [Literal(2.0)])),
+        ]
+    )
+
+
+def for_program() -> Program:
+    """
+    Equivalente a:
+
+        var n = 5;
+        for (var i = 0; i < n; i = i + 2) print i;
+        fun f(n) {
+            var s = 0;
+            for (var k = 0; k < n; k = k + 1) { { s = s + k; } }
+            return s;
+        }
+        { var n = f(4); print n; }
+        print n;
+    """
+    i, k = Var("i"), Var("k")
+    step = For(
+        VarDef("i", Literal(0.0)),
+        BinOp(i, Var("n"), op.lt),
+        Assign("i", BinOp(i, Literal(2.0), op.add)),
+        Print(i),
+    )
+    counted = For(
+        VarDef("k", Literal(0.0)),
+        BinOp(k, Var("n"), op.lt),
+        Assign("k", BinOp(k, Literal(1.0), op.add)),
+        Block([Block([Assign("s", BinOp(Var("s"), k, op.add))])]),
+    )
+    f = Function("f", [("n", None)], body=Block([VarDef("s", Literal(0.0)), counted, Return(Var("s"))]))
+    return Program(
+        [
+            VarDef("n", Literal(5.0)),
+            step,
+            f,
+            Block([VarDef("n", Call("f", [Literal(4.0)])), Print(Var("n"))]),
+            Print(Var("n")),
+        ]
+    )
+
+
+def while_program() -> Program:
+    """
+    Equivalente a:
+
+        var n = 5;
+        var i = 0;
+        while (i < n) { print i; i = i + 2; }
+        fun f(n) {
+            var k = 0;
+            var m = 0;
+            while (k < n) { m = m + k; k = k + 1; }
+            return m;
+        }
+        print f(4);
+    """
+    i, k, m = Var("i"), Var("k"), Var("m")
+    outer = While(BinOp(i, Var("n"), op.lt), Block([Print(i), Assign("i", BinOp(i, Literal(2.0), op.add))]))
+    inner = While(
+        BinOp(k, Var("n"), op.lt),
+        Block([Assign("m", BinOp(m, k, op.add)), Assign("k", BinOp(k, Literal(1.0), op.add))]),
+    )
+    body = [VarDef("k", Literal(0.0)), VarDef("m", Literal(0.0)), inner, Return(m)]
+    return Program(
+        [
+            VarDef("n", Literal(5.0)),
+            VarDef("i", Literal(0.0)),
+            outer,
+            Function("f", [("n", None)], body=Block(body)),
+            Print(Call("f", [Literal(4.0)])),
+        ]
+    )
+
+
+def scopes_program() -> Program:
+    """
+    Equivalente a:
+
+        fun f() {
+            var s = 0;
+            var x = "função";
+            var n = 0;
+            while (n < 2) { var w = n * 10; s = s + w; n = n + 1; }
+            for (var i = 0; i < 2; i = i + 1) { var y = i; s = s + y; }
+            for (var i = 0; i < 3; i = i + 1) { s = s + i; }
+            for (var i = 0; i < 2; i = i + 1) {
+                for (var j = 0; j < 2; j = j + 1) { s = s + i * j; }
+            }
+            { print x; var x = "bloco"; print x; }
+            print x;
+            for (var k = 0; k < 3; k = k + 1) {
+                var v = k;
+                fun get() { print v; }
+                keep(get);
+            }
+            return s;
+        }
+        print f();
+        print f();
+    """
+    # Cada uso de uma variável é um nó diferente, já que o resolvedor anota
+    # a posição da declaração no próprio nó.
+    def counting(name: str, limit: float, *body: Stmt) -> For:
+        return For(
+            VarDef(name, Literal(0.0)),
+            BinOp(Var(name), Literal(limit), op.lt),
+            Assign(name, BinOp(Var(name), Literal(1.0), op.add)),
+            Block(list(body)),
+        )
+
+    def add_to_s(expr: Expr) -> Assign:
+        return Assign("s", BinOp(Var("s"), expr, op.add))
+
+    get = Function("get", [], body=Block([Print(Var("v"))]))
+    body = [
+        VarDef("s", Literal(0.0)),
+        VarDef("x", Literal("função")),
+        VarDef("n", Literal(0.0)),
+        While(
+            BinOp(Var("n"), Literal(2.0), op.lt),
+            Block(
+                [
+                    VarDef("w", BinOp(Var("n"), Literal(10.0), op.mul)),
+                    add_to_s(Var("w")),
+                    Assign("n", BinOp(Var("n"), Literal(1.0), op.add)),
+                ]
+            ),
+        ),
+        counting("i", 2.0, VarDef("y", Var("i")), add_to_s(Var("y"))),
+        counting("i", 3.0, add_to_s(Var("i"))),
+        counting("i", 2.0, counting("j", 2.0, add_to_s(BinOp(Var("i"), Var("j"), op.mul)))),
+        Block([Print(Var("x")), VarDef("x", Literal("bloco")), Print(Var("x"))]),
+        Print(Var("x")),
+        counting("k", 3.0, VarDef("v", Var("k")), get, Call("keep", [Var("get")])),
+        Return(Var("s")),
+    ]
+    f = Function("f", [], body=Block(body))
+    return Program([f, Print(Call("f", [])), Print(Call("f", []))])
+
+
+def run_loops(program: Program, engine: str) -> str:
+    """
+    Executa `loops_program` e depois as closures guardadas por `keep`.
+    """
+    kept: list = []
+    stdout, _ = run(program, engine, {"keep": kept.append})
+    with redirect_stdout(io.StringIO()) as after:
+        for func in kept:
+            func()
+    return stdout + after.getvalue()
+
+
+def run(program: Node, engine: str, env: dict | None = None) -> tuple[str, Ctx]:
+    ctx = Ctx.from_dict({} if env is None else env)
+    with redirect_stdout(io.StringIO()) as stdout:
+        lox.eval(program, ctx, engine=engine)
+    return stdout.getvalue(), ctx
+
+
+@pytest.mark.parametrize("engine", ALT_ENGINES)
+class TestEngines:
+    def test_closures_e_escopos(self, engine):
+        expect, _ = run(closures_program(), "tree")
+        program = closures_program()
+        program.resolve_tree()
+        assert run(program, engine)[0] == expect == "16.0\n8.0\n"
+
+    def test_closures_sem_resolução(self, engine):
+        assert run(closures_program(), engine)[0] == "16.0\n8.0\n"
+
+    def test_regra_dos_inteiros(self, engine):
+        env = {"n": 0, "m": 0, "k": 0, "obj": SimpleNamespace()}
+        stdout, ctx = run(integers_program(), engine, env)
+        assert stdout == "2\n"
+        assert ctx["k"] == 4
+        assert ctx["obj"].j == 42
+
+    def test_expressões(self, engine):
+        assert lox.eval(parse_expr("1 + 2 * 3 - 4 / 2"), engine=engine) == 5.0
+
+    def test_programa_analisado(self, engine):
+        stdout, _ = run(parse("print 1 + 2 * 3;"), engine)
+        assert stdout == "7.0\n"
+
+    def test_chamada_de_funções_nativas(self, engine):
+        assert lox.eval(Call("max", [Literal(1.0), Literal(2.0)]), engine=engine) == 2.0
+
+    def test_return(self, engine):
+        expect, _ = run(returns_program(), "tree")
+        assert expect == "1.0\n2.0\n5.0\nNone\n"
+        assert run(returns_program(), engine)[0] == expect
+
+    def test_laços_for(self, engine):
+        expect, _ = run(for_program(), "tree")
+        assert expect == "0\n2\n4\n6\n5\n"
+        assert run(for_program(), engine)[0] == expect
+
+        program = for_program()
+        program.desugar_tree()
+        assert type(program.stmts[2].body.stmts[1]) is CountedFor
+        assert run(program, engine)[0] == expect
+
+    def test_laços_while(self, engine):
+        expect, _ = run(while_program(), "tree")
+        assert expect == "0\n2\n4\n6\n"
+        assert run(while_program(), engine)[0] == expect
+
+    def test_blocos_e_laços(self, engine):
+        expect = run_loops(loops_program(), "tree")
+        assert expect == "bloco\nglobal\n1.0\n2.0\n2.0\n0.0\n2.0\n4.0\n"
+        assert run_loops(loops_program(), engine) == expect
+
+    def test_nós_sem_eval_produzem_o_mesmo_erro(self, engine):
+        with pytest.raises(NotImplementedError):
+            run(Program([Class("A")]), engine)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("passes", [(), ("resolve",), ("desugar", "resolve")])
+def test_escopos_de_blocos_em_funções(engine, passes):
+    program = scopes_program()
+    if passes:
+        run_passes(program, passes)
+    expect = "função\nbloco\nfunção\n15.0\n" * 2 + "0\n1\n2\n" * 2
+    assert run_loops(program, engine) == expect
+
+
+def test_mecanismo_desconhecido():
+    with pytest.raises(ValueError):
+        get_engine("nope")
+
+
+class TestBytecode:
+    def test_disassembler(self):
+        from lox.engines.bytecode import Compiler, disassemble
+
+        listing = disassemble(Compiler.compile(closures_program()))
+        assert "OP_CLOSURE" in listing
+        assert "OP_GET_UPVALUE      1 (b)" in listing
+        assert "OP_SET_UPVALUE      1 (b)" in listing
+
+    def test_limite_de_constantes(self):
+        program = Program([Print(Literal(float(i))) for i in range(300)])
+        with pytest.raises(SemanticError, match="Too many constants in one chunk."):
+            lox.eval(program, engine="vm")
+
+    def test_saltos(self):
+        from lox.engines.bytecode import Compiler, disassemble
+
+        listing = disassemble(Compiler.compile(loops_program()))
+        assert "OP_JUMP_IF_FALSE" in listing and "OP_LOOP" in listing
+        assert "OP_CLOSE_UPVALUE    2 (y)" in listing
+
+    def test_escopos_dentro_de_funções(self):
+        from lox.engines.bytecode import Compiler, disassemble
+
+        listing = disassemble(Compiler.compile(scopes_program()))
+        assert "OP_DEFINE_LOCAL     3 (w)" in listing
+        assert "OP_CLOSE_UPVALUE    3 (w)" in listing
+        # A leitura que antecede a declaração do bloco usa a variável da função.
+        block = [line.split(maxsplit=1)[1] for line in listing.splitlines() if "(x)" in line][1:]
+        assert block == [
+            "OP_GET_LOCAL        1 (x)",
+            "OP_DEFINE_LOCAL     9 (x)",
+            "OP_GET_LOCAL        9 (x)",
+            "OP_CLOSE_UPVALUE    9 (x)",
+            "OP_GET_LOCAL        1 (x)",
+        ]
+
+    def test_limite_do_laço(self):
+        # Equivalente a exemplos/limit/loop_too_large.lox
+        body = Block([Literal(None)] * 40_000)
+        with pytest.raises(SemanticError, match="Loop body too large."):
+            lox.eval(Program([While(Literal(False), body)]), engine="vm")
+
+    def test_limite_de_variáveis_locais(self):
+        body = Block([VarDef(f"x{i}", None) for i in range(300)])
+        with pytest.raises(SemanticError, match="Too many local variables in function."):
+            lox.eval(Program([Function("f", [], body=body)]), engine="vm")
+
+
+def countdown_program(depth: float) -> Program:
+    """
+    Equivalente a:
+
+        fun countdown(n) {
+            tick(n);
+            return next(n - 1);
+        }
+        next = countdown;
+        countdown(depth);
+
+    A função nativa `tick` troca `next` por uma função que encerra a
+    recursão quando n chega a zero.
+    """
+    countdown = Function(
+        "countdown",
+        [("x", None)],
+        body=Block(
+            [
+                Call("tick", [Var("x")]),
+                Return(Call("next", [BinOp(Var("x"), Literal(1.0), op.sub)])),
+            ]
+        ),
+    )
+    return Program(
+        [
+            countdown,
+            Assign("next", Var("countdown")),
+            Print(Call("countdown", [Literal(depth)])),
+        ]
+    )
+
+
+def countdown_env() -> dict:
+    env: dict = {}
+
+    def tick(x):
+        if x == 0:
+            env["next"] = lambda x: "fim"
+
+    env["tick"] = tick
+    env["next"] = None
+    return env
+
+
+@pytest.mark.parametrize("engine", ["tree", "vm"])
+def test_chamadas_em_posição_de_cauda(engine):
+    program = countdown_program(5000.0)
+    program.desugar_tree()
+    stdout, _ = run(program, engine, countdown_env())
+    assert stdout == "fim\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_chamada_de_cauda_em_bloco_aninhado(engine):
+    # Equivalente a: fun g(x) { return x; } fun f(x) { { return g(x); } } print f(7); return f(8);
+    g = Function("g", [("x", None)], body=Block([Return(Var("x"))]))
+    f = Function("f", [("x", None)], body=Block([Block([Return(Call("g", [Var("x")]))])]))
+    program = Program([g, f, Print(Call("f", [Literal(7.0)])), Return(Call("check", [Call("f", [Literal(8.0)])]))])
+    program.desugar_tree()
+    received = []
+    stdout, _ = run(program, engine, {"check": received.append})
+    assert stdout == "7.0\n"
+    assert received == [8.0]
+
+
+class TestStack:
+    def test_recursão_profunda(self):
+        # Equivalente a: fun down(x) { tick(x); return x + next(x - 1); }
+        down = Function(
+            "down",
+            [("x", None)],
+            body=Block(
+                [
+                    Call("tick", [Var("x")]),
+                    Return(BinOp(Var("x"), Call("next", [BinOp(Var("x"), Literal(1.0), op.sub)]), op.add)),
+                ]
+            ),
+        )
+        program = Program([down, Assign("next", Var("down")), Print(Call("down", [Literal(20000.0)]))])
+        env: dict = {"next": None}
+        env["tick"] = lambda x: x == 0 and env.update(next=lambda x: 0.0)
+        assert run(program, "stack", env)[0] == "200010000.0\n"
+
+    def test_stack_overflow(self, monkeypatch):
+        monkeypatch.setenv("LOX_MAX_DEPTH", "100")
+        foo = Function("foo", [], body=Block([Call("foo", [])]))
+        with pytest.raises(LoxError, match="Stack overflow."):
+            run(Program([foo, Call("foo", [])]), "stack")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_concatenação_de_strings(engine):
+    # Equivalente a: s = s + "lox;"; (repetido) print s == esperado; check(s);
+    received = []
+    stmts = [Assign("s", BinOp(Var("s"), Literal("lox;"), op.add)) for _ in range(100)]
+    stmts.append(Print(BinOp(Var("s"), Literal("lox;" * 100), op.eq)))
+    stmts.append(Call("check", [Var("s")]))
+    stdout, ctx = run(Program(stmts), engine, {"s": "", "check": received.append})
+    assert stdout == "True\n"
+    assert type(received[0]) is str and received[0] == "lox;" * 100
+    assert ctx["s"] == "lox;" * 100
+
+
+class TestRope:
+    def test_cordas_compartilham_partes(self):
+        base = op.add("a" * 200, "b" * 100)
+        left, right = op.add(base, "c"), op.add(base, "d")
+        assert type(base) is op.Rope
+        assert str(left) == "a" * 200 + "b" * 100 + "c"
+        assert str(right) == "a" * 200 + "b" * 100 + "d"
+        assert str(base) == "a" * 200 + "b" * 100
+
+    def test_strings_curtas_não_usam_cordas(self):
+        assert type(op.add("a", "b")) is str
+
+    def test_igualdade_e_exibição(self):
+        rope = op.add("x" * 300, "!")
+        assert op.eq(rope, "x" * 300 + "!") and op.eq("x" * 300 + "!", rope)
+        assert not op.eq(rope, 1.0)
+        assert op.show(rope) == "x" * 300 + "!"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cordas_não_escapam_do_interpretador(engine):
+    # Equivalente a: t = s + "!"; obj.text = t; inst.text = t; (retorna t)
+    s = "x" * 300
+    assert type(lox.eval(BinOp(Var("s"), Literal("!"), op.add), {"s": s}, engine=engine)) is str
+
+    obj, inst = SimpleNamespace(), op.LoxClass("A", {})()
+    t = BinOp(Var("s"), Literal("!"), op.add)
+    stmts = [Assign("t", t), Setattr(Var("obj"), "text", Var("t")), Setattr(Var("inst"), "text", Var("t"))]
+    _, ctx = run(Program(stmts), engine, {"s": s, "t": None, "obj": obj, "inst": inst})
+    assert type(ctx["t"]) is str and ctx["t"] == s + "!"
+    assert type(obj.text) is str and type(inst.text) is str
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_métodos_python_recebem_strings(engine):
+    # Equivalente a: items.append(s + "!");
+    s, items = "x" * 300, []
+    call = Invoke(Var("items"), "append", [BinOp(Var("s"), Literal("!"), op.add)])
+    run(Program([call]), engine, {"s": s, "items": items})
+    assert type(items[0]) is str and items[0] == s + "!"
+
+
+class TestInterning:
+    def test_literais_são_internados(self):
+        x, y = parse_expr('"tag-a"'), parse_expr('"tag-" + "a"')
+        assert x.value is lox.eval(y)
+
+    def test_igualdade(self):
+        nan = float("nan")
+        assert not op.eq(nan, nan) and op.ne(nan, nan)
+        assert op.eq("abc", "abc") and not op.ne("abc", "abc")
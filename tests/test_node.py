@@ -0,0 +1,193 @@
+from dataclasses import dataclass
+
+import pytest
+
+from lox import passes
+from lox import runtime as op
+from lox.ast import *
+from lox.node import Dispatcher, ParentIndex, node_fields, visit_once
+
+
+class TestNodeFields:
+    def test_nós_não_possuem_dict(self):
+        node = BinOp(Var("x"), Literal(1.0), op.add)
+        node.desugar_tree()
+        assert not hasattr(node, "__dict__") and not hasattr(node.left, "__dict__")
+
+    def test_campos_da_árvore(self):
+        fields = node_fields(Function)
+        assert fields.names == ("name", "params", "return_type", "body")
+        assert fields.children == (("params", True), ("return_type", False), ("body", False))
+        assert node_fields(BinOp).children == (("left", False), ("right", False))
+        assert node_fields(Super).names == ()
+
+    def test_anotações_não_fazem_parte_da_árvore(self):
+        def make():
+            return Function("f", body=Block([VarDef("x", Literal(1.0)), Print(Var("x"))]))
+
+        function = make()
+        function.resolve_tree()
+        assert function.body.stmts[1].expr.slot is not None
+        assert "slot" not in function.pretty()
+        assert function == make()
+
+
+class TestDeepTrees:
+    def test_cadeia_de_else_if(self):
+        # if (x == 0) print 0; else if (x == 1) print 1; else if ...
+        node: Stmt = Print(Var("x"))
+        for i in range(5000):
+            node = If(BinOp(Var("x"), Literal(float(i)), op.eq), Print(Literal(float(i))), node)
+        function = Function("f", [("x", None)], body=Block([node]))
+        function.desugar_tree()
+        function.validate_tree()
+        function.resolve_tree()
+        assert sum(1 for _ in function.descendants()) == 5000 * 6 + 4
+        assert node.else_branch.condition.left.slot == 0
+
+    def test_soma_longa(self):
+        expr: Expr = Literal(0.0)
+        for _ in range(5000):
+            expr = BinOp(expr, Literal(1.0), op.add)
+        program = Program([Print(expr)])
+        program.desugar_tree()
+        program.validate_tree()
+        assert type(expr) is FloatBinOp
+        assert list(program.lark_descendents()) == []
+
+
+class TestParentIndex:
+    def make_tree(self):
+        # fun f(x) { print x + 1; print x; }
+        stmts = [Print(BinOp(Var("x"), Literal(1.0), op.add)), Print(Var("x"))]
+        return Function("f", [("x", None)], body=Block(stmts))
+
+    def test_cursor(self):
+        tree = self.make_tree()
+        index = ParentIndex(tree)
+        var = tree.body.stmts[0].expr.left
+        cursor = var.cursor(tree.cursor(), index)
+        assert cursor.node is var
+        assert [parent.node for parent in cursor.parents()] == [
+            tree.body.stmts[0].expr,
+            tree.body.stmts[0],
+            tree.body,
+            tree,
+        ]
+        assert index.cursor(var).root().node is tree
+
+    def test_replace_child(self):
+        tree = self.make_tree()
+        index = ParentIndex(tree)
+        old = tree.body.stmts[1]
+        new = Block([old])
+        tree.body.replace_child(old, new, index)
+        assert tree.body.stmts[1] is new
+        assert index.parent(new) is tree.body and index.parent(old) is new
+
+    def test_modificações_fora_do_índice(self):
+        tree = self.make_tree()
+        index = ParentIndex(tree)
+        old = tree.body.stmts.pop(0)
+        assert index.parent(old) is None
+        assert index.parent(tree.body.stmts[0]) is None
+        tree.body.replace_child(tree.body.stmts[0], old, index)
+        assert tree.body.stmts == [old] and index.parent(old) is tree.body
+        with pytest.raises(ValueError):
+            Var("y").cursor(tree.cursor(), index)
+
+    def test_substituição_remove_a_subárvore_antiga(self):
+        tree = self.make_tree()
+        index = ParentIndex(tree)
+        old = tree.body.stmts[0]
+        removed = [old, *old.descendants()]
+        index.replace(old, Print(Literal(2.0)))
+        assert not any(id(node) in index.positions for node in removed[1:])
+        assert len(index.positions) == sum(1 for _ in tree.descendants()) - 1
+
+    def test_substituição_preserva_nós_reaproveitados(self):
+        tree = self.make_tree()
+        index = ParentIndex(tree)
+        old = tree.body.stmts[0]
+        expr = old.expr
+        index.replace(old, Print(BinOp(expr, Literal(2.0), op.mul)))
+        assert index.parent(expr.left) is expr and index.parent(old) is None
+
+
+class TestVisit:
+    def test_ordem_e_escalares(self):
+        tree = Print(BinOp(Var("x"), Literal(1.0), op.add))
+        seen = []
+        tree.visit({object: lambda obj: seen.append(type(obj) if isinstance(obj, Node) else obj)})
+        assert seen == ["x", Var, 1.0, Literal, op.add, BinOp, Print]
+
+    def test_tipos_mais_específicos_primeiro(self):
+        tree = Block([Print(Var("x")), Print(Literal(1.0))])
+        seen = []
+        tree.visit({Expr: lambda obj: seen.append("expr"), Var: lambda obj: seen.append(obj.name)})
+        assert seen == ["x", "expr"]
+
+    def test_dispatcher(self):
+        dispatch = Dispatcher({Expr: print})
+        assert not dispatch.visit_scalars
+        assert dispatch.entry(Var) == (print, ())
+        assert dispatch.entry(Print) == (None, ("expr",))
+        assert dispatch.entry(str) == (None, None)
+
+    def test_visit_once(self):
+        seen = []
+        visitors = {Expr: lambda obj: seen.append("expr"), Var: lambda obj: seen.append(obj.name)}
+        for obj in [Var("x"), Literal(1.0), Print(Var("y")), 1.0]:
+            visit_once(obj, visitors)
+        assert seen == ["x", "expr"]
+
+
+@dataclass(slots=True)
+class Double(Expr):
+    """
+    Açúcar sintático para `expr * 2`, usado para testar substituições.
+    """
+
+    expr: Expr
+
+    def desugar_self(self):
+        return BinOp(self.expr, Literal(2.0), op.mul)
+
+
+class TestReplacements:
+    def test_desugar_substitui_nós(self):
+        program = Program([Print(Double(Double(Var("x")))), Print(Double(Literal(1.0)))])
+        program.desugar_tree()
+        expect = Program(
+            [
+                Print(BinOp(BinOp(Var("x"), Literal(2.0), op.mul), Literal(2.0), op.mul)),
+                Print(BinOp(Literal(1.0), Literal(2.0), op.mul)),
+            ]
+        )
+        expect.desugar_tree()
+        assert program == expect
+        assert type(program.stmts[0].expr.left) is FloatBinOp
+
+    def test_índice_é_criado_uma_vez(self, monkeypatch):
+        created = []
+
+        class Index(ParentIndex):
+            def __init__(self, root):
+                created.append(root)
+                super().__init__(root)
+
+        monkeypatch.setattr(passes, "ParentIndex", Index)
+        program = Program([Print(Double(Var("x"))) for _ in range(5000)])
+        program.desugar_tree()
+        assert len(created) == 1
+        assert all(type(stmt.expr) is FloatBinOp for stmt in program.stmts)
+
+    def test_etapas_seguintes_visitam_o_novo_nó(self):
+        function = Function("f", [("x", None)], body=Block([Print(Double(Var("x")))]))
+        run = passes.run_passes(function, ["validate", "desugar", "resolve"])
+        assert run == ["validate", "desugar", "resolve"]
+        assert function.body.stmts[0].expr.left.slot == 0
+
+    def test_raiz_não_pode_ser_substituída(self):
+        with pytest.raises(ValueError):
+            Double(Var("x")).desugar_tree()
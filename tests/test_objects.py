@@ -0,0 +1,203 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+import lox
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import Ctx
+from lox.engines import ENGINES
+from lox.runtime import LoxClass, LoxError, LoxFunction, LoxInstance
+
+
+def method(name: str, *stmts: Stmt, args: tuple[str, ...] = ()) -> LoxFunction:
+    """
+    Cria um método cujo corpo é executado com `this` no escopo.
+    """
+    return LoxFunction(name, list(args), list(stmts), Ctx.from_dict({}))
+
+
+def counter_classes() -> tuple[LoxClass, LoxClass]:
+    """
+    Equivalente a:
+
+        class A { inc(x) { this.count = this.count + x; } tag() { this.sound = "A"; } }
+        class B < A { tag() { this.sound = "B"; } }
+    """
+    this = Var("this")
+    inc = method(
+        "inc",
+        Setattr(this, "count", BinOp(Getattr(this, "count"), Var("x"), op.add)),
+        args=("x",),
+    )
+    base = LoxClass("A", {"inc": inc, "tag": method("tag", Setattr(this, "sound", Literal("A")))})
+    child = LoxClass("B", {"tag": method("tag", Setattr(this, "sound", Literal("B")))}, base)
+    return base, child
+
+
+def make(cls: LoxClass) -> LoxInstance:
+    obj = cls()
+    obj.count = 0.0
+    return obj
+
+
+class TestInlineCache:
+    def test_chamada_monomórfica(self):
+        base, _ = counter_classes()
+        obj = make(base)
+        call = Invoke(Var("obj"), "inc", [Literal(2.0)])
+        ctx = Ctx.from_dict({"obj": obj})
+        for _ in range(3):
+            call.eval(ctx)
+        assert obj.count == 6.0
+        assert [vtable for vtable, _ in call.cache.entries] == [base.vtable]
+
+    def test_chamada_polimórfica_respeita_a_herança(self):
+        base, child = counter_classes()
+        call = Invoke(Var("obj"), "tag", [])
+        objs = [make(base), make(child), make(base)]
+        for obj in objs:
+            call.eval(Ctx.from_dict({"obj": obj}))
+        assert [obj.sound for obj in objs] == ["A", "B", "A"]
+        assert [vtable for vtable, _ in call.cache.entries] == [base.vtable, child.vtable]
+
+    def test_campos_têm_prioridade_sobre_métodos(self):
+        base, _ = counter_classes()
+        obj = make(base)
+        obj.tag = lambda: "campo"
+        ctx = Ctx.from_dict({"obj": obj})
+        assert Invoke(Var("obj"), "tag", []).eval(ctx) == "campo"
+        assert Getattr(Var("obj"), "count").eval(ctx) == 0.0
+
+    def test_ponto_megamórfico_continua_correto(self):
+        call = Invoke(Var("obj"), "tag", [])
+        classes = [counter_classes()[1] for _ in range(6)]
+        for cls in classes:
+            obj = make(cls)
+            call.eval(Ctx.from_dict({"obj": obj}))
+            assert obj.sound == "B"
+        assert len(call.cache.entries) == call.cache.LIMIT
+
+    def test_método_vinculado(self):
+        base, _ = counter_classes()
+        obj = make(base)
+        bound = Getattr(Var("obj"), "inc").eval(Ctx.from_dict({"obj": obj}))
+        bound(5.0)
+        assert obj.count == 5.0
+
+
+class TestShapes:
+    def test_instâncias_compartilham_formas(self):
+        cls = LoxClass("Point", {})
+        p, q = cls(), cls()
+        for obj in [p, q]:
+            obj.x = 1.0
+            obj.y = 2.0
+        r = cls()
+        r.y = 1.0
+        r.x = 2.0
+        assert p._LoxInstance__shape is q._LoxInstance__shape
+        assert r._LoxInstance__shape is not p._LoxInstance__shape
+        assert cls.shape.transitions["x"].transitions["y"] is p._LoxInstance__shape
+
+    def test_campos_e_coerção(self):
+        obj = LoxClass("Point", {})()
+        obj.x = 1.5
+        obj.n = "42"
+        obj.n = 3.7
+        obj.x = "a"
+        assert (obj.x, obj.n) == ("a", 3)
+
+    def test_cache_de_campos_acompanha_a_forma(self):
+        cls = LoxClass("Point", {})
+        p, q = cls(), cls()
+        p.x, p.y = 1.0, 2.0
+        q.y, q.x = 3.0, 4.0
+        get = Getattr(Var("obj"), "x")
+        values = [get.eval(Ctx.from_dict({"obj": obj})) for obj in [p, q, p]]
+        assert values == [1.0, 4.0, 1.0]
+
+    def test_instâncias_distintas_são_diferentes(self):
+        cls = LoxClass("Point", {})
+        assert cls() != cls()
+
+
+class TestVtable:
+    def test_tabela_inclui_métodos_herdados(self):
+        base, child = counter_classes()
+        assert child.vtable["inc"] is base.methods["inc"]
+        assert child.vtable["tag"] is child.methods["tag"]
+        assert child.get_method("inc") is base.methods["inc"]
+
+    def test_redefinir_métodos_invalida_subclasses_e_caches(self):
+        base, child = counter_classes()
+        obj = make(child)
+        call = Invoke(Var("obj"), "inc", [Literal(1.0)])
+        ctx = Ctx.from_dict({"obj": obj})
+        call.eval(ctx)
+
+        double = method(
+            "inc",
+            Setattr(Var("this"), "count", BinOp(Getattr(Var("this"), "count"), Literal(2.0), op.mul)),
+            args=("x",),
+        )
+        base.define_method("inc", double)
+        assert child.get_method("inc") is double
+        call.eval(ctx)
+        assert obj.count == 2.0
+
+    def test_método_inexistente(self):
+        base, _ = counter_classes()
+        with pytest.raises(LoxError):
+            base.get_method("nope")
+
+
+class TestConstructor:
+    def point_class(self) -> LoxClass:
+        this = Var("this")
+        init = method(
+            "init",
+            Setattr(this, "x", Var("a")),
+            Setattr(this, "y", Var("b")),
+            args=("a", "b"),
+        )
+        return LoxClass("Point", {"init": init})
+
+    def test_inicializador(self):
+        cls = self.point_class()
+        obj = cls(1.0, 2.0)
+        assert (obj.x, obj.y) == (1.0, 2.0)
+        assert cls.arity == 2
+
+    def test_inicializador_herdado_e_redefinido(self):
+        base = self.point_class()
+        child = LoxClass("Point3D", {}, base)
+        assert child(1.0, 2.0).x == 1.0
+
+        base.define_method("init", method("init", Setattr(Var("this"), "x", Var("a")), args=("a",)))
+        assert child.arity == 1
+        assert child(3.0).x == 3.0
+
+    def test_número_de_argumentos(self):
+        with pytest.raises(TypeError):
+            self.point_class()(1.0)
+        with pytest.raises(TypeError):
+            LoxClass("Empty", {})(1.0)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_acesso_a_atributos_nos_mecanismos(engine):
+    # Equivalente a: obj.inc(2); obj.inc(3); print obj.count; obj.tag(); print obj.sound;
+    base, child = counter_classes()
+    obj = make(child)
+    stmts = [
+        Invoke(Var("obj"), "inc", [Literal(2.0)]),
+        Invoke(Var("obj"), "inc", [Literal(3.0)]),
+        Print(Getattr(Var("obj"), "count")),
+        Invoke(Var("obj"), "tag", []),
+        Print(Getattr(Var("obj"), "sound")),
+    ]
+    with redirect_stdout(io.StringIO()) as stdout:
+        lox.eval(Program(stmts), Ctx.from_dict({"obj": obj}), engine=engine)
+    assert stdout.getvalue() == "5.0\nB\n"
@@ -0,0 +1,159 @@
+import io
+import re
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import pytest
+
+import lox
+from lox import parse
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import Ctx
+from lox.engines import ENGINES
+from lox.optimize import nonlocal_writes, optimize
+
+from helpers import counting_loop, run_program
+
+EXAMPLES = Path(__file__).parent.parent / "exemplos"
+
+
+def compare(make_program, level: int, env: dict | None = None) -> tuple[Program, str]:
+    """
+    Executa o programa com e sem otimizações, verificando que a saída é a
+    mesma, e retorna o programa otimizado e a saída.
+    """
+    expect = run_program(make_program(), env)
+    program = make_program()
+    program.desugar_tree()
+    program.resolve_tree()
+    optimize(program, level)
+    assert run_program(program, env) == expect
+    return program, expect
+
+
+class TestInvariants:
+    def test_expressão_invariante(self):
+        def make():
+            return Program([counting_loop(Literal(4.0), Print(BinOp(BinOp(Var("x"), Literal(2.0), op.mul), Var("i"), op.add)))])
+
+        program, stdout = compare(make, 1, {"x": 5.0})
+        assert stdout == "10.0\n11.0\n12.0\n13.0\n"
+        scope = program.stmts[0]
+        assert type(scope) is InvariantScope and scope.size == 1
+        assert type(scope.loop.body.stmts[0].expr.left) is Invariant
+
+    def test_laço_sem_iterações_não_avalia_a_expressão(self):
+        def make():
+            return Program([counting_loop(Literal(0.0), Print(BinOp(Var("x"), Literal(1.0), op.add)))])
+
+        program, stdout = compare(make, 1, {"x": None})
+        assert stdout == "" and type(program.stmts[0]) is InvariantScope
+
+    def test_variáveis_modificadas_no_laço(self):
+        def make():
+            return Program([counting_loop(Literal(4.0), Assign("x", BinOp(Var("x"), Literal(1.0), op.add)), Print(Var("x")))])
+
+        program, _ = compare(make, 1, {"x": 0.0})
+        assert type(program.stmts[0]) is CountedFor
+
+    def test_chamadas_recursivas(self):
+        # fun f(x) { for (...) { print x * 10; next(x - 1); } } f(2);
+        def make():
+            body = [
+                Print(BinOp(Var("x"), Literal(10.0), op.mul)),
+                Call("next", [BinOp(Var("x"), Literal(1.0), op.sub)]),
+            ]
+            f = Function("f", [("x", None)], body=Block([counting_loop(Literal(2.0), *body)]))
+            return Program([f, Call("f", [Literal(2.0)])])
+
+        env: dict = {}
+        env["next"] = lambda x: x > 0 and env["ctx"]["f"](x)
+        expect = "20.0\n10.0\n10.0\n20.0\n10.0\n10.0\n"
+        for level in (0, 1):
+            program = make()
+            program.desugar_tree()
+            program.resolve_tree()
+            optimize(program, level)
+            env["ctx"] = ctx = Ctx.from_dict(env)
+            with redirect_stdout(io.StringIO()) as stdout:
+                program.eval(ctx)
+            assert stdout.getvalue() == expect
+        assert type(program.stmts[0].body.stmts[0]) is InvariantScope
+
+
+def test_atribuições_não_locais():
+    # fun f(x) {
+    #     var s = 0;
+    #     for (var i = 0; i < 4; i = i + 1) { { var t = 1; s = s + t; } }
+    #     fun g() { x = 1; }
+    # }
+    # y = 2;
+    inner = Block([VarDef("t", Literal(1.0)), Assign("s", BinOp(Var("s"), Var("t"), op.add))])
+    g = Function("g", [], body=Block([Assign("x", Literal(1.0))]))
+    body = [VarDef("s", Literal(0.0)), counting_loop(Literal(4.0), inner), g]
+    program = Program([Function("f", [("x", None)], body=Block(body)), Assign("y", Literal(2.0))])
+    program.resolve_tree()
+    assert nonlocal_writes(program) == {"x", "y"}
+
+
+class TestStrengthReduction:
+    @pytest.mark.parametrize("factor", [3.0, 0.1, 2**60 * 1.0])
+    def test_multiplicação_pelo_contador(self, factor):
+        def make():
+            return Program([counting_loop(Literal(6.0), Print(BinOp(Var("i"), Var("y"), op.mul)))])
+
+        program, _ = compare(make, 2, {"y": factor})
+        assert type(program.stmts[0].loop.body.stmts[0].expr) is InductionProduct
+
+    def test_regra_dos_inteiros(self):
+        def make():
+            return Program([counting_loop(Literal(5.0), Print(BinOp(Var("n"), Var("i"), op.mul)))])
+
+        _, stdout = compare(make, 2, {"n": 7})
+        assert stdout == "0\n7\n14\n21\n28\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_programas_otimizados_nos_mecanismos(engine):
+    # fun f(x) { for (...) { print x * 2 + i; print i * x; } } f(3);
+    body = [
+        Print(BinOp(BinOp(Var("x"), Literal(2.0), op.mul), Var("i"), op.add)),
+        Print(BinOp(Var("i"), Var("x"), op.mul)),
+    ]
+    f = Function("f", [("x", None)], body=Block([counting_loop(Literal(3.0), *body)]))
+    program = Program([f, Call("f", [Literal(3.0)])])
+    expect = run_program(program)
+    program.desugar_tree()
+    program.resolve_tree()
+    optimize(program, 2)
+    assert type(f.body.stmts[0]) is InvariantScope
+
+    with redirect_stdout(io.StringIO()) as stdout:
+        lox.eval(program, engine=engine)
+    assert stdout.getvalue() == expect == "6.0\n0.0\n7.0\n3.0\n8.0\n6.0\n"
+
+
+def example_output(path: Path, level: int) -> tuple[str, str | None]:
+    error = None
+    with redirect_stdout(io.StringIO()) as stdout:
+        try:
+            lox.eval(optimize(parse(path.read_text()), level))
+        except Exception as exc:
+            error = type(exc).__name__
+    # Remove endereços de memória das mensagens de erro.
+    return re.sub(r"0x[0-9a-f]+", "", stdout.getvalue()), error
+
+
+def parsed_examples():
+    for path in sorted(EXAMPLES.rglob("*.lox")):
+        try:
+            parse(path.read_text())
+        except Exception:
+            continue
+        yield path
+
+
+@pytest.mark.parametrize("path", list(parsed_examples()), ids=lambda path: str(path.relative_to(EXAMPLES)))
+def test_exemplos_produzem_a_mesma_saída(path):
+    assert example_output(path, 2) == example_output(path, 0)
@@ -0,0 +1,63 @@
+import pytest
+
+import lox
+from lox import passes
+from lox import runtime as op
+from lox.ast import *
+from lox.passes import PIPELINE, run_passes
+
+
+def make_program() -> Program:
+    # fun f(n) { for (var i = 0; i < n; i = i + 1) print i * 2; return f(n); }
+    loop = For(
+        VarDef("i", Literal(0.0)),
+        BinOp(Var("i"), Var("n"), op.lt),
+        Assign("i", BinOp(Var("i"), Literal(1.0), op.add)),
+        Print(BinOp(Var("i"), Literal(2.0), op.mul)),
+    )
+    body = Block([loop, Return(Call("f", [Var("n")]))])
+    return Program([Function("f", [("n", None)], body=body)])
+
+
+def snapshot(tree: Node) -> list:
+    """
+    Classes e anotações do resolvedor de todos os nós.
+    """
+    return [(type(node), getattr(node, "depth", None), getattr(node, "slot", None)) for node in tree.descendants()]
+
+
+class TestPasses:
+    def test_travessia_única_equivale_às_etapas_separadas(self):
+        fused = make_program()
+        assert run_passes(fused) == list(PIPELINE)
+
+        sequential = make_program()
+        sequential.validate_tree()
+        sequential.desugar_tree()
+        sequential.resolve_tree()
+        assert snapshot(fused) == snapshot(sequential)
+        assert type(fused.stmts[0].body.stmts[0]) is CountedFor
+
+    def test_etapas_não_são_repetidas(self, monkeypatch):
+        program = make_program()
+        run_passes(program)
+        assert program.passes == set(PIPELINE)
+
+        calls = []
+        monkeypatch.setattr(Node, "validate_self", lambda self, cursor: calls.append(self))
+        program.validate_tree()
+        assert run_passes(program) == [] and calls == []
+        assert run_passes(program, ["validate"], force=True) == ["validate"]
+        assert len(calls) == len(list(program.descendants()))
+
+    def test_eval_não_valida_novamente(self, monkeypatch, capsys):
+        program = lox.parse('print "oi";')
+        monkeypatch.setattr(passes, "traverse", lambda *args: pytest.fail("percorreu a árvore"))
+        lox.eval(program)
+        assert capsys.readouterr().out == "oi\n"
+
+    def test_expressões_não_registram_etapas(self):
+        expr = BinOp(Var("x"), Literal(1.0), op.add)
+        assert run_passes(expr, ["desugar"]) == ["desugar"]
+        assert run_passes(expr, ["desugar"]) == ["desugar"]
+        assert type(expr) is FloatBinOp
@@ -0,0 +1,191 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+import lox
+from lox import *
+from lox import runtime as op
+from lox.ast import *
+from lox.ctx import BUILTINS, UNDEFINED, Frame
+
+
+def add(*args: Expr) -> Expr:
+    expr, *rest = args
+    for arg in rest:
+        expr = BinOp(expr, arg, op.add)
+    return expr
+
+
+def make_program() -> Program:
+    """
+    Equivalente a:
+
+        fun outer(a) {
+            var b = 10;
+            fun inner(c) { print a + b + c; b = c; }
+            inner(1);
+            inner(2);
+        }
+        outer(5);
+    """
+    inner = Function(
+        "inner",
+        [("c", None)],
+        body=Block(
+            [
+                Print(add(Var("a"), Var("b"), Var("c"))),
+                Assign("b", Var("c")),
+            ]
+        ),
+    )
+    outer = Function(
+        "outer",
+        [("a", None)],
+        body=Block(
+            [
+                VarDef("b", Literal(10.0)),
+                inner,
+                Call("inner", [Literal(1.0)]),
+                Call("inner", [Literal(2.0)]),
+            ]
+        ),
+    )
+    return Program([outer, Call("outer", [Literal(5.0)])])
+
+
+def run(program: Program) -> str:
+    with redirect_stdout(io.StringIO()) as stdout:
+        lox.eval(program, {})
+    return stdout.getvalue()
+
+
+class TestResolver:
+    def test_anota_profundidade_e_posição(self):
+        program = make_program()
+        program.resolve_tree()
+        [outer, call_outer] = program.stmts
+        [vardef, inner, call_inner, _] = outer.body.stmts
+        [print_, assign] = inner.body.stmts
+        var_c = print_.expr.right
+        var_b = print_.expr.left.right
+        var_a = print_.expr.left.left
+
+        assert (var_a.depth, var_a.slot) == (1, 0)
+        assert (var_b.depth, var_b.slot) == (1, 1)
+        assert (var_c.depth, var_c.slot) == (0, 0)
+        assert (assign.depth, assign.slot) == (1, 1)
+        assert (vardef.depth, vardef.slot) == (0, 1)
+        assert (call_inner.depth, call_inner.slot) == (0, 2)
+        assert (call_outer.depth, call_outer.slot) == (None, None)
+
+    def test_escopo_da_função_lista_parâmetros_e_declarações(self):
+        [outer, _] = make_program().stmts
+        assert outer.scope_slots() == {"a": 0, "b": 1, "inner": 2}
+
+    def test_resolução_preserva_a_semântica(self):
+        expect = "16.0\n8.0\n"
+        assert run(make_program()) == expect
+
+        program = make_program()
+        program.resolve_tree()
+        assert run(program) == expect
+
+    def test_blocos_e_laços_são_escopos(self):
+        # fun f(a) {
+        #     var x = 1;
+        #     { print x; var x = 2; print x; }
+        #     for (var i = 0; i < 2; i = i + 1) { print i + a; }
+        #     print x;
+        # }
+        before, inner, after = Var("x"), Var("x"), Var("x")
+        block = Block([Print(before), VarDef("x", Literal(2.0)), Print(inner)])
+        sum_ = BinOp(Var("i"), Var("a"), op.add)
+        loop = For(
+            VarDef("i", Literal(0.0)),
+            BinOp(Var("i"), Literal(2.0), op.lt),
+            Assign("i", BinOp(Var("i"), Literal(1.0), op.add)),
+            Block([Print(sum_)]),
+        )
+        f = Function("f", [("a", None)], body=Block([VarDef("x", Literal(1.0)), block, loop, Print(after)]))
+        program = Program([f, Block([VarDef("y", Literal(1.0))])])
+        program.resolve_tree()
+
+        assert f.frame_slots == {"a": 0, "x": 1}
+        assert block.frame_slots == {"x": 0} and loop.frame_slots == {"i": 0}
+        assert f.body.frame_slots is None and loop.body.frame_slots is None
+        assert program.stmts[1].frame_slots is None
+
+        # A declaração mais interna é escolhida. Antes de ser definida, a
+        # variável do bloco está indefinida e a busca continua pelo nome.
+        assert (inner.depth, inner.slot) == (before.depth, before.slot) == (0, 0)
+        assert (after.depth, after.slot) == (0, 1)
+        assert (sum_.left.depth, sum_.left.slot) == (0, 0)
+        assert (sum_.right.depth, sum_.right.slot) == (1, 0)
+
+    def test_escopos_de_blocos_preservam_a_semântica(self):
+        # fun f() { var x = "f"; { print x; var x = "bloco"; print x; } print x; } f(); f();
+        block = Block([Print(Var("x")), VarDef("x", Literal("bloco")), Print(Var("x"))])
+        f = Function("f", [], body=Block([VarDef("x", Literal("f")), block, Print(Var("x"))]))
+        program = Program([f, Call("f", []), Call("f", [])])
+        expect = "f\nbloco\nf\n" * 2
+        assert run(program) == expect
+        program.resolve_tree()
+        assert run(program) == expect
+
+    def test_globais_e_embutidas_não_são_resolvidas(self):
+        call = Call("clock", [])
+        var = Var("x")
+        Program([VarDef("x", Literal(1.0)), Print(var), call]).resolve_tree()
+        assert call.depth is None
+        assert var.depth is None
+
+    def test_ctx_acessa_escopos_por_profundidade(self):
+        ctx = Ctx.from_dict({"x": 1}).push({"y": 2}).push({})
+        assert ctx.get_at(2, "x") == 1
+        assert ctx.get_at(1, "y") == 2
+
+        ctx.set_at(1, "y", 3)
+        assert ctx["y"] == 3
+
+
+class TestFrame:
+    def make_frame(self) -> Frame:
+        parent = Ctx.from_dict({"x": 1.0})
+        return Frame({"a": 0, "b": 1}, [2.0, UNDEFINED], parent)
+
+    def test_acesso_por_nome(self):
+        frame = self.make_frame()
+        assert frame["a"] == 2.0
+        assert frame["x"] == 1.0
+        assert "a" in frame and "b" not in frame
+
+        frame.var_def("b", 3.0)
+        assert frame["b"] == 3.0
+        assert frame.to_dict() == {**BUILTINS, "x": 1.0, "a": 2.0, "b": 3.0}
+
+    def test_sem_dict(self):
+        frame = self.make_frame()
+        assert not hasattr(frame, "__dict__") and not hasattr(frame.parent, "__dict__")
+
+    def test_redefinição_é_um_erro(self):
+        frame = self.make_frame()
+        with pytest.raises(KeyError):
+            frame.var_def("a", 0.0)
+
+    def test_acesso_por_posição(self):
+        frame = self.make_frame().push({})
+        assert frame.get_slot(1, 0) == 2.0
+        assert frame.get_slot(1, 1) is UNDEFINED
+
+        with pytest.raises(KeyError):
+            frame.set_slot(1, 1, 0.0)
+        frame.set_slot(1, 0, 4.0)
+        assert frame["a"] == 4.0
+
+    def test_parâmetros_sem_argumento_ficam_indefinidos(self):
+        [outer, _] = make_program().stmts
+        outer.resolve_tree()
+        assert outer.frame_values((1.0,)) == [1.0, UNDEFINED, UNDEFINED]
+        assert outer.frame_values(()) == [UNDEFINED] * 3
+        assert outer.frame_values((1.0, 2.0)) == [1.0, UNDEFINED, UNDEFINED]